@@ -1,11 +1,24 @@
 """Agent package exposing helper functions for the workflow graph."""
 
-from .generate_sql_query import generate_sql_query, load_schema
-from .run_sql_query import execute_readonly_query
+from .generate_sql_query import agenerate_sql_query, generate_sql_query, load_schema
+from .run_sql_query import (
+    QueryError,
+    execute_readonly_query,
+    execute_readonly_query_async,
+    run_readonly_query,
+    run_readonly_query_async,
+    stream_readonly_query,
+)
 
 __all__ = [
     "generate_sql_query",
+    "agenerate_sql_query",
     "load_schema",
     "execute_readonly_query",
+    "execute_readonly_query_async",
+    "run_readonly_query",
+    "run_readonly_query_async",
+    "QueryError",
+    "stream_readonly_query",
 ]
 
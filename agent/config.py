@@ -0,0 +1,31 @@
+"""
+Process-wide loading of the .env file.
+
+Only the dotenv loading is centralized here; there is no shared settings
+object. Each module still owns its settings as ``os.getenv`` constants,
+read once when the module is first imported, after calling
+``load_environment()``. The .env file is located and parsed by the first
+call only, so importing many modules does not repeat the file search.
+Variables already set in the environment take precedence over the file.
+Because the constants are read at import time, changing the environment
+afterwards has no effect until the process restarts.
+"""
+
+import threading
+
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def load_environment() -> None:
+    """Load the .env file into os.environ, once per process."""
+    global _loaded
+    if _loaded:
+        return
+    with _load_lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+
+            # Searched for from this package's directory upwards, as before
+            load_dotenv()
+            _loaded = True
@@ -0,0 +1,366 @@
+"""
+Connection pool for the read-only PostgreSQL execution layer.
+
+Connections are opened once, switched to a read-only session at creation time
+and then reused across requests, so a chat turn no longer pays for the TCP
+connection, authentication and backend fork on every query.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+from .config import load_environment
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Pool sizing and maintenance
+POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10"))
+POOL_MAX_IDLE = float(os.getenv("POSTGRES_POOL_MAX_IDLE", "300"))
+POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("POSTGRES_POOL_HEALTH_CHECK_INTERVAL", "30"))
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("POSTGRES_POOL_ACQUIRE_TIMEOUT", "30"))
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the acquire timeout."""
+
+
+class _PooledConnection:
+    """Bookkeeping wrapper around a pooled psycopg2 connection."""
+
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn: "psycopg2.extensions.connection"):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of read-only psycopg2 connections.
+
+    Args:
+        connect_kwargs: Keyword arguments forwarded to psycopg2.connect
+        min_size: Number of connections kept open even when idle
+        max_size: Upper bound on simultaneously open connections
+        max_idle: Seconds after which an idle connection above min_size is closed
+        health_check_interval: Idle seconds after which a connection is pinged before reuse
+        acquire_timeout: Seconds to wait for a free connection before raising PoolTimeout
+        readonly: Open read-only sessions (writable pools are for the agent's own bookkeeping tables)
+    """
+
+    def __init__(
+        self,
+        connect_kwargs: Dict[str, Any],
+        min_size: int = POOL_MIN_SIZE,
+        max_size: int = POOL_MAX_SIZE,
+        max_idle: float = POOL_MAX_IDLE,
+        health_check_interval: float = POOL_HEALTH_CHECK_INTERVAL,
+        acquire_timeout: float = POOL_ACQUIRE_TIMEOUT,
+        readonly: bool = True,
+    ):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1.")
+        self.connect_kwargs = dict(connect_kwargs)
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_interval = health_check_interval
+        self.acquire_timeout = acquire_timeout
+        self.readonly = readonly
+
+        self._idle: List[_PooledConnection] = []
+        self._in_use: Dict[int, _PooledConnection] = {}
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._reaper: Optional[threading.Thread] = None
+        # Dedicated executor so blocking DB calls never starve the default one.
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_size, thread_name_prefix="pg-pool"
+        )
+
+    # ------------------------------------------------------------------ #
+    # Connection lifecycle
+    # ------------------------------------------------------------------ #
+    def _connect(self) -> _PooledConnection:
+        """Open a new connection and apply the read-only session settings once."""
+        conn = psycopg2.connect(**self.connect_kwargs)
+        try:
+            conn.set_session(readonly=self.readonly, autocommit=False)
+        except Exception:
+            conn.close()
+            raise
+        return _PooledConnection(conn)
+
+    @staticmethod
+    def _close_quietly(pooled: _PooledConnection) -> None:
+        try:
+            pooled.conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, pooled: _PooledConnection) -> bool:
+        """Ping connections that sat idle longer than the health-check interval."""
+        if pooled.conn.closed:
+            return False
+        if time.monotonic() - pooled.last_used < self.health_check_interval:
+            return True
+        try:
+            with pooled.conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            pooled.conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _evict_idle_locked(self) -> List[_PooledConnection]:
+        """Detach idle connections beyond min_size; caller closes them outside the lock."""
+        now = time.monotonic()
+        evicted: List[_PooledConnection] = []
+        # Idle list is LIFO, so the oldest idle connections sit at the front.
+        while (
+            self._idle
+            and self._size > self.min_size
+            and now - self._idle[0].last_used > self.max_idle
+        ):
+            evicted.append(self._idle.pop(0))
+            self._size -= 1
+        return evicted
+
+    def _ensure_reaper(self) -> None:
+        if self._reaper is not None or self.max_idle <= 0:
+            return
+        self._reaper = threading.Thread(
+            target=self._reap_forever, name="pg-pool-reaper", daemon=True
+        )
+        self._reaper.start()
+
+    def _reap_forever(self) -> None:
+        interval = max(1.0, self.max_idle / 2)
+        while not self._closed:
+            time.sleep(interval)
+            self.evict_idle()
+
+    # ------------------------------------------------------------------ #
+    # Public API
+    # ------------------------------------------------------------------ #
+    def acquire(self, timeout: Optional[float] = None) -> "psycopg2.extensions.connection":
+        """
+        Check out a connection, opening a new one if the pool is below max_size.
+
+        Args:
+            timeout: Seconds to wait for a free connection. Defaults to acquire_timeout.
+
+        Returns:
+            A read-only psycopg2 connection that must be handed back via release()
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        self._ensure_reaper()
+
+        while True:
+            candidate: Optional[_PooledConnection] = None
+            open_new = False
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("Connection pool is closed.")
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"No connection available within {timeout:.1f}s "
+                            f"(max_size={self.max_size})."
+                        )
+                    self._cond.wait(remaining)
+                if self._idle:
+                    candidate = self._idle.pop()
+                else:
+                    self._size += 1
+                    open_new = True
+
+            if open_new:
+                try:
+                    candidate = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_healthy(candidate):
+                self._close_quietly(candidate)
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                continue
+
+            with self._cond:
+                self._in_use[id(candidate.conn)] = candidate
+            return candidate.conn
+
+    def release(self, conn: "psycopg2.extensions.connection", discard: bool = False) -> None:
+        """
+        Return a connection to the pool, ending any open transaction.
+
+        Args:
+            conn: Connection previously returned by acquire()
+            discard: Close the connection instead of reusing it (e.g. after a fatal error)
+        """
+        with self._cond:
+            pooled = self._in_use.pop(id(conn), None)
+        if pooled is None:
+            return
+
+        if not discard and not conn.closed:
+            try:
+                status = conn.get_transaction_status()
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if conn.closed:
+            discard = True
+
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+                evicted = [pooled]
+            else:
+                pooled.last_used = time.monotonic()
+                self._idle.append(pooled)
+                evicted = self._evict_idle_locked()
+            self._cond.notify()
+        for stale in evicted:
+            self._close_quietly(stale)
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator["psycopg2.extensions.connection"]:
+        """Context manager around acquire()/release() that discards broken connections."""
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def prewarm(self) -> None:
+        """Open connections until min_size are available."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                pooled = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.insert(0, pooled)
+                self._cond.notify()
+
+    def evict_idle(self) -> None:
+        """Close idle connections that exceeded max_idle, keeping min_size open."""
+        with self._cond:
+            evicted = self._evict_idle_locked()
+        for stale in evicted:
+            self._close_quietly(stale)
+
+    def discard_idle(self) -> None:
+        """Close every idle connection, e.g. after the server went away."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close_quietly(pooled)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run a blocking DB function on the pool's executor and await its result.
+
+        The caller's context variables (e.g. the request trace) are visible to ``func``.
+        """
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, context.run, func, *args)
+
+    def stats(self) -> Dict[str, int]:
+        """Return a snapshot of pool occupancy."""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            }
+
+    def close(self) -> None:
+        """Close all idle connections and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._close_quietly(pooled)
+        self._executor.shutdown(wait=False)
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(
+    connection_string: Optional[str] = None,
+    default_kwargs: Optional[Dict[str, Any]] = None,
+) -> ConnectionPool:
+    """
+    Return the shared pool for a connection string, creating it on first use.
+
+    Args:
+        connection_string: PostgreSQL DSN. If None, default_kwargs are used.
+        default_kwargs: psycopg2.connect keyword arguments for the default pool
+
+    Returns:
+        The process-wide ConnectionPool for that target
+    """
+    key = connection_string or ""
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            if connection_string:
+                connect_kwargs: Dict[str, Any] = {"dsn": connection_string}
+            else:
+                connect_kwargs = dict(default_kwargs or {})
+            pool = ConnectionPool(connect_kwargs)
+            _pools[key] = pool
+        return pool
+
+
+def close_all_pools() -> None:
+    """Close every pool created through get_pool()."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
@@ -0,0 +1,255 @@
+"""
+Pre-execution cost guard for generated SQL.
+
+Before a query runs, the guard asks the planner for an estimate with
+``EXPLAIN (FORMAT JSON)`` (which plans but does not execute the statement)
+and compares it against configurable thresholds:
+
+- Plans returning more rows than allowed are wrapped in an outer LIMIT.
+- Plans whose total cost stays above the budget, even after the LIMIT
+  rewrite, are rejected with a short explanation of the expensive plan nodes
+  that the SQL generator can use to write a cheaper query.
+
+Every statement additionally runs under a transaction-local
+``statement_timeout``, so a query the planner underestimated still cannot
+pin a backend for minutes.
+"""
+
+import os
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+from .config import load_environment
+from .sql_validator import strip_statement
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Cost thresholds
+QUERY_COST_GUARD_ENABLED = os.getenv("QUERY_COST_GUARD_ENABLED", "true").lower() == "true"
+QUERY_MAX_COST = float(os.getenv("QUERY_MAX_COST", "10000000"))
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "100000"))
+QUERY_STATEMENT_TIMEOUT = float(os.getenv("QUERY_STATEMENT_TIMEOUT", "30"))
+# How many times the workflow asks the model for a cheaper query after a rejection
+QUERY_MAX_REGENERATIONS = int(os.getenv("QUERY_MAX_REGENERATIONS", "1"))
+
+# Plan nodes listed in a rejection reason
+_REASON_NODES = 3
+
+
+class PlanEstimate:
+    """
+    Planner estimate for a statement.
+
+    Attributes:
+        total_cost: Estimated total cost of the top plan node
+        plan_rows: Estimated number of rows returned
+        plan: The raw top-level plan node from EXPLAIN (FORMAT JSON)
+    """
+
+    __slots__ = ("total_cost", "plan_rows", "plan")
+
+    def __init__(self, plan: Dict[str, Any]):
+        self.plan = plan
+        self.total_cost = float(plan.get("Total Cost", 0.0))
+        self.plan_rows = int(plan.get("Plan Rows", 0))
+
+
+class CostVerdict:
+    """
+    Outcome of a cost check.
+
+    Attributes:
+        sql: The statement to execute (possibly rewritten with a LIMIT)
+        estimate: Planner estimate of ``sql``, or None when the guard is disabled
+        rewritten: True when a LIMIT was added
+        rejected: True when the statement must not run
+        reason: Human/LLM readable explanation of a rejection or rewrite
+        limit: The row limit that was added, or None. ``sql`` asks for one
+            row more, so a result that was really cut can be told apart from
+            one with exactly ``limit`` rows; callers drop that extra row.
+    """
+
+    __slots__ = ("sql", "estimate", "rewritten", "rejected", "reason", "limit")
+
+    def __init__(
+        self,
+        sql: str,
+        estimate: Optional[PlanEstimate] = None,
+        rewritten: bool = False,
+        rejected: bool = False,
+        reason: str = "",
+        limit: Optional[int] = None,
+    ):
+        self.sql = sql
+        self.estimate = estimate
+        self.rewritten = rewritten
+        self.rejected = rejected
+        self.reason = reason
+        self.limit = limit
+
+
+def _walk(plan: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield plan
+    for child in plan.get("Plans", []) or []:
+        yield from _walk(child)
+
+
+def _describe_node(node: Dict[str, Any]) -> str:
+    label = node.get("Node Type", "Plan node")
+    if node.get("Relation Name"):
+        label += f" on {node['Relation Name']}"
+    return f"{label} (~{int(node.get('Plan Rows', 0))} rows, cost {node.get('Total Cost', 0):.0f})"
+
+
+def strip_terminator(sql: str) -> str:
+    """Drop trailing terminators, comments and whitespace so the query can be nested."""
+    return strip_statement(sql)
+
+
+def limit_query(sql: str, max_rows: int) -> str:
+    """Wrap a query in an outer LIMIT without touching its own clauses."""
+    return f"SELECT * FROM (\n{strip_terminator(sql)}\n) AS limited_result LIMIT {int(max_rows)}"
+
+
+class QueryCostGuard:
+    """
+    Reject or rewrite queries whose planner estimate exceeds the thresholds.
+
+    Args:
+        max_cost: Largest acceptable estimated total cost
+        max_rows: Largest acceptable estimated result size; larger plans get a LIMIT
+        statement_timeout: Per-statement timeout in seconds (0 disables it)
+        enabled: Run EXPLAIN before execution; the timeout applies either way
+    """
+
+    def __init__(
+        self,
+        max_cost: float = QUERY_MAX_COST,
+        max_rows: int = QUERY_MAX_ROWS,
+        statement_timeout: float = QUERY_STATEMENT_TIMEOUT,
+        enabled: bool = QUERY_COST_GUARD_ENABLED,
+    ):
+        self.max_cost = max_cost
+        self.max_rows = max_rows
+        self.statement_timeout = statement_timeout
+        self.enabled = enabled
+        self.checked = 0
+        self.rewritten = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def explain(self, cursor, sql: str) -> PlanEstimate:
+        """Return the planner estimate for a statement without executing it."""
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {strip_terminator(sql)}")
+        document = cursor.fetchone()[0]
+        return PlanEstimate(document[0]["Plan"])
+
+    def _rejection_reason(self, estimate: PlanEstimate) -> str:
+        nodes = sorted(_walk(estimate.plan), key=lambda node: -node.get("Total Cost", 0))
+        hotspots = "; ".join(_describe_node(node) for node in nodes[:_REASON_NODES])
+        reason = (
+            f"The query plan is too expensive: estimated cost {estimate.total_cost:.0f} "
+            f"exceeds the limit of {self.max_cost:.0f}. Most expensive steps: {hotspots}."
+        )
+        if any(
+            node.get("Node Type") == "Nested Loop" and node.get("Plan Rows", 0) > self.max_rows
+            for node in _walk(estimate.plan)
+        ):
+            reason += (
+                " A join produces far more rows than its inputs; make sure every joined"
+                " table has a join condition, or aggregate each table before joining."
+            )
+        return reason
+
+    def check(self, cursor, sql: str, max_rows: Optional[int] = None) -> CostVerdict:
+        """
+        Plan a statement and decide whether it may run.
+
+        Args:
+            cursor: Cursor on the connection that will execute the statement
+            sql: The validated read-only statement
+            max_rows: Override for the row threshold (e.g. a streaming cap)
+
+        Returns:
+            A CostVerdict with the statement to run or the rejection reason
+        """
+        if not self.enabled:
+            return CostVerdict(sql)
+        max_rows = self.max_rows if max_rows is None else max_rows
+
+        estimate = self.explain(cursor, sql)
+        verdict = CostVerdict(sql, estimate)
+        too_many_rows = 0 < max_rows < estimate.plan_rows
+        if too_many_rows or estimate.total_cost > self.max_cost:
+            # A LIMIT lets the planner pick a fast-start plan and stop early
+            limit = max_rows if max_rows > 0 else self.max_rows
+            # One row past the limit shows whether the LIMIT actually cut the result
+            limited = limit_query(sql, limit + 1)
+            limited_estimate = self.explain(cursor, limited)
+            if limited_estimate.total_cost <= self.max_cost:
+                verdict = CostVerdict(
+                    limited,
+                    limited_estimate,
+                    rewritten=True,
+                    reason=f"Result limited to {limit} rows (planner expected ~{estimate.plan_rows}).",
+                    limit=limit,
+                )
+            else:
+                verdict = CostVerdict(
+                    sql, estimate, rejected=True, reason=self._rejection_reason(estimate)
+                )
+
+        with self._lock:
+            self.checked += 1
+            self.rewritten += int(verdict.rewritten)
+            self.rejected += int(verdict.rejected)
+        return verdict
+
+    def prepare(self, conn, sql: str, max_rows: Optional[int] = None) -> CostVerdict:
+        """
+        Apply the statement timeout to the open transaction and check the plan.
+
+        ``SET LOCAL`` lasts until the transaction ends, which the connection
+        pool guarantees when the connection is released.
+
+        Args:
+            conn: Pooled connection (inside a transaction) that will run the query
+            sql: The validated read-only statement
+            max_rows: Override for the row threshold
+
+        Returns:
+            A CostVerdict with the statement to run or the rejection reason
+        """
+        with conn.cursor() as cursor:
+            if self.statement_timeout > 0:
+                cursor.execute(
+                    "SET LOCAL statement_timeout = %s", (int(self.statement_timeout * 1000),)
+                )
+            return self.check(cursor, sql, max_rows)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return check/rewrite/reject counters and the active thresholds."""
+        return {
+            "enabled": self.enabled,
+            "checked": self.checked,
+            "rewritten": self.rewritten,
+            "rejected": self.rejected,
+            "max_cost": self.max_cost,
+            "max_rows": self.max_rows,
+            "statement_timeout": self.statement_timeout,
+        }
+
+
+_guard: Optional[QueryCostGuard] = None
+_guard_lock = threading.Lock()
+
+
+def get_cost_guard() -> QueryCostGuard:
+    """Return the process-wide cost guard, creating it on first use."""
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = QueryCostGuard()
+    return _guard
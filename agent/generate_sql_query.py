@@ -1,12 +1,16 @@
 import json
+import re
 from pathlib import Path
-from typing import Optional
-from langchain_ollama.llms import OllamaLLM
-from dotenv import load_dotenv
-import os
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
-load_dotenv()
-OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+from .config import load_environment
+from .llm_clients import OLLAMA_MODEL, OLLAMA_URL, get_llm_registry
+from .schema_registry import get_schema_registry
+
+if TYPE_CHECKING:
+    from langchain_core.callbacks import BaseCallbackHandler
+
+load_environment()
 
 def load_schema(schema_path: str = None) -> dict:
     """
@@ -27,11 +31,187 @@ def load_schema(schema_path: str = None) -> dict:
         return json.load(f)
 
 
+def _render_feedback(feedback: Optional[str]) -> str:
+    """Render why the previous attempt failed, so the model can correct it."""
+    if not feedback:
+        return ""
+    return f"""
+        A previous query for this question could not be used:
+        {feedback}
+        Write a different query that answers the same question and avoids this problem.
+        """
+
+
+def _render_conversation(conversation_context: Optional[str]) -> str:
+    """Render earlier turns a follow-up question may refer to."""
+    if not conversation_context:
+        return ""
+    return f"""
+        The question may refer to earlier turns of this conversation; reuse their tables and filters where it applies:
+        {conversation_context}
+        """
+
+
+def _render_table_hint(table_hint: Optional[List[str]]) -> str:
+    """Name the tables retrieved for the question when the whole schema was sent."""
+    if not table_hint:
+        return ""
+    return f"""
+        The tables most relevant to this question are: {', '.join(table_hint)}.
+        """
+
+
+def build_prompt_prefix(schema_context: str) -> str:
+    """
+    Render the constant head of the SQL generation prompt.
+    
+    Everything that does not depend on the question comes first, so
+    consecutive prompts share this prefix and Ollama can reuse its evaluation.
+    """
+    return f"""
+        You are an expert Database Engineer and Data Analyst.
+        
+        Your goal is to generate valid PostgreSQL queries based on the user's question.
+        
+        Instructions:
+        1. Return ONLY the SQL code. No markdown (```sql), no explanations.
+        2. Use the table names and column names exactly as defined in the schema.
+        3. Pay close attention to the Relationships and Business logic in the schema.
+        4. For profit calculations, use the formula: (Sales Revenue - Purchase Cost).
+        5. Tables with a large row estimate are expensive: filter them on indexed columns and aggregate instead of scanning them whole.
+        6. When the schema lists pre-aggregated daily tables, use them for revenue, cost and profit by product or date.
+        
+        Here is the Database Schema:
+        -------------------------------------------
+        {schema_context}
+        -------------------------------------------
+        """
+
+
+def _build_prompt(
+    schema_context: str,
+    user_input: str,
+    feedback: Optional[str] = None,
+    conversation_context: Optional[str] = None,
+    table_hint: Optional[List[str]] = None
+) -> str:
+    """Render the SQL generation prompt for a rendered schema and a user question."""
+    return f"""{build_prompt_prefix(schema_context)}{_render_table_hint(table_hint)}{_render_conversation(conversation_context)}
+        Here's user's question: 
+        {user_input}
+        {_render_feedback(feedback)}"""
+
+
+def _clean_sql(sql_query: str) -> str:
+    """Clean up markdown if the LLM adds it by mistake (common issue)."""
+    return sql_query.replace("```sql", "").replace("```", "").strip()
+
+
+_DOLLAR_TAG = re.compile(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$")
+_PARTIAL_DOLLAR_TAG = re.compile(r"\$(?:[A-Za-z_][A-Za-z0-9_]*)?")
+
+
+class StatementScanner:
+    """
+    Incrementally detect the end of the first SQL statement in streamed text.
+    
+    Semicolons inside string literals, quoted identifiers, dollar-quoted
+    bodies and comments are ignored. Once a terminator is seen, ``complete``
+    is True and ``statement`` holds the text up to and including it.
+    """
+    
+    def __init__(self):
+        self._buffer = []
+        self._length = 0
+        self._state = None  # None, "'", '"', "--", "/*" or a $tag$ delimiter
+        self._pending = ""  # Unconsumed tail that may start a multi-char token
+        self.complete = False
+        self.statement = ""
+    
+    def feed(self, chunk: str) -> bool:
+        """Consume a streamed chunk; return True once the statement is complete."""
+        if self.complete:
+            return True
+        self._buffer.append(chunk)
+        text = self._pending + chunk
+        offset = self._length - len(self._pending)
+        self._length += len(chunk)
+        i = 0
+        while i < len(text):
+            state = self._state
+            ch = text[i]
+            if state is None:
+                two = text[i:i + 2]
+                if ch == ";":
+                    self.complete = True
+                    self.statement = "".join(self._buffer)[:offset + i + 1]
+                    return True
+                if ch in ("'", '"'):
+                    self._state = ch
+                elif two in ("--", "/*"):
+                    self._state = two
+                    i += 1
+                elif ch in ("-", "/") and i == len(text) - 1:
+                    break  # May be the first half of a comment opener
+                elif ch == "$":
+                    match = _DOLLAR_TAG.match(text, i)
+                    if match is not None:
+                        self._state = match.group(0)
+                        i = match.end() - 1
+                    elif _PARTIAL_DOLLAR_TAG.fullmatch(text, i):
+                        break  # Tag may complete in the next chunk
+            elif state in ("'", '"'):
+                if ch == state:
+                    self._state = None
+            elif state == "--":
+                if ch == "\n":
+                    self._state = None
+            elif state == "/*":
+                if text[i:i + 2] == "*/":
+                    self._state = None
+                    i += 1
+                elif ch == "*" and i == len(text) - 1:
+                    break
+            else:
+                if text.startswith(state, i):
+                    self._state = None
+                    i += len(state) - 1
+                elif ch == "$" and len(text) - i < len(state):
+                    break
+            i += 1
+        self._pending = text[i:]
+        return False
+    
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self._buffer)
+
+
+def _with_callback(config: Optional[Any], handler: "BaseCallbackHandler") -> Dict[str, Any]:
+    """Add a callback handler to a runnable config without dropping the caller's callbacks."""
+    config = dict(config or {})
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        callbacks = [handler]
+    elif isinstance(callbacks, list):
+        callbacks = [*callbacks, handler]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=False)
+    config["callbacks"] = callbacks
+    return config
+
+
 def generate_sql_query(
     user_input: str,
     schema_path: str = None,
+    schema_context: Optional[str] = None,
     ollama_url: str = OLLAMA_URL,
-    model: str = "mannix/defog-llama3-sqlcoder-8b"
+    model: str = OLLAMA_MODEL,
+    feedback: Optional[str] = None,
+    conversation_context: Optional[str] = None,
+    table_hint: Optional[List[str]] = None
 ) -> Optional[str]:
     """
     Generate a SQL query from natural language using the database schema.
@@ -39,51 +219,108 @@ def generate_sql_query(
     Args:
         user_input: The natural language prompt describing the SQL query to generate
         schema_path: Path to schema.json file. If None, uses schema.json in the same directory.
+        schema_context: Pre-rendered schema text. If None, taken from the schema registry.
         ollama_url: The base URL of the Ollama API (default: http://localhost:11434)
-        model: The model name to use (default: mannix/defog-llama3-sqlcoder-8b)
+        model: The model name to use (default: OLLAMA_MODEL, mannix/defog-llama3-sqlcoder-8b)
+        feedback: Why a previous query was rejected (e.g. its plan was too expensive)
+        conversation_context: Earlier turns relevant to a follow-up question
+        table_hint: Tables retrieved for the question when schema_context is the whole schema
     
     Returns:
         The generated SQL query as a string, or None if an error occurred
     """
     try:
-        # Load and format schema
-        schema = load_schema(schema_path)
-        prompt = f"""
-        You are an expert Database Engineer and Data Analyst.
+        # Reuse the registry's pre-rendered schema unless the caller supplied one
+        if schema_context is None:
+            schema_context = get_schema_registry(schema_path).get().prompt_context
+        prompt = _build_prompt(schema_context, user_input, feedback, conversation_context, table_hint)
         
-        Your goal is to generate valid PostgreSQL queries based on the user's question.
+        llm = get_llm_registry().get(ollama_url, model)
         
-        Here is the Database Schema in JSON format:
-        -------------------------------------------
-        {schema}
-        -------------------------------------------
+        # Stream the completion and stop reading at the first statement terminator
+        from .generation_stats import GenerationStats
+
+        scanner = StatementScanner()
+        stats = GenerationStats(model)
+        for chunk in llm.stream(prompt, config=_with_callback(None, stats)):
+            stats.on_chunk()
+            if scanner.feed(chunk):
+                break
+        stats.record()
+        sql_query = scanner.statement if scanner.complete else scanner.text
+        print(sql_query)
         
-        Instructions:
-        1. Return ONLY the SQL code. No markdown (```sql), no explanations.
-        2. Use the table names and column names exactly as defined in the schema.
-        3. Pay close attention to the 'relationships' and 'business_logic' in the schema.
-        4. For profit calculations, use the formula: (Sales Revenue - Purchase Cost).
+        return _clean_sql(sql_query)
+        
+    except FileNotFoundError as e:
+        print(f"Error: Schema file not found: {e}")
+        return None
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON in schema file: {e}")
+        return None
+    except Exception as e:
+        print(f"Error calling Ollama API through LangChain: {e}")
+        return None
 
-        Here's user's question: 
-        {user_input}
-        """
+
+async def agenerate_sql_query(
+    user_input: str,
+    schema_path: str = None,
+    schema_context: Optional[str] = None,
+    ollama_url: str = OLLAMA_URL,
+    model: str = OLLAMA_MODEL,
+    config: Optional[Any] = None,
+    feedback: Optional[str] = None,
+    conversation_context: Optional[str] = None,
+    table_hint: Optional[List[str]] = None
+) -> Optional[str]:
+    """
+    Async variant of generate_sql_query that streams the Ollama completion.
+    
+    Tokens are surfaced as LangChain ``on_llm_stream`` events through the
+    given runnable config, and reading stops as soon as the first complete
+    statement has arrived, so the caller can move on to execution without
+    waiting for the model's trailing tokens.
+    
+    Args:
+        user_input: The natural language prompt describing the SQL query to generate
+        schema_path: Path to schema.json file. If None, uses schema.json in the same directory.
+        schema_context: Pre-rendered schema text. If None, taken from the schema registry.
+        ollama_url: The base URL of the Ollama API (default: http://localhost:11434)
+        model: The model name to use (default: OLLAMA_MODEL, mannix/defog-llama3-sqlcoder-8b)
+        config: Runnable config of the calling graph node, used to propagate callbacks
+        feedback: Why a previous query was rejected (e.g. its plan was too expensive)
+        conversation_context: Earlier turns relevant to a follow-up question
+        table_hint: Tables retrieved for the question when schema_context is the whole schema
+    
+    Returns:
+        The generated SQL query as a string, or None if an error occurred
+    """
+    try:
+        if schema_context is None:
+            schema_context = get_schema_registry(schema_path).get().prompt_context
+        prompt = _build_prompt(schema_context, user_input, feedback, conversation_context, table_hint)
         
-          
-        llm = OllamaLLM(
-            base_url=ollama_url,
-            model=model,
-            timeout=300,
-            num_ctx=2048 
-        )
+        llm = get_llm_registry().get(ollama_url, model)
         
-        sql_query = llm.invoke(prompt)
+        from .generation_stats import GenerationStats
+
+        scanner = StatementScanner()
+        stats = GenerationStats(model)
+        stream = llm.astream(prompt, config=_with_callback(config, stats))
+        try:
+            async for chunk in stream:
+                stats.on_chunk()
+                if scanner.feed(chunk):
+                    break
+        finally:
+            # Closing the stream drops the HTTP response and Ollama stops generating
+            await stream.aclose()
+        stats.record()
+        sql_query = scanner.statement if scanner.complete else scanner.text
         print(sql_query)
-        # sql_query = sql_query.choices[0].message.content.strip()
-        
-        # Clean up markdown if the LLM adds it by mistake (common issue)
-        sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
         
-        return sql_query
+        return _clean_sql(sql_query)
         
     except FileNotFoundError as e:
         print(f"Error: Schema file not found: {e}")
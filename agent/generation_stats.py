@@ -0,0 +1,58 @@
+"""
+Per-generation LLM timing and token counts, reported to telemetry.
+
+Kept apart from generate_sql_query.py because subclassing LangChain's
+callback handler imports langchain_core; this module is imported by the
+first generation instead of at startup.
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .telemetry import record_llm
+
+
+class GenerationStats(BaseCallbackHandler):
+    """
+    Timing and token counts of one streamed completion.
+    
+    Ollama reports prompt/completion token counts and eval durations only with
+    its final chunk. Reading usually stops at the statement terminator before
+    that chunk arrives; the streamed chunk count (one per token) and the
+    measured time after the first token are used instead.
+    """
+    
+    def __init__(self, model: str):
+        self.model = model
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.chunks = 0
+        self.reported: Dict[str, Any] = {}
+    
+    def on_chunk(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.chunks += 1
+    
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                self.reported.update(generation.generation_info or {})
+    
+    def record(self) -> None:
+        finished = time.perf_counter()
+        first_token = self.first_token_at - self.started if self.first_token_at else None
+        if self.reported.get("eval_duration"):
+            eval_seconds = self.reported["eval_duration"] / 1e9
+        else:
+            eval_seconds = finished - self.first_token_at if self.first_token_at else None
+        record_llm(
+            self.model,
+            finished - self.started,
+            first_token_seconds=first_token,
+            eval_seconds=eval_seconds,
+            prompt_tokens=self.reported.get("prompt_eval_count"),
+            completion_tokens=self.reported.get("eval_count", self.chunks),
+        )
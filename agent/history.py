@@ -0,0 +1,239 @@
+"""
+Bounded conversation history for a chat session.
+
+Each answered question is kept as a structured Turn (question, SQL, tables,
+row count) in a ring buffer capped by both a turn count and an approximate
+token budget. Turns pushed out of the buffer are compacted into one-line
+summaries, which are themselves kept in a bounded ring, so a session's
+history never grows without limit and appending never copies it.
+
+For a follow-up question ("and for last month?", "only the top 5 of
+those"), ``context_for`` renders just the relevant recent turns for the SQL
+generation prompt; standalone questions get no conversation context at all.
+"""
+
+import os
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+from .config import load_environment
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: History bounds
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "8"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_SUMMARY_ITEMS = int(os.getenv("HISTORY_SUMMARY_ITEMS", "20"))
+HISTORY_CONTEXT_TURNS = int(os.getenv("HISTORY_CONTEXT_TURNS", "2"))
+
+# Questions that lean on an earlier answer
+_FOLLOW_UP_START = re.compile(
+    r"^\s*(and|or|but|also|now|then|what about|how about|same|instead|"
+    r"compare (it|that|them|with|to)|versus|vs\.?|break (it|that|them) down)\b",
+    re.IGNORECASE,
+)
+# Reference words only count without a noun of their own: "sort them",
+# "only those in Berlin" and "do that for 2022" lean on an earlier answer,
+# "suppliers that ship to Berlin" or "sales before 2023" do not
+_FOLLOW_UP_PRONOUN = re.compile(r"\b(them|it)\b", re.IGNORECASE)
+_NO_NOUN = (
+    r"\s*(?=$|[^\w\s]|(in|from|with|without|by|for|at|on|of|over|under|between|"
+    r"who|which|where|whose|again|too|only|instead|first|last|sorted|ordered|grouped)\b)"
+)
+_FOLLOW_UP_DEMONSTRATIVE = re.compile(
+    r"\b(those|these)\b(" + _NO_NOUN + r"|\s+(are|were|is|was|have|had|did)\b)"
+    r"|\bthat\b" + _NO_NOUN,
+    re.IGNORECASE,
+)
+_FOLLOW_UP_PHRASE = re.compile(
+    r"\b(the same|as before|(the|from|of|in) above"
+    r"|(the )?(previous|last|above) (one|ones|result|results|answer|query|question|list))\b",
+    re.IGNORECASE,
+)
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset({
+    "a", "an", "the", "of", "for", "in", "on", "by", "to", "and", "or", "me",
+    "show", "list", "give", "what", "which", "how", "many", "much", "is",
+    "are", "with", "all", "per", "each", "from", "get", "find",
+})
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def _keywords(text: str) -> set:
+    return {word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS}
+
+
+def is_follow_up(question: str) -> bool:
+    """True if the question looks like it refers to an earlier answer."""
+    return bool(
+        _FOLLOW_UP_START.search(question)
+        or _FOLLOW_UP_PRONOUN.search(question)
+        or _FOLLOW_UP_DEMONSTRATIVE.search(question)
+        or _FOLLOW_UP_PHRASE.search(question)
+    )
+
+
+class Turn:
+    """
+    One answered question.
+
+    Attributes:
+        question: The user's message
+        sql: SQL that was executed (empty if generation failed)
+        tables: Tables the SQL was generated against
+        row_count: Number of rows returned
+        error: Execution error, if any
+        at: Unix timestamp of the turn
+    """
+
+    __slots__ = ("question", "sql", "tables", "row_count", "error", "at")
+
+    def __init__(
+        self,
+        question: str,
+        sql: str = "",
+        tables: Optional[Iterable[str]] = None,
+        row_count: int = 0,
+        error: Optional[str] = None,
+        at: Optional[float] = None,
+    ):
+        self.question = question
+        self.sql = sql or ""
+        self.tables = list(tables or [])
+        self.row_count = row_count
+        self.error = error
+        self.at = time.time() if at is None else at
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.question) + estimate_tokens(self.sql)
+
+    def summary_line(self) -> str:
+        """Compact one-line description used once the turn is compacted."""
+        if self.error:
+            outcome = "failed"
+        else:
+            outcome = f"{self.row_count} rows"
+            if self.tables:
+                outcome += f" from {', '.join(self.tables)}"
+        return f'"{self.question}" -> {outcome}'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "question": self.question,
+            "sql": self.sql,
+            "tables": self.tables,
+            "row_count": self.row_count,
+            "error": self.error,
+            "at": self.at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Turn":
+        return cls(
+            data.get("question", ""),
+            data.get("sql", ""),
+            data.get("tables"),
+            data.get("row_count", 0),
+            data.get("error"),
+            data.get("at"),
+        )
+
+
+class ConversationHistory:
+    """
+    Ring buffer of recent turns plus compacted summaries of older ones.
+
+    Args:
+        max_turns: Turns kept verbatim
+        token_budget: Approximate token budget for the verbatim turns
+        summary_items: Compacted summary lines kept
+    """
+
+    def __init__(
+        self,
+        max_turns: int = HISTORY_MAX_TURNS,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+        summary_items: int = HISTORY_SUMMARY_ITEMS,
+    ):
+        self.max_turns = max(1, max_turns)
+        self.token_budget = token_budget
+        self.turns: Deque[Turn] = deque()
+        self.summary: Deque[str] = deque(maxlen=max(1, summary_items))
+        self.compacted = 0
+        self._tokens = 0
+
+    def add(self, turn: Turn) -> None:
+        """Append a turn, compacting the oldest ones if a bound is exceeded."""
+        self.turns.append(turn)
+        self._tokens += turn.tokens
+        while len(self.turns) > 1 and (
+            len(self.turns) > self.max_turns or self._tokens > self.token_budget
+        ):
+            oldest = self.turns.popleft()
+            self._tokens -= oldest.tokens
+            self.summary.append(oldest.summary_line())
+            self.compacted += 1
+
+    def questions(self) -> List[str]:
+        """Questions of the turns still kept verbatim, oldest first."""
+        return [turn.question for turn in self.turns]
+
+    def context_for(self, question: str, max_turns: int = HISTORY_CONTEXT_TURNS) -> str:
+        """
+        Render the conversation context relevant to a new question.
+
+        Args:
+            question: The new user message
+            max_turns: Most verbatim turns to include
+
+        Returns:
+            Prompt text with the relevant earlier turns, or "" for standalone questions
+        """
+        if not self.turns or not is_follow_up(question):
+            return ""
+
+        # The latest turn is what a follow-up most often refers to; add older
+        # turns only when they share vocabulary with the new question.
+        latest = self.turns[-1]
+        words = _keywords(question)
+        related = [
+            turn for turn in list(self.turns)[:-1]
+            if words & (_keywords(turn.question) | set(turn.tables))
+        ]
+        selected = related[-(max_turns - 1):] if max_turns > 1 else []
+        selected.append(latest)
+
+        lines: List[str] = []
+        if self.summary:
+            lines.append("Earlier in this conversation: " + "; ".join(list(self.summary)[-3:]))
+        for turn in selected:
+            lines.append(f"Previous question: {turn.question}")
+            if turn.sql:
+                lines.append(f"Previous SQL: {turn.sql}")
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turns": [turn.to_dict() for turn in self.turns],
+            "summary": list(self.summary),
+            "compacted": self.compacted,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "ConversationHistory":
+        history = cls()
+        if not data:
+            return history
+        history.summary.extend(data.get("summary", []))
+        history.compacted = data.get("compacted", 0)
+        for turn in data.get("turns", []):
+            history.add(Turn.from_dict(turn))
+        return history
@@ -0,0 +1,254 @@
+"""
+Index advisor driven by the SQL the agent actually executes.
+
+Every statement that reaches the database is recorded (grouped by its
+literal-masked fingerprint) with its call count and execution time. On
+request, the advisor re-plans the most expensive statements with
+``EXPLAIN (FORMAT JSON)``, finds sequential scans of large tables whose
+filter or join condition uses a column without an index, and recommends a
+supporting index for each, ranked by the execution time of the statements
+that would benefit. Recommendations can be applied with
+``CREATE INDEX CONCURRENTLY`` when INDEX_ADVISOR_ALLOW_CREATE is enabled.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .config import load_environment
+from .cost_guard import get_cost_guard
+from .sql_validator import get_sql_validator
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Index advisor
+INDEX_ADVISOR_ENABLED = os.getenv("INDEX_ADVISOR_ENABLED", "true").lower() == "true"
+INDEX_ADVISOR_MAX_STATEMENTS = int(os.getenv("INDEX_ADVISOR_MAX_STATEMENTS", "500"))
+# Statements re-planned per recommendation run, most expensive first
+INDEX_ADVISOR_ANALYZE_TOP = int(os.getenv("INDEX_ADVISOR_ANALYZE_TOP", "50"))
+# Tables with fewer estimated rows are cheap to scan and get no recommendation
+INDEX_ADVISOR_MIN_ROWS = int(os.getenv("INDEX_ADVISOR_MIN_ROWS", "10000"))
+INDEX_ADVISOR_ALLOW_CREATE = os.getenv("INDEX_ADVISOR_ALLOW_CREATE", "false").lower() == "true"
+
+_JOIN_CONDITIONS = ("Hash Cond", "Merge Cond", "Join Filter")
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_QUALIFIED = re.compile(r'"?([A-Za-z_][A-Za-z0-9_]*)"?\."?([A-Za-z_][A-Za-z0-9_]*)"?')
+_IDENTIFIER = re.compile(r'"?([A-Za-z_][A-Za-z0-9_]*)"?')
+
+_TABLE_INFO_QUERY = """
+SELECT c.reltuples::bigint,
+       ARRAY(SELECT attname FROM pg_attribute
+             WHERE attrelid = c.oid AND attnum > 0 AND NOT attisdropped),
+       ARRAY(SELECT a.attname FROM pg_index i
+             JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+             WHERE i.indrelid = c.oid)
+FROM pg_class c
+WHERE c.oid = to_regclass(%s)
+"""
+
+
+def _sequential_scans(
+    plan: Dict[str, Any], conditions: Tuple[str, ...] = ()
+) -> Iterator[Tuple[str, str, Optional[str], Tuple[str, ...]]]:
+    """Yield (table, alias, filter, enclosing join conditions) for every Seq Scan in a plan."""
+    conditions = conditions + tuple(plan[key] for key in _JOIN_CONDITIONS if plan.get(key))
+    relation = plan.get("Relation Name")
+    if plan.get("Node Type") == "Seq Scan" and relation:
+        yield relation, plan.get("Alias") or relation, plan.get("Filter"), conditions
+    for child in plan.get("Plans") or []:
+        yield from _sequential_scans(child, conditions)
+
+
+def _filter_columns(predicate: str, columns: List[str]) -> List[str]:
+    """Columns of the scanned table referenced by its own filter."""
+    names = set(_IDENTIFIER.findall(_LITERAL.sub("", predicate)))
+    return [column for column in columns if column in names]
+
+
+def _join_columns(conditions: Tuple[str, ...], alias: str, columns: List[str]) -> List[str]:
+    """Columns of the scanned table (by alias) used in an enclosing join condition."""
+    found = set()
+    for condition in conditions:
+        for qualifier, name in _QUALIFIED.findall(_LITERAL.sub("", condition)):
+            if qualifier == alias and name in columns:
+                found.add(name)
+    return sorted(found)
+
+
+def index_name(table: str, column: str) -> str:
+    return f"ix_{table}_{column}"[:63]
+
+
+class IndexAdvisor:
+    """
+    Records executed statements and recommends indexes for them.
+
+    Args:
+        max_statements: Distinct statements (by fingerprint) kept, least recently run evicted
+        min_rows: Row estimate below which a table is not worth indexing
+    """
+
+    def __init__(
+        self,
+        max_statements: int = INDEX_ADVISOR_MAX_STATEMENTS,
+        min_rows: int = INDEX_ADVISOR_MIN_ROWS,
+    ):
+        self.max_statements = max_statements
+        self.min_rows = min_rows
+        self._statements: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.created: List[str] = []
+
+    def record(self, sql_query: str, seconds: float, rows: int) -> None:
+        """Note one execution of a statement."""
+        fingerprint = get_sql_validator().validate(sql_query).fingerprint
+        with self._lock:
+            self.recorded += 1
+            entry = self._statements.get(fingerprint)
+            if entry is None:
+                entry = {"sql": sql_query, "calls": 0, "seconds": 0.0, "rows": 0}
+                self._statements[fingerprint] = entry
+                if len(self._statements) > self.max_statements:
+                    self._statements.popitem(last=False)
+            else:
+                self._statements.move_to_end(fingerprint)
+                entry["sql"] = sql_query
+            entry["calls"] += 1
+            entry["seconds"] += seconds
+            entry["rows"] += rows
+
+    def top_statements(self, limit: int = INDEX_ADVISOR_ANALYZE_TOP) -> List[Dict[str, Any]]:
+        """Recorded statements by total execution time, most expensive first."""
+        with self._lock:
+            entries = [dict(entry) for entry in self._statements.values()]
+        entries.sort(key=lambda entry: -entry["seconds"])
+        return entries[:limit]
+
+    def _table_info(self, cursor, table: str, cache: Dict[str, Any]) -> Optional[Tuple[int, List[str], List[str]]]:
+        if table not in cache:
+            cursor.execute(_TABLE_INFO_QUERY, (table,))
+            cache[table] = cursor.fetchone()
+        return cache[table]
+
+    def recommend(self, connection_string: str = None) -> List[Dict[str, Any]]:
+        """
+        Re-plan the most expensive recorded statements and recommend missing indexes.
+
+        Returns:
+            One entry per (table, column): the reasons (filter / join), how many
+            statements and calls would use it, their total seconds, the table's
+            row estimate and the CREATE INDEX statement, most valuable first
+        """
+        from .run_sql_query import get_connection_pool
+
+        guard = get_cost_guard()
+        candidates: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        table_cache: Dict[str, Any] = {}
+        with get_connection_pool(connection_string).connection() as conn:
+            with conn.cursor() as cursor:
+                for entry in self.top_statements():
+                    try:
+                        plan = guard.explain(cursor, entry["sql"]).plan
+                    except Exception as e:
+                        conn.rollback()
+                        print(f"Warning: index advisor could not plan a recorded statement: {e}")
+                        continue
+                    seen = set()
+                    for table, alias, predicate, conditions in _sequential_scans(plan):
+                        info = self._table_info(cursor, table, table_cache)
+                        if info is None or info[0] < self.min_rows:
+                            continue
+                        estimate, columns, indexed = info
+                        uses = [(column, "filter") for column in _filter_columns(predicate or "", columns)]
+                        uses += [(column, "join") for column in _join_columns(conditions, alias, columns)]
+                        for column, reason in uses:
+                            if column in indexed:
+                                continue
+                            candidate = candidates.setdefault((table, column), {
+                                "table": table,
+                                "column": column,
+                                "reasons": set(),
+                                "statements": 0,
+                                "calls": 0,
+                                "seconds": 0.0,
+                                "row_estimate": int(estimate),
+                            })
+                            candidate["reasons"].add(reason)
+                            if (table, column) not in seen:
+                                seen.add((table, column))
+                                candidate["statements"] += 1
+                                candidate["calls"] += entry["calls"]
+                                candidate["seconds"] += entry["seconds"]
+            conn.rollback()
+
+        recommendations = []
+        for candidate in sorted(candidates.values(), key=lambda c: -c["seconds"]):
+            table, column = candidate["table"], candidate["column"]
+            candidate["reasons"] = sorted(candidate["reasons"])
+            candidate["seconds"] = round(candidate["seconds"], 4)
+            candidate["ddl"] = (
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{index_name(table, column)}" '
+                f'ON "{table}" ("{column}")'
+            )
+            recommendations.append(candidate)
+        return recommendations
+
+    def apply(self, recommendations: List[Dict[str, Any]]) -> List[str]:
+        """
+        Create the recommended indexes on a writable (non-pooled) connection.
+
+        Runs CREATE INDEX CONCURRENTLY, so reads and writes continue meanwhile.
+
+        Returns:
+            Names of the indexes created; failures are printed and skipped
+        """
+        import psycopg2
+
+        from .run_sql_query import DEFAULT_CONNECT_KWARGS
+
+        created = []
+        conn = psycopg2.connect(**DEFAULT_CONNECT_KWARGS)
+        try:
+            # CONCURRENTLY cannot run inside a transaction block
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                for recommendation in recommendations:
+                    try:
+                        cursor.execute(recommendation["ddl"])
+                    except psycopg2.Error as e:
+                        print(f"Warning: could not create index on {recommendation['table']}: {e}")
+                        continue
+                    created.append(index_name(recommendation["table"], recommendation["column"]))
+        finally:
+            conn.close()
+        with self._lock:
+            self.created.extend(created)
+        return created
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "statements": len(self._statements),
+                "recorded": self.recorded,
+                "created": list(self.created),
+            }
+
+
+_advisor: Optional[IndexAdvisor] = None
+_advisor_lock = threading.Lock()
+
+
+def get_index_advisor() -> Optional[IndexAdvisor]:
+    """Return the process-wide index advisor, or None when INDEX_ADVISOR_ENABLED is off."""
+    global _advisor
+    if not INDEX_ADVISOR_ENABLED:
+        return None
+    if _advisor is None:
+        with _advisor_lock:
+            if _advisor is None:
+                _advisor = IndexAdvisor()
+    return _advisor
@@ -0,0 +1,232 @@
+"""
+Managed Ollama clients shared by every SQL generation.
+
+Building an ``OllamaLLM`` per call throws away its HTTP connection pool, and
+an idle Ollama server unloads the model after its keep-alive expires, so the
+next request pays the full model load. The registry keeps one client per
+(base URL, model) with pooled keep-alive connections and fixed generation
+options (a constant ``num_ctx`` matters: changing it forces Ollama to reload
+the model). At startup it sends a warmup generation of the constant prompt
+prefix (instructions plus schema), so the model is resident and the prefix
+is already in the server's KV cache, and afterwards pings the model
+periodically so it is never unloaded while the service is up.
+
+langchain_ollama, ollama and httpx are imported when the first client is
+created, not when this module is imported.
+"""
+
+import asyncio
+import os
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from .config import load_environment
+
+if TYPE_CHECKING:
+    from langchain_ollama.llms import OllamaLLM
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Ollama clients
+OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mannix/defog-llama3-sqlcoder-8b")
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "2048"))
+OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "300"))
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "true").lower() == "true"
+# Seconds between keep-warm pings; 0 disables them
+OLLAMA_KEEP_WARM_INTERVAL = float(os.getenv("OLLAMA_KEEP_WARM_INTERVAL", "240"))
+
+
+def _client_kwargs() -> Dict[str, Any]:
+    import httpx
+
+    return {
+        "timeout": OLLAMA_TIMEOUT,
+        "limits": httpx.Limits(
+            max_connections=OLLAMA_MAX_CONNECTIONS,
+            max_keepalive_connections=OLLAMA_MAX_CONNECTIONS,
+        ),
+    }
+
+
+class LLMClientRegistry:
+    """
+    One pooled Ollama client per (base URL, model), plus warmup and keep-warm.
+
+    httpx async clients are bound to the event loop that first used them, so
+    async callers on a different loop (e.g. a script calling ``asyncio.run``
+    repeatedly) get a fresh client instead of a broken one.
+
+    Args:
+        keep_alive: How long Ollama keeps the model loaded after a request
+        num_ctx: Context window sent with every request
+        keep_warm_interval: Seconds between keep-warm pings (0 disables them)
+    """
+
+    def __init__(
+        self,
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+        num_ctx: int = OLLAMA_NUM_CTX,
+        keep_warm_interval: float = OLLAMA_KEEP_WARM_INTERVAL,
+    ):
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        self.keep_warm_interval = keep_warm_interval
+        self._clients: Dict[Tuple[str, str], Tuple["OllamaLLM", Any]] = {}
+        self._lock = threading.Lock()
+        self._keep_warm_task: Optional["asyncio.Task[None]"] = None
+        self.created = 0
+        self.warmups = 0
+        self.pings = 0
+        self.warm = False
+
+    def _create(self, ollama_url: str, model: str) -> "OllamaLLM":
+        from langchain_ollama.llms import OllamaLLM
+
+        self.created += 1
+        return OllamaLLM(
+            base_url=ollama_url,
+            model=model,
+            num_ctx=self.num_ctx,
+            keep_alive=self.keep_alive,
+            client_kwargs=_client_kwargs(),
+        )
+
+    def get(self, ollama_url: str = OLLAMA_URL, model: str = OLLAMA_MODEL) -> "OllamaLLM":
+        """
+        Return the shared client for a server and model.
+
+        Args:
+            ollama_url: Base URL of the Ollama API
+            model: Model name
+
+        Returns:
+            An OllamaLLM whose connections are reused across calls
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        key = (ollama_url, model)
+        with self._lock:
+            llm, bound_loop = self._clients.get(key, (None, None))
+            if llm is None or (bound_loop is not None and bound_loop.is_closed()):
+                llm, bound_loop = self._create(ollama_url, model), None
+            if loop is not None and bound_loop is not None and bound_loop is not loop:
+                # Another live loop owns the pooled async client
+                return self._create(ollama_url, model)
+            self._clients[key] = (llm, bound_loop or loop)
+        return llm
+
+    def _options(self, **overrides: Any) -> Dict[str, Any]:
+        return {"num_ctx": self.num_ctx, **overrides}
+
+    async def warmup(
+        self,
+        prompt_prefix: str = "",
+        ollama_url: str = OLLAMA_URL,
+        model: str = OLLAMA_MODEL,
+    ) -> bool:
+        """
+        Load the model and evaluate the constant prompt prefix once.
+
+        Generation requests start with the same prefix, so Ollama reuses the
+        cached prefix instead of re-evaluating the schema on every question.
+
+        Returns:
+            True if the warmup succeeded
+        """
+        from ollama import AsyncClient
+
+        try:
+            async with AsyncClient(host=ollama_url, **_client_kwargs()) as client:
+                await client.generate(
+                    model=model,
+                    prompt=prompt_prefix,
+                    options=self._options(num_predict=1),
+                    keep_alive=self.keep_alive,
+                )
+        except Exception as e:
+            print(f"Warning: Ollama warmup of {model} failed: {e}")
+            return False
+        self.warmups += 1
+        self.warm = True
+        return True
+
+    async def ping(self, ollama_url: str = OLLAMA_URL, model: str = OLLAMA_MODEL) -> bool:
+        """Refresh the model's keep-alive without generating anything."""
+        from ollama import AsyncClient
+
+        try:
+            async with AsyncClient(host=ollama_url, **_client_kwargs()) as client:
+                # An empty prompt only loads the model and resets its unload timer
+                await client.generate(
+                    model=model, prompt="", options=self._options(), keep_alive=self.keep_alive
+                )
+        except Exception as e:
+            print(f"Warning: Ollama keep-warm ping of {model} failed: {e}")
+            return False
+        self.pings += 1
+        return True
+
+    async def _keep_warm(self, models: Tuple[str, ...]) -> None:
+        while True:
+            await asyncio.sleep(self.keep_warm_interval)
+            for model in models:
+                await self.ping(model=model)
+
+    async def start(self, prompt_prefix: str = "", models: Tuple[str, ...] = (OLLAMA_MODEL,)) -> bool:
+        """
+        Warm the models up one after another, then keep them loaded in the background.
+
+        Returns:
+            True if every warmup succeeded, False if one failed or OLLAMA_WARMUP is off
+        """
+        if not OLLAMA_WARMUP:
+            return False
+        warmed = True
+        for model in models:
+            warmed = await self.warmup(prompt_prefix, model=model) and warmed
+        if self._keep_warm_task is None and self.keep_warm_interval > 0:
+            self._keep_warm_task = asyncio.ensure_future(self._keep_warm(models))
+        return warmed
+
+    async def aclose(self) -> None:
+        """Stop the keep-warm loop and drop the pooled clients."""
+        task, self._keep_warm_task = self._keep_warm_task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._clients),
+            "created": self.created,
+            "warm": self.warm,
+            "warmups": self.warmups,
+            "pings": self.pings,
+            "keep_alive": self.keep_alive,
+            "num_ctx": self.num_ctx,
+        }
+
+
+_registry: Optional[LLMClientRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_llm_registry() -> LLMClientRegistry:
+    """Return the process-wide LLM client registry, creating it on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = LLMClientRegistry()
+    return _registry
@@ -0,0 +1,118 @@
+"""
+Micro-batching in front of SQL generation.
+
+Dashboards tend to send the same questions many times at once. Identical
+in-flight generations are coalesced (single-flight): the first caller starts
+the LLM call and every concurrent caller with the same key awaits that same
+task instead of queueing another generation on the model server. Distinct
+questions are dispatched concurrently, bounded by ``BATCH_MAX_CONCURRENCY``,
+which defaults to the LLM lane size (and so to ``OLLAMA_NUM_PARALLEL``).
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import load_environment
+from .scheduler import LLM_MAX_CONCURRENCY
+from .telemetry import record_cache
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Batching
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", str(LLM_MAX_CONCURRENCY)))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+
+
+def generation_key(*parts: Optional[str]) -> str:
+    """Hash the inputs that determine a generation (question, schema context, ...)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one running task.
+
+    The task is shielded from cancellation of any single caller, so a client
+    that disconnects does not cancel the work other callers are waiting for.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await the in-flight task for ``key``, starting it with ``factory`` if there is none.
+
+        Args:
+            key: Identity of the work (see generation_key)
+            factory: Zero-argument coroutine function doing the work
+
+        Returns:
+            The task's result (its exception is raised to every caller)
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self.started += 1
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            record_cache("single_flight", "started")
+        else:
+            self.coalesced += 1
+            record_cache("single_flight", "coalesced")
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "inflight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+        }
+
+
+async def gather_bounded(
+    items: Dict[str, Callable[[], Awaitable[Any]]],
+    max_concurrency: int = BATCH_MAX_CONCURRENCY,
+) -> Dict[str, Tuple[Any, Optional[BaseException]]]:
+    """
+    Run keyed coroutine functions with at most ``max_concurrency`` in flight.
+
+    Returns:
+        For each key, ``(result, None)`` on success or ``(None, exception)``
+    """
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[BaseException]]:
+        async with semaphore:
+            try:
+                return await factory(), None
+            except Exception as e:
+                return None, e
+
+    keys = list(items)
+    outcomes = await asyncio.gather(*(run_one(items[key]) for key in keys))
+    return dict(zip(keys, outcomes))
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_generation_single_flight() -> SingleFlight:
+    """Return the process-wide single-flight group for SQL generation."""
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
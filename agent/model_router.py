@@ -0,0 +1,224 @@
+"""
+Route SQL generation between a small fast model and the large model.
+
+Questions are classified cheaply from their text and the selected tables
+(``simple``, ``aggregate``, ``complex``, ``follow_up``, ``repair``), and each
+class is mapped to the model tier tried first. SQL from the fast model is
+accepted only if it validates (token validator plus ``EXPLAIN``); otherwise,
+or when it later fails to execute, the question is escalated to the large
+model. Every attempt is recorded with its latency and outcome.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from .config import load_environment
+from .llm_clients import OLLAMA_MODEL
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Model routing
+# Small model tried first; routing is disabled (every class uses OLLAMA_MODEL) when unset
+OLLAMA_FAST_MODEL = os.getenv("OLLAMA_FAST_MODEL", "")
+# question class -> "fast", "large" or an explicit model name
+MODEL_ROUTES = os.getenv(
+    "MODEL_ROUTES", "simple=fast,aggregate=fast,complex=large,follow_up=large,repair=large"
+)
+# Questions naming at least this many tables (i.e. needing joins) count as complex
+MODEL_ROUTING_COMPLEX_TABLES = int(os.getenv("MODEL_ROUTING_COMPLEX_TABLES", "2"))
+
+QUESTION_CLASSES = ("simple", "aggregate", "complex", "follow_up", "repair")
+
+_COMPLEX_WORDS = re.compile(
+    r"\b(profit|margin|compare|comparison|versus|vs|growth|trend|ratio|percent(age)?|"
+    r"share|rank(ing)?|running|cumulative|year over year|month over month|difference)\b",
+    re.IGNORECASE,
+)
+_AGGREGATE_WORDS = re.compile(
+    r"\b(total|sum|count|how many|average|avg|mean|max(imum)?|min(imum)?|top|most|"
+    r"least|highest|lowest|per|group(ed)? by|by (day|week|month|year|category|product|supplier))\b",
+    re.IGNORECASE,
+)
+
+
+def _tables_named(question: str, tables: Iterable[str]) -> int:
+    """Count the tables a question names, singular or plural ("product", "sales")."""
+    text = question.lower()
+    return sum(
+        1 for table in tables
+        if re.search(rf"\b{re.escape(table.lower().rstrip('s'))}", text)
+    )
+
+
+def classify_question(
+    question: str,
+    tables: Iterable[str] = (),
+    conversation_context: Optional[str] = None,
+    feedback: Optional[str] = None,
+) -> str:
+    """
+    Assign a question to one of QUESTION_CLASSES.
+
+    Args:
+        question: The user's message
+        tables: Tables selected for the prompt; those the question names are counted
+        conversation_context: Earlier turns, set for follow-up questions
+        feedback: Why a previous query for this question was rejected
+    """
+    if feedback:
+        return "repair"
+    if conversation_context:
+        return "follow_up"
+    if (
+        _COMPLEX_WORDS.search(question)
+        or _tables_named(question, tables) >= MODEL_ROUTING_COMPLEX_TABLES
+    ):
+        return "complex"
+    if _AGGREGATE_WORDS.search(question):
+        return "aggregate"
+    return "simple"
+
+
+def parse_routes(spec: str) -> Dict[str, str]:
+    """Parse ``class=tier`` pairs (comma separated) into a mapping."""
+    routes: Dict[str, str] = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        question_class, target = (part.strip() for part in item.split("=", 1))
+        if question_class and target:
+            routes[question_class] = target
+    return routes
+
+
+class ModelRouter:
+    """
+    Choose the model order for a question class and record the outcomes.
+
+    Args:
+        fast_model: Small model tried first (empty disables routing)
+        large_model: Model every escalation ends on
+        routes: ``class=tier`` mapping, see MODEL_ROUTES
+    """
+
+    def __init__(
+        self,
+        fast_model: str = OLLAMA_FAST_MODEL,
+        large_model: str = OLLAMA_MODEL,
+        routes: str = MODEL_ROUTES,
+    ):
+        self.fast_model = fast_model
+        self.large_model = large_model
+        self.routes = parse_routes(routes)
+        self._lock = threading.Lock()
+        self._classes: Dict[str, int] = defaultdict(int)
+        self._models: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"attempts": 0, "accepted": 0, "escalated": 0, "seconds": 0.0}
+        )
+
+    def _resolve(self, target: str) -> str:
+        if target == "fast":
+            return self.fast_model or self.large_model
+        if target == "large":
+            return self.large_model
+        return target
+
+    def models_for(self, question_class: str) -> List[str]:
+        """Models to try for a class, in order; the large model is always last."""
+        first = self._resolve(self.routes.get(question_class, "large"))
+        if first == self.large_model:
+            return [self.large_model]
+        return [first, self.large_model]
+
+    @property
+    def models(self) -> List[str]:
+        """Every model the routes can select, large model first."""
+        models = [self.large_model]
+        for target in self.routes.values():
+            model = self._resolve(target)
+            if model not in models:
+                models.append(model)
+        return models
+
+    def record(
+        self,
+        question_class: str,
+        model: str,
+        generation_seconds: float,
+        validation_seconds: float,
+        outcome: str,
+        reason: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Count one generation attempt and return it as a state entry.
+
+        Args:
+            question_class: Class the question was routed as
+            model: Model that generated the SQL
+            generation_seconds: LLM latency
+            validation_seconds: Parse + EXPLAIN latency (0 if not validated)
+            outcome: "accepted" or "escalated"
+            reason: Why the attempt was escalated
+        """
+        with self._lock:
+            self._classes[question_class] += 1
+            counters = self._models[model]
+            counters["attempts"] += 1
+            counters[outcome] += 1
+            counters["seconds"] += generation_seconds
+        return {
+            "question_class": question_class,
+            "model": model,
+            "generation_seconds": round(generation_seconds, 4),
+            "validation_seconds": round(validation_seconds, 4),
+            "outcome": outcome,
+            "reason": reason,
+            "at": time.time(),
+        }
+
+    def record_execution_failure(self, model: str) -> None:
+        """Count SQL that validated but failed to execute, causing an escalation."""
+        with self._lock:
+            self._models[model]["escalated"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {
+                model: {
+                    "attempts": int(counters["attempts"]),
+                    "accepted": int(counters["accepted"]),
+                    "escalated": int(counters["escalated"]),
+                    "mean_seconds": (
+                        round(counters["seconds"] / counters["attempts"], 4)
+                        if counters["attempts"] else 0.0
+                    ),
+                }
+                for model, counters in self._models.items()
+            }
+            classes = dict(self._classes)
+        return {
+            "fast_model": self.fast_model or None,
+            "large_model": self.large_model,
+            "routes": self.routes,
+            "classes": classes,
+            "models": models,
+        }
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide model router, creating it on first use."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
@@ -0,0 +1,126 @@
+"""
+Repair feedback for SQL that failed validation or execution.
+
+When a generated query fails, the workflow sends it back to the model with
+the Postgres error and a short instruction for that class of error (unknown
+column, grouping error, division by zero, ...). For schema errors the
+instruction lists the valid tables or columns, so the model does not guess
+again. Instructions are rendered once per (error class, tables, schema
+version) and served from an LRU cache afterwards.
+"""
+
+import os
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
+
+from psycopg2 import errorcodes
+
+from .config import load_environment
+from .schema_registry import get_schema_registry
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Repair loop
+# How many times a query that failed validation or execution is regenerated with the error.
+# Each repair costs two workflow steps, so the setting is capped to stay well
+# inside LangGraph's recursion limit.
+_MAX_REPAIRS_CAP = 5
+QUERY_MAX_REPAIRS = max(0, min(int(os.getenv("QUERY_MAX_REPAIRS", "2")), _MAX_REPAIRS_CAP))
+REPAIR_PROMPT_CACHE_SIZE = int(os.getenv("REPAIR_PROMPT_CACHE_SIZE", "256"))
+
+# Postgres SQLSTATE codes of errors the model can usually fix
+_ERROR_CLASSES = {
+    errorcodes.UNDEFINED_COLUMN: "undefined_column",
+    errorcodes.UNDEFINED_TABLE: "undefined_table",
+    errorcodes.AMBIGUOUS_COLUMN: "ambiguous_column",
+    errorcodes.SYNTAX_ERROR: "syntax_error",
+    errorcodes.GROUPING_ERROR: "grouping_error",
+    errorcodes.UNDEFINED_FUNCTION: "undefined_function",
+    errorcodes.AMBIGUOUS_FUNCTION: "undefined_function",
+    errorcodes.DATATYPE_MISMATCH: "datatype_mismatch",
+    errorcodes.INVALID_TEXT_REPRESENTATION: "invalid_literal",
+    errorcodes.INVALID_DATETIME_FORMAT: "invalid_literal",
+    errorcodes.DATETIME_FIELD_OVERFLOW: "invalid_literal",
+    errorcodes.DIVISION_BY_ZERO: "division_by_zero",
+    errorcodes.CARDINALITY_VIOLATION: "cardinality_violation",
+}
+
+_REPAIR_HINTS = {
+    "invalid": "Return exactly one read-only SELECT statement (a WITH ... SELECT is fine).",
+    "undefined_column": "Use only the columns listed below, qualified with their table name or alias.",
+    "undefined_table": "Use only the tables listed below.",
+    "ambiguous_column": "Qualify every column with its table name or alias; these tables share column names.",
+    "syntax_error": "Fix the syntax; return plain PostgreSQL without markdown or explanations.",
+    "grouping_error": "Every selected column must appear in GROUP BY or be inside an aggregate function.",
+    "undefined_function": "Use only built-in PostgreSQL functions and cast arguments to the expected types.",
+    "datatype_mismatch": "Cast values so both sides of each comparison and expression have compatible types.",
+    "invalid_literal": "Write dates as 'YYYY-MM-DD' literals and compare numbers to numeric values, not text.",
+    "division_by_zero": "Guard divisions with NULLIF(denominator, 0).",
+    "cardinality_violation": "A scalar subquery returned several rows; aggregate it or use a join instead.",
+}
+_DEFAULT_HINT = "Write a different query that answers the same question and avoids this error."
+
+
+def classify_error(kind: Optional[str], code: Optional[str] = None) -> str:
+    """
+    Name the error class used to pick repair instructions.
+
+    Args:
+        kind: QueryError kind ("invalid", "rejected", "timeout", "database")
+        code: Postgres SQLSTATE of a database error
+    """
+    if kind != "database":
+        return kind or "database"
+    return _ERROR_CLASSES.get(code or "", "database")
+
+
+def _schema_listing(error_class: str, tables: Tuple[str, ...]) -> str:
+    snapshot = get_schema_registry().get()
+    if error_class == "undefined_table":
+        return "Tables: " + ", ".join(snapshot.tables)
+    names = [name for name in tables if name in snapshot.tables] or list(snapshot.tables)
+    return "\n".join(
+        f"{name}({', '.join(column['name'] for column in snapshot.tables[name].get('columns', []))})"
+        for name in names
+    )
+
+
+@lru_cache(maxsize=REPAIR_PROMPT_CACHE_SIZE)
+def repair_instructions(error_class: str, tables: Tuple[str, ...], schema_version: str) -> str:
+    """
+    Render the instruction part of a repair prompt.
+
+    ``schema_version`` is part of the cache key only, so a schema change
+    renders fresh column listings.
+    """
+    hint = _REPAIR_HINTS.get(error_class, _DEFAULT_HINT)
+    if error_class in ("undefined_column", "undefined_table", "ambiguous_column"):
+        hint += "\n" + _schema_listing(error_class, tables)
+    return hint
+
+
+def repair_feedback(
+    sql_query: str,
+    error: str,
+    error_class: str,
+    tables: Iterable[str] = (),
+) -> str:
+    """
+    Build the feedback passed to SQL generation for a failed query.
+
+    Args:
+        sql_query: The query that failed
+        error: The validator or Postgres error message
+        error_class: Result of classify_error
+        tables: Tables selected for the prompt
+    """
+    schema_version = get_schema_registry().get().version
+    instructions = repair_instructions(error_class, tuple(sorted(tables)), schema_version)
+    return f"Query: {sql_query}\nError: {error}\n{instructions}"
+
+
+def repair_cache_stats() -> dict:
+    """Hit/miss counters of the repair instruction cache."""
+    info = repair_instructions.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
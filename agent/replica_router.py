@@ -0,0 +1,519 @@
+"""
+Routing of read-only queries across a primary and its read replicas.
+
+With ``POSTGRES_REPLICAS`` set, every query of the default database goes
+to a replica chosen per query:
+
+- ``least_outstanding`` (default): the replica running the fewest of the
+  agent's queries; ties are broken at random.
+- ``latency``: outstanding queries weighted by the replica's moving-average
+  query latency, so a slow or distant replica gets proportionally less work.
+
+A background health check connects to every backend every
+``REPLICA_HEALTH_CHECK_INTERVAL`` seconds and measures its replication lag.
+A replica is eligible for a query only while it is healthy and its lag,
+plus the time since it was measured, is within the query's maximum
+staleness (``REPLICA_MAX_STALENESS`` unless the request asks for less; ``0``
+sends the query to the primary). ``REPLICA_EJECT_AFTER`` consecutive
+failures (health checks or dropped connections) eject a backend;
+``REPLICA_READMIT_AFTER`` consecutive successful checks re-admit it. A
+standby whose WAL receiver is no longer streaming is ejected at once: it
+would report no lag while falling further behind.
+
+The agent only runs read-only statements, so a query whose replica goes
+away mid-query (connection lost, server shutting down, cancelled by a
+recovery conflict) or whose pool is exhausted is simply run again on the
+next candidate. The primary is always the last candidate.
+
+While a query runs, ``serving_backend()`` names the backend it runs on, so
+callers can tell how stale its result may be (e.g. before caching it).
+"""
+
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+
+from .config import load_environment
+from .connection_pool import ConnectionPool, PoolTimeout, get_pool
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Read replicas
+# Comma-separated replicas: host[:port] (database and credentials of the primary) or full DSNs
+POSTGRES_REPLICAS = os.getenv("POSTGRES_REPLICAS", "")
+# least_outstanding or latency
+REPLICA_ROUTING = os.getenv("REPLICA_ROUTING", "least_outstanding")
+REPLICA_MAX_STALENESS = float(os.getenv("REPLICA_MAX_STALENESS", "30"))
+REPLICA_HEALTH_CHECK_INTERVAL = float(os.getenv("REPLICA_HEALTH_CHECK_INTERVAL", "5"))
+REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", "3"))
+REPLICA_EJECT_AFTER = int(os.getenv("REPLICA_EJECT_AFTER", "2"))
+REPLICA_READMIT_AFTER = int(os.getenv("REPLICA_READMIT_AFTER", "2"))
+# Let the primary take queries like a replica instead of only as the last resort
+REPLICA_PRIMARY_READS = os.getenv("REPLICA_PRIMARY_READS", "false").lower() in ("1", "true", "yes")
+
+ROUTING_STRATEGIES = ("least_outstanding", "latency")
+
+# Replay lag in seconds (0 on a primary and on a standby that replayed everything it
+# received) and whether a standby still receives WAL. Without pg_read_all_stats the
+# receiver's status reads as NULL, so only a missing receiver counts as stopped.
+_LAG_QUERY = """
+SELECT
+    CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END,
+    NOT pg_is_in_recovery() OR EXISTS (
+        SELECT 1 FROM pg_stat_wal_receiver WHERE status IS NULL OR status = 'streaming'
+    )
+"""
+
+T = TypeVar("T")
+
+# Backend whose connection the current query is using, set by ReplicaRouter.checkout()
+_serving: "contextvars.ContextVar[Optional[Backend]]" = contextvars.ContextVar(
+    "db_agent_serving_backend", default=None
+)
+
+
+def serving_backend() -> Optional["Backend"]:
+    """The backend running the current query, or None outside a routed query."""
+    return _serving.get()
+
+
+def is_failover_error(e: BaseException) -> bool:
+    """
+    True when a query that failed this way can be run again on another backend.
+
+    Lost connections, shutting-down servers, exhausted resources and
+    cancellations caused by recovery conflicts say nothing about the query.
+    A statement timeout does, and would hit the next backend as well.
+    """
+    if isinstance(e, PoolTimeout):
+        return True
+    if isinstance(e, psycopg2.errors.QueryCanceled):
+        return False
+    return isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+class ReceiverStopped(Exception):
+    """A standby is reachable but no longer streams WAL from its primary."""
+
+
+def _is_backend_failure(e: BaseException) -> bool:
+    """True when an error means the backend itself is unreachable or going away."""
+    if isinstance(e, PoolTimeout):
+        return False
+    code = getattr(e, "pgcode", None)
+    return code is None or code.startswith(("08", "57P"))
+
+
+class Backend:
+    """
+    One database server the router can send queries to.
+
+    Attributes:
+        name: host:port, for stats and log messages
+        role: ``primary`` or ``replica``
+        lag: Replication lag in seconds at the last health check (None until checked)
+        latency: Moving average of query latency in seconds (None until a query finished)
+    """
+
+    def __init__(self, name: str, role: str, connect_kwargs: Dict[str, Any], pool: ConnectionPool):
+        self.name = name
+        self.role = role
+        self.connect_kwargs = connect_kwargs
+        self.pool = pool
+        self.healthy = True
+        self.lag: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.outstanding = 0
+        self.failures = 0
+        self.successes = 0
+        self.queries = 0
+        self.errors = 0
+        self.ejections = 0
+        self.last_error: Optional[str] = None
+        self._probe_conn: Optional["psycopg2.extensions.connection"] = None
+
+    def staleness(self, now: float) -> float:
+        """Upper bound on how far behind the primary this backend is now."""
+        if self.role == "primary":
+            return 0.0
+        if self.lag is None or self.checked_at is None:
+            return float("inf")
+        return self.lag + (now - self.checked_at)
+
+    def probe(self) -> float:
+        """
+        Measure the replication lag over a dedicated autocommit connection.
+
+        Raises:
+            ReceiverStopped: The backend is a standby without a streaming WAL receiver
+        """
+        if self._probe_conn is None or self._probe_conn.closed:
+            self._probe_conn = psycopg2.connect(
+                **self.connect_kwargs, connect_timeout=REPLICA_CONNECT_TIMEOUT
+            )
+            self._probe_conn.autocommit = True
+        try:
+            with self._probe_conn.cursor() as cursor:
+                cursor.execute(_LAG_QUERY)
+                lag, receiving = cursor.fetchone()
+        except psycopg2.Error:
+            self.close_probe()
+            raise
+        if not receiving:
+            # Receive and replay positions stay equal once the receiver is gone
+            raise ReceiverStopped("WAL receiver is not streaming")
+        return float("inf") if lag is None else max(0.0, float(lag))
+
+    def close_probe(self) -> None:
+        conn, self._probe_conn = self._probe_conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+class ReplicaRouter:
+    """
+    Picks a backend per query and fails over to the next one.
+
+    Args:
+        primary: The primary; always the last candidate
+        replicas: Read replicas
+        strategy: ``least_outstanding`` or ``latency``
+        max_staleness: Default maximum replication lag in seconds a query accepts
+        health_check_interval: Seconds between health checks, 0 to check only at start
+        eject_after: Consecutive failures that eject a backend
+        readmit_after: Consecutive successful health checks that re-admit it
+        primary_reads: Balance queries over the primary as well
+        latency_alpha: Weight of the newest sample in the latency moving average
+    """
+
+    def __init__(
+        self,
+        primary: Backend,
+        replicas: List[Backend],
+        strategy: str = REPLICA_ROUTING,
+        max_staleness: float = REPLICA_MAX_STALENESS,
+        health_check_interval: float = REPLICA_HEALTH_CHECK_INTERVAL,
+        eject_after: int = REPLICA_EJECT_AFTER,
+        readmit_after: int = REPLICA_READMIT_AFTER,
+        primary_reads: bool = REPLICA_PRIMARY_READS,
+        latency_alpha: float = 0.2,
+    ):
+        if strategy not in ROUTING_STRATEGIES:
+            raise ValueError(f"Unknown replica routing {strategy!r}; use one of {', '.join(ROUTING_STRATEGIES)}.")
+        self.primary = primary
+        self.replicas = replicas
+        self.strategy = strategy
+        self.max_staleness = max_staleness
+        self.health_check_interval = health_check_interval
+        self.eject_after = max(1, eject_after)
+        self.readmit_after = max(1, readmit_after)
+        self.primary_reads = primary_reads
+        self.latency_alpha = latency_alpha
+        self.failovers = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self._started = False
+        self._checker: Optional[threading.Thread] = None
+        self._checker_lock = threading.Lock()
+        # Blocking queries may run on every backend's pool at once
+        workers = sum(backend.pool.max_size for backend in self.backends)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pg-router")
+
+    @property
+    def backends(self) -> List[Backend]:
+        return [self.primary, *self.replicas]
+
+    # ------------------------------------------------------------------ #
+    # Routing
+    # ------------------------------------------------------------------ #
+    def _score(self, backend: Backend) -> float:
+        if self.strategy == "latency":
+            # Unmeasured backends score 0, so they get a query and a measurement
+            return (backend.latency or 0.0) * (backend.outstanding + 1)
+        return float(backend.outstanding)
+
+    def candidates(self, max_staleness: Optional[float] = None) -> List[Backend]:
+        """
+        Backends to try for one query, best first, ending with the primary.
+
+        Args:
+            max_staleness: Maximum replication lag in seconds the query accepts
+                (default ``max_staleness``); 0 or less means the primary only
+        """
+        self.start()
+        max_staleness = self.max_staleness if max_staleness is None else max_staleness
+        if max_staleness <= 0:
+            return [self.primary]
+        now = time.monotonic()
+        with self._lock:
+            eligible = [
+                backend for backend in self.replicas
+                if backend.healthy and backend.staleness(now) <= max_staleness
+            ]
+            if self.primary_reads and self.primary.healthy:
+                eligible.append(self.primary)
+            random.shuffle(eligible)
+            eligible.sort(key=self._score)
+        if self.primary not in eligible:
+            eligible.append(self.primary)
+        return eligible
+
+    @contextmanager
+    def checkout(self, backend: Backend) -> Iterator["psycopg2.extensions.connection"]:
+        """Borrow a connection of one backend, counting it as outstanding while in use."""
+        with self._lock:
+            backend.outstanding += 1
+            backend.queries += 1
+        started = time.perf_counter()
+        error: Optional[BaseException] = None
+        # Restored with set(), not reset(): a stream may be closed from another context
+        previous = _serving.get()
+        _serving.set(backend)
+        try:
+            with backend.pool.connection() as conn:
+                # Opening a new connection is not part of the backend's query latency
+                started = time.perf_counter()
+                yield conn
+        except BaseException as e:
+            # Includes GeneratorExit when a stream is closed early
+            error = e
+            raise
+        finally:
+            _serving.set(previous)
+            self._finish(backend, time.perf_counter() - started, error)
+
+    def _finish(self, backend: Backend, seconds: Optional[float], error: Optional[BaseException]) -> None:
+        with self._lock:
+            backend.outstanding -= 1
+            if error is None:
+                backend.failures = 0
+                if backend.latency is None:
+                    backend.latency = seconds
+                else:
+                    backend.latency += self.latency_alpha * (seconds - backend.latency)
+                return
+            if not is_failover_error(error):
+                # The query's own fault (syntax, timeout, cost guard): the backend is fine
+                return
+            backend.errors += 1
+            backend.last_error = str(error).strip()
+            ejected = _is_backend_failure(error) and self._fail_locked(backend)
+        if ejected:
+            self._ejected(backend)
+
+    def record_failover(self, backend: Backend, error: BaseException) -> None:
+        with self._lock:
+            self.failovers += 1
+        print(f"Warning: {backend.role} {backend.name} failed, retrying on the next backend: {str(error).strip()}")
+
+    def execute(
+        self,
+        work: Callable[["psycopg2.extensions.connection"], T],
+        max_staleness: Optional[float] = None,
+    ) -> T:
+        """
+        Run ``work(conn)`` on the best backend, failing over on connection loss.
+
+        ``work`` must be safe to repeat (it is a read-only query).
+
+        Raises:
+            Exception: What ``work`` raised, or the last backend's connection error
+        """
+        targets = self.candidates(max_staleness)
+        for attempt, backend in enumerate(targets, 1):
+            try:
+                with self.checkout(backend) as conn:
+                    return work(conn)
+            except Exception as e:
+                if attempt == len(targets) or not is_failover_error(e):
+                    raise
+                self.record_failover(backend, e)
+        raise RuntimeError("No database backend to run the query on.")
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking DB function on the router's executor (see ConnectionPool.run)."""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, context.run, func, *args)
+
+    # ------------------------------------------------------------------ #
+    # Health checks
+    # ------------------------------------------------------------------ #
+    def _fail_locked(self, backend: Backend, immediate: bool = False) -> bool:
+        """Count a failure; returns True when it ejects the backend."""
+        backend.failures += 1
+        backend.successes = 0
+        if backend.healthy and (immediate or backend.failures >= self.eject_after):
+            backend.healthy = False
+            backend.ejections += 1
+            return True
+        return False
+
+    def _ejected(self, backend: Backend) -> None:
+        print(f"Warning: ejected {backend.role} {backend.name}: {backend.last_error}")
+        # Its idle connections are most likely dead
+        backend.pool.discard_idle()
+
+    def check(self) -> None:
+        """Health-check every backend once and update lag, ejections and re-admissions."""
+        for backend in self.backends:
+            try:
+                lag = backend.probe()
+            except Exception as e:
+                with self._lock:
+                    backend.last_error = str(e).strip()
+                    ejected = self._fail_locked(backend, immediate=isinstance(e, ReceiverStopped))
+                if ejected:
+                    self._ejected(backend)
+                continue
+            with self._lock:
+                backend.lag = lag
+                backend.checked_at = time.monotonic()
+                backend.failures = 0
+                backend.successes += 1
+                readmitted = not backend.healthy and backend.successes >= self.readmit_after
+                if readmitted:
+                    backend.healthy = True
+            if readmitted:
+                print(f"Re-admitted {backend.role} {backend.name} (lag {lag:.1f}s)")
+
+    def start(self) -> None:
+        """
+        Run the first health check and start the periodic ones (idempotent).
+
+        Replicas only receive queries once their lag has been measured. With
+        a health check interval of 0 the lag is measured only here.
+        """
+        if self._started:
+            return
+        with self._checker_lock:
+            if self._started or self._closed:
+                return
+            self.check()
+            if self.health_check_interval > 0:
+                self._checker = threading.Thread(
+                    target=self._check_forever, name="pg-replica-check", daemon=True
+                )
+                self._checker.start()
+            self._started = True
+
+    def _check_forever(self) -> None:
+        while not self._closed:
+            time.sleep(self.health_check_interval)
+            if not self._closed:
+                self.check()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "routing": self.strategy,
+                "max_staleness": self.max_staleness,
+                "failovers": self.failovers,
+                "backends": [
+                    {
+                        "name": backend.name,
+                        "role": backend.role,
+                        "healthy": backend.healthy,
+                        "outstanding": backend.outstanding,
+                        "queries": backend.queries,
+                        "errors": backend.errors,
+                        "ejections": backend.ejections,
+                        "lag_seconds": round(backend.lag, 3) if backend.lag is not None else None,
+                        "staleness_seconds": (
+                            round(backend.staleness(now), 3)
+                            if backend.staleness(now) != float("inf") else None
+                        ),
+                        "latency_ms": round(backend.latency * 1000, 3) if backend.latency is not None else None,
+                        "last_error": backend.last_error,
+                    }
+                    for backend in self.backends
+                ],
+            }
+
+    def close(self) -> None:
+        """Stop the health checks (the pools are closed with the other pools)."""
+        self._closed = True
+        for backend in self.backends:
+            backend.close_probe()
+        self._executor.shutdown(wait=False)
+
+
+def _backend_name(connect_kwargs: Dict[str, Any]) -> str:
+    params = dict(connect_kwargs)
+    if "dsn" in params:
+        params.update(psycopg2.extensions.parse_dsn(params.pop("dsn")))
+    return f"{params.get('host') or 'localhost'}:{params.get('port') or 5432}"
+
+
+def _replica_kwargs(entry: str, primary_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """Connection keywords for one POSTGRES_REPLICAS entry."""
+    if "=" in entry or "://" in entry:
+        return {"dsn": entry}
+    host, _, port = entry.partition(":")
+    return dict(primary_kwargs, host=host, port=port or primary_kwargs.get("port") or "5432")
+
+
+def create_replica_router(primary_kwargs: Dict[str, Any], replicas: str = POSTGRES_REPLICAS) -> Optional[ReplicaRouter]:
+    """
+    Build a router from the primary's connection keywords and a replica list.
+
+    Returns:
+        The router, or None when no replicas are configured
+    """
+    entries = [entry.strip() for entry in replicas.split(",") if entry.strip()]
+    if not entries:
+        return None
+    primary = Backend(_backend_name(primary_kwargs), "primary", dict(primary_kwargs), get_pool(None, primary_kwargs))
+    backends = []
+    for entry in entries:
+        kwargs = _replica_kwargs(entry, primary_kwargs)
+        dsn = kwargs["dsn"] if "dsn" in kwargs else psycopg2.extensions.make_dsn(**kwargs)
+        backends.append(Backend(_backend_name(kwargs), "replica", {"dsn": dsn}, get_pool(dsn)))
+    return ReplicaRouter(primary, backends)
+
+
+_router: Optional[ReplicaRouter] = None
+_router_created = False
+_router_lock = threading.Lock()
+
+
+def get_replica_router(primary_kwargs: Dict[str, Any]) -> Optional[ReplicaRouter]:
+    """Return the process-wide router, or None when POSTGRES_REPLICAS is empty."""
+    global _router, _router_created
+    if _router_created:
+        return _router
+    with _router_lock:
+        if not _router_created:
+            _router = create_replica_router(primary_kwargs)
+            _router_created = True
+        return _router
+
+
+def close_replica_router() -> None:
+    """Stop the process-wide router's health checks, if one was created."""
+    global _router, _router_created
+    with _router_lock:
+        router, _router = _router, None
+        _router_created = False
+    if router is not None:
+        router.close()
@@ -0,0 +1,365 @@
+"""
+Cache of executed read-only query results.
+
+Results are keyed on the statement's token stream, bounded by an approximate byte
+budget rather than an entry count, and expire after a per-entry TTL. Entries
+are also dropped as soon as one of the tables they read from (as reported by
+the SQL validator) changes; change events arrive through Postgres
+LISTEN/NOTIFY from the triggers installed by database/change_notifications.py.
+Every invalidation also advances a per-table generation counter; a query
+reads the counters of its tables before it executes and its result is only
+stored if they are unchanged, so a query that overlapped a write cannot put
+pre-write rows back into the cache.
+Each entry also records when it was stored and how far its backend may have
+lagged behind the primary, and a lookup can bound the staleness it accepts.
+Results are held as ColumnarResult (see result_format.py), which needs far
+less memory than one dictionary per row.
+"""
+
+import os
+import select
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+
+from .config import load_environment
+from .result_format import ColumnarResult
+from .sql_validator import SQLSyntaxError, tokenize_sql, validate_sql
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Cache behaviour
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+RESULT_CACHE_NOTIFY_CHANNEL = os.getenv("RESULT_CACHE_NOTIFY_CHANNEL", "db_agent_table_changed")
+
+# Opaque snapshot of the generation counters of a set of tables
+Generation = Tuple[int, Tuple[int, ...]]
+
+
+def canonicalize_sql(sql_query: str) -> str:
+    """
+    Cache key of a statement: its tokens, without whitespace, comments and trailing semicolons.
+
+    Whitespace is only dropped between tokens; string literals and quoted
+    identifiers are kept verbatim, so ``'Product  A'`` and ``'Product A'``
+    get different keys. Text that cannot be tokenized is used as is.
+    """
+    try:
+        tokens = tokenize_sql(sql_query)
+    except SQLSyntaxError:
+        return sql_query
+    while tokens and tokens[-1] == ("op", ";"):
+        tokens.pop()
+    return "\x1f".join(f"{kind[0]}{value}" for kind, value in tokens)
+
+
+def estimate_size(rows: List[Dict[str, Any]]) -> int:
+    """Approximate the in-memory footprint of a list of row dictionaries in bytes."""
+    size = sys.getsizeof(rows)
+    if not rows:
+        return size
+    # Column names are shared between rows, count them once.
+    size += sum(sys.getsizeof(key) for key in rows[0])
+    for row in rows:
+        size += sys.getsizeof(row)
+        size += sum(sys.getsizeof(value) for value in row.values())
+    return size
+
+
+class _Entry:
+    __slots__ = ("result", "size", "tables", "expires_at", "stored_at", "lag")
+
+    def __init__(
+        self,
+        result: ColumnarResult,
+        size: int,
+        tables: FrozenSet[str],
+        expires_at: float,
+        stored_at: float,
+        lag: float,
+    ):
+        self.result = result
+        self.size = size
+        self.tables = tables
+        self.expires_at = expires_at
+        self.stored_at = stored_at
+        self.lag = lag
+
+    def staleness(self, now: float) -> float:
+        """How far behind the primary the cached rows may be by now."""
+        return self.lag + (now - self.stored_at)
+
+
+class ResultCache:
+    """
+    Byte-bounded LRU cache of query results with TTL and table-level invalidation.
+
+    Args:
+        max_bytes: Approximate memory budget for all cached results
+        ttl: Default seconds an entry stays valid
+        max_entry_bytes: Results larger than this are not cached (default: max_bytes / 4)
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+        ttl: float = RESULT_CACHE_TTL,
+        max_entry_bytes: Optional[int] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 4
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_table: Dict[str, set] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.skipped_oversize = 0
+        self.skipped_stale = 0
+        self.too_stale = 0
+
+    @staticmethod
+    def _table_names(tables: FrozenSet[str]) -> List[str]:
+        return sorted({table.lower().rsplit(".", 1)[-1] for table in tables})
+
+    def _generation_locked(self, tables: List[str]) -> Generation:
+        return self._epoch, tuple(self._generations.get(table, 0) for table in tables)
+
+    def generation(self, tables: FrozenSet[str]) -> Generation:
+        """
+        Snapshot the invalidation counters of the tables a statement reads.
+
+        Take it before executing the statement and pass it to put().
+        """
+        with self._lock:
+            return self._generation_locked(self._table_names(tables))
+
+    def _unlink_locked(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for table in entry.tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def get(self, sql_query: str, max_staleness: Optional[float] = None) -> Optional[ColumnarResult]:
+        """
+        Return the cached result of a statement, or None on a miss.
+
+        The returned result is shared with the cache and must be treated as read-only.
+
+        Args:
+            sql_query: The SQL text to look up
+            max_staleness: Seconds the caller accepts the rows to lag behind
+                the primary; entries whose read lag plus age exceed it are
+                skipped (default: any age within the TTL)
+        """
+        key = canonicalize_sql(sql_query)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at < now:
+                self._unlink_locked(key)
+                entry = None
+            if entry is not None and max_staleness is not None and entry.staleness(now) > max_staleness:
+                # Kept for callers that accept older rows
+                self.too_stale += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.result
+
+    def put(
+        self,
+        sql_query: str,
+        result: ColumnarResult,
+        ttl: Optional[float] = None,
+        tables: Optional[FrozenSet[str]] = None,
+        generation: Optional[Generation] = None,
+        lag: float = 0.0,
+    ) -> bool:
+        """
+        Cache the result produced by a statement.
+
+        Args:
+            sql_query: The executed SQL text
+            result: The columnar result of the statement
+            ttl: Seconds this entry stays valid (default: the cache TTL)
+            tables: Tables the statement reads from (default: asked from the SQL validator)
+            generation: generation() of the tables taken before the statement
+                ran; the result is dropped if one of them changed since
+            lag: Seconds the backend that produced the result may have been
+                behind the primary (0 for the primary)
+
+        Returns:
+            True if the result was stored
+        """
+        size = result.estimate_size()
+        if size > self.max_entry_bytes:
+            self.skipped_oversize += 1
+            return False
+        key = canonicalize_sql(sql_query)
+        if tables is None:
+            tables = validate_sql(sql_query).tables
+        names = self._table_names(tables)
+        tables = frozenset(names)
+        stored_at = time.monotonic()
+        expires_at = stored_at + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and generation != self._generation_locked(names):
+                # A table changed while the statement ran; the result may predate the write
+                self.skipped_stale += 1
+                return False
+            self._unlink_locked(key)
+            self._entries[key] = _Entry(result, size, tables, expires_at, stored_at, lag)
+            self._bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._unlink_locked(oldest)
+                self.evictions += 1
+        return True
+
+    def invalidate_table(self, table: str) -> int:
+        """
+        Drop every entry that reads from a table.
+
+        Args:
+            table: Table name, optionally schema-qualified
+
+        Returns:
+            Number of entries removed
+        """
+        table = table.lower().rsplit(".", 1)[-1]
+        with self._lock:
+            self._generations[table] = self._generations.get(table, 0) + 1
+            keys = list(self._by_table.get(table, ()))
+            for key in keys:
+                self._unlink_locked(key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drop all entries (and every result of a statement still running)."""
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_table.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and memory usage."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "skipped_oversize": self.skipped_oversize,
+            "skipped_stale": self.skipped_stale,
+            "too_stale": self.too_stale,
+        }
+
+
+class TableChangeListener(threading.Thread):
+    """
+    Background thread that LISTENs for table-change notifications.
+
+    Each notification payload is a table name and invalidates the matching
+    cache entries. After a lost connection the whole cache is cleared, since
+    notifications sent while disconnected are gone.
+
+    Args:
+        cache: The ResultCache to invalidate
+        connect_kwargs: Keyword arguments forwarded to psycopg2.connect
+        channel: NOTIFY channel written by the change triggers
+        reconnect_delay: Seconds to wait before reconnecting after an error
+    """
+
+    def __init__(
+        self,
+        cache: ResultCache,
+        connect_kwargs: Dict[str, Any],
+        channel: str = RESULT_CACHE_NOTIFY_CHANNEL,
+        reconnect_delay: float = 5.0,
+    ):
+        super().__init__(name="result-cache-listener", daemon=True)
+        self.cache = cache
+        self.connect_kwargs = dict(connect_kwargs)
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._stop_event = threading.Event()
+
+    def _listen(self) -> None:
+        conn = psycopg2.connect(**self.connect_kwargs)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {psycopg2.extensions.quote_ident(self.channel, conn)}")
+            # Anything cached before LISTEN took effect may already be stale.
+            self.cache.clear()
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([conn], [], [], 1.0)
+                if not readable:
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    self.cache.invalidate_table(notify.payload)
+        finally:
+            conn.close()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                print(f"Result cache listener error: {e}")
+                self.cache.clear()
+                self._stop_event.wait(self.reconnect_delay)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Return the process-wide result cache, or None when RESULT_CACHE_ENABLED is false."""
+    global _cache
+    if not RESULT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
@@ -0,0 +1,310 @@
+"""
+Columnar query results and their wire encodings.
+
+A ColumnarResult keeps the column names once and one value list per column,
+transposed straight from the tuples of a plain cursor, so no per-row
+dictionary is ever built unless a caller asks for rows. Results can be
+encoded as:
+
+- JSON rows (``[{"column": value, ...}, ...]``), the original format
+- columnar JSON (``{"columns": [...], "data": [[...], ...]}``, one array per column)
+- an Arrow IPC stream (requires the optional ``pyarrow`` package)
+
+JSON is serialized with orjson when it is installed (falling back to the
+standard library), and response bodies are compressed with zstd (optional
+``zstandard`` package) or gzip, whichever the client accepts.
+"""
+
+import datetime
+import decimal
+import gzip
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .config import load_environment
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Result encoding
+# Format of /chat results when the client does not ask for one: rows, columnar or arrow
+RESULT_FORMAT = os.getenv("RESULT_FORMAT", "rows")
+# Bodies smaller than this are sent uncompressed
+RESULT_COMPRESSION_MIN_BYTES = int(os.getenv("RESULT_COMPRESSION_MIN_BYTES", "1024"))
+RESULT_GZIP_LEVEL = int(os.getenv("RESULT_GZIP_LEVEL", "5"))
+RESULT_ZSTD_LEVEL = int(os.getenv("RESULT_ZSTD_LEVEL", "3"))
+
+RESULT_FORMATS = ("rows", "columnar", "arrow")
+JSON_MEDIA_TYPE = "application/json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class ColumnarResult:
+    """
+    A query result stored column by column.
+
+    Instances served from the result cache are shared and must be treated as
+    read-only.
+
+    Attributes:
+        columns: Column names in select-list order (duplicates are kept)
+        data: One list of values per column, all of length ``row_count``
+        row_count: Number of rows
+        limit: Row limit the cost guard added to the query, or None when the
+            query ran as written
+        truncated: True when the query had more rows than ``limit``
+    """
+
+    __slots__ = ("columns", "data", "row_count", "limit", "truncated")
+
+    def __init__(
+        self,
+        columns: List[str],
+        data: List[List[Any]],
+        row_count: int,
+        limit: Optional[int] = None,
+        truncated: bool = False,
+    ):
+        self.columns = columns
+        self.data = data
+        self.row_count = row_count
+        self.limit = limit
+        self.truncated = truncated
+
+    def cap(self, limit: int) -> None:
+        """Record the row limit and drop the rows past it, marking the result truncated if any."""
+        self.limit = limit
+        if self.row_count > limit:
+            for values in self.data:
+                del values[limit:]
+            self.row_count = limit
+            self.truncated = True
+
+    @classmethod
+    def from_rows(cls, columns: Sequence[str], rows: Sequence[Tuple[Any, ...]]) -> "ColumnarResult":
+        """Transpose row tuples into per-column lists."""
+        if rows:
+            data = [list(values) for values in zip(*rows)]
+        else:
+            data = [[] for _ in columns]
+        return cls(list(columns), data, len(rows))
+
+    @classmethod
+    def from_cursor(cls, cursor) -> "ColumnarResult":
+        """Fetch every row of an executed plain (tuple) cursor."""
+        rows = cursor.fetchall()
+        return cls.from_rows([column[0] for column in cursor.description], rows)
+
+    def to_rows(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Return the (first ``limit``) rows as new dictionaries.
+
+        As with a dict cursor, a repeated column name keeps its last value.
+        """
+        data = self.data if limit is None else [values[:limit] for values in self.data]
+        columns = self.columns
+        return [dict(zip(columns, values)) for values in zip(*data)]
+
+    def take(self, rows: Sequence[int], columns: Optional[Sequence[int]] = None) -> "ColumnarResult":
+        """
+        Return a new result with the given rows and columns, in the given order.
+
+        Args:
+            rows: Row positions to keep
+            columns: Column positions to keep (default: all)
+        """
+        if columns is None:
+            columns = range(len(self.columns))
+        return ColumnarResult(
+            [self.columns[index] for index in columns],
+            [[self.data[index][row] for row in rows] for index in columns],
+            len(rows),
+        )
+
+    def describe(self) -> List[Dict[str, str]]:
+        """Column names with a JSON-level type inferred from the first non-null value."""
+        described = []
+        for column, values in zip(self.columns, self.data):
+            sample = next((value for value in values if value is not None), None)
+            described.append({"name": column, "type": _type_name(sample)})
+        return described
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The columnar JSON shape: column names once and one array per column."""
+        return {"columns": self.columns, "data": self.data}
+
+    def estimate_size(self) -> int:
+        """Approximate in-memory footprint in bytes."""
+        size = sys.getsizeof(self.columns) + sys.getsizeof(self.data)
+        size += sum(sys.getsizeof(column) for column in self.columns)
+        for values in self.data:
+            size += sys.getsizeof(values)
+            size += sum(sys.getsizeof(value) for value in values)
+        return size
+
+    def to_arrow(self):
+        """
+        Convert to a pyarrow Table.
+
+        Column types are inferred by pyarrow; a column it cannot infer (mixed
+        value types) is sent as strings.
+
+        Raises:
+            ImportError: If pyarrow is not installed
+        """
+        import pyarrow as pa
+
+        arrays = []
+        for values in self.data:
+            try:
+                arrays.append(pa.array(values))
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                arrays.append(pa.array([None if value is None else str(value) for value in values]))
+        return pa.Table.from_arrays(arrays, names=self.columns)
+
+    def to_arrow_ipc(self, metadata: Optional[Dict[str, Any]] = None) -> bytes:
+        """
+        Serialize as an Arrow IPC stream.
+
+        Args:
+            metadata: JSON-serializable values stored in the schema metadata
+                under the ``db_agent`` key (SQL, summary, ...)
+
+        Raises:
+            ImportError: If pyarrow is not installed
+        """
+        import pyarrow as pa
+
+        table = self.to_arrow()
+        if metadata:
+            table = table.replace_schema_metadata({"db_agent": dumps(metadata)})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+# Checked in order: bool is an int and datetime is a date
+_TYPE_NAMES = (
+    (bool, "boolean"),
+    (int, "integer"),
+    ((float, decimal.Decimal), "number"),
+    (datetime.datetime, "datetime"),
+    (datetime.date, "date"),
+    (datetime.time, "time"),
+    (datetime.timedelta, "interval"),
+    (str, "string"),
+)
+
+
+def _type_name(value: Any) -> str:
+    if value is None:
+        return "null"
+    for types, name in _TYPE_NAMES:
+        if isinstance(value, types):
+            return name
+    return "string"
+
+
+def arrow_available() -> bool:
+    """Return True when pyarrow can be imported for Arrow IPC output."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def format_results(result: Optional[ColumnarResult], result_format: str) -> Any:
+    """Render a result as JSON rows (``rows``) or column arrays (``columnar``)."""
+    if result_format == "columnar":
+        return (result or ColumnarResult([], [], 0)).to_dict()
+    return result.to_rows() if result is not None else []
+
+
+def _default(value: Any) -> Any:
+    """JSON fallback for the values psycopg2 returns that JSON has no type for."""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize to compact UTF-8 JSON.
+
+    Dates and times become ISO 8601 strings, decimals become numbers.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits; the standard library handles them
+            pass
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+def _accepted(accept_encoding: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into coding -> quality."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick zstd (when zstandard is installed) or gzip from an Accept-Encoding header."""
+    if not accept_encoding:
+        return None
+    accepted = _accepted(accept_encoding)
+    for coding in ("zstd", "gzip"):
+        if coding == "zstd" and zstandard is None:
+            continue
+        if accepted.get(coding, accepted.get("*", 0.0)) > 0:
+            return coding
+    return None
+
+
+def compress(body: bytes, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """
+    Compress a response body for the client.
+
+    Returns:
+        The (possibly compressed) body and its Content-Encoding, or None when
+        it is sent as is (small body, or no supported coding accepted)
+    """
+    if len(body) < RESULT_COMPRESSION_MIN_BYTES:
+        return body, None
+    encoding = choose_encoding(accept_encoding)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=RESULT_ZSTD_LEVEL).compress(body), encoding
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=RESULT_GZIP_LEVEL, mtime=0), encoding
+    return body, None
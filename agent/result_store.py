@@ -0,0 +1,555 @@
+"""
+Server-side storage of executed results, browsable by result id.
+
+``/chat`` stores the result of each turn here and returns only its id, row
+count, column metadata and a preview; ``/results/{id}`` then pages through
+the stored result with keyset pagination, column projection and sorting,
+without running the query again.
+
+Results are kept in memory, least recently used first out, up to
+RESULT_STORE_MAX_BYTES. Results pushed out of that budget (and any single
+result larger than a quarter of it) are spilled to RESULT_STORE_DIR and
+loaded back on access, up to RESULT_STORE_MAX_DISK_BYTES; past that, the
+oldest spilled results are deleted. Every result expires RESULT_STORE_TTL
+seconds after it was stored.
+
+Spilled results are written as tagged JSON, never pickle, so a file planted
+in the spill directory can at worst yield a wrong result, not run code. The
+directory must belong to the service's user and not be writable by anyone
+else (it is created with mode 0700); otherwise spilling is turned off.
+Files are created exclusively, without following symlinks, and readable
+only by their owner.
+
+The store is private to one worker process: a result can only be paged
+through on the worker that ran its query. Result ids start with the id of
+that worker, so a request that reaches another worker is told so instead of
+getting a plain 404. Run a single worker, or route each client to one worker
+(sticky sessions), when results are paged.
+
+Pages are ordered by the requested sort columns with the row number as the
+final tie-breaker, so the order is total and stable. A page cursor names
+the last row returned; the next page starts right after that row's
+position in the sort order, which is looked up instead of counted, so deep
+pages cost the same as the first one.
+"""
+
+import base64
+import datetime
+import decimal
+import glob
+import json
+import os
+import re
+import stat
+import tempfile
+import threading
+import time
+import uuid
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import load_environment
+from .result_format import ColumnarResult
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Result store
+RESULT_STORE_ENABLED = os.getenv("RESULT_STORE_ENABLED", "true").lower() == "true"
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+RESULT_STORE_MAX_DISK_BYTES = int(os.getenv("RESULT_STORE_MAX_DISK_BYTES", str(2 * 1024 * 1024 * 1024)))
+# One default directory per user, so another user's directory is never picked up
+_USER = os.getuid() if hasattr(os, "getuid") else os.getpid()
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", os.path.join(tempfile.gettempdir(), f"db_agent_results-{_USER}"))
+RESULT_STORE_TTL = float(os.getenv("RESULT_STORE_TTL", "3600"))
+# Rows of a stored result returned inline by /chat
+RESULT_PREVIEW_ROWS = int(os.getenv("RESULT_PREVIEW_ROWS", "20"))
+RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", "100"))
+RESULT_PAGE_MAX_SIZE = int(os.getenv("RESULT_PAGE_MAX_SIZE", "10000"))
+
+# Sort orders kept per (result, sort), so following pages skip the sort
+_SORT_CACHE_SIZE = 16
+_SPILL_SUFFIX = ".result"
+# "<worker id>-<result uuid>"
+_RESULT_ID = re.compile(r"([0-9a-f]{8})-[0-9a-f]{32}")
+# Never follow a symlink planted where a spill file goes (the flag is 0 where unsupported)
+_SPILL_WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_NOFOLLOW", 0)
+_SPILL_READ_FLAGS = os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0)
+
+SortSpec = Tuple[Tuple[int, bool], ...]
+
+
+class PageError(ValueError):
+    """Raised for a page request that does not fit the stored result (unknown column, bad cursor)."""
+
+
+class _StoredResult:
+    __slots__ = ("result", "path", "size", "disk_size", "expires_at")
+
+    def __init__(self, result: ColumnarResult, size: int, expires_at: float):
+        self.result: Optional[ColumnarResult] = result
+        self.path: Optional[str] = None
+        self.size = size
+        self.disk_size = 0
+        self.expires_at = expires_at
+
+
+# Values JSON has no type for, packed as {"t": tag, "v": payload} and restored on load.
+# Lists and dicts are packed too, so a packed dict is always a tag.
+_PACKERS = (
+    (decimal.Decimal, "decimal", str),
+    (datetime.datetime, "datetime", datetime.datetime.isoformat),
+    (datetime.date, "date", datetime.date.isoformat),
+    (datetime.time, "time", datetime.time.isoformat),
+    (datetime.timedelta, "timedelta", lambda value: [value.days, value.seconds, value.microseconds]),
+    ((bytes, bytearray, memoryview), "bytes", lambda value: bytes(value).hex()),
+    (uuid.UUID, "uuid", str),
+)
+_UNPACKERS = {
+    "decimal": decimal.Decimal,
+    "datetime": datetime.datetime.fromisoformat,
+    "date": datetime.date.fromisoformat,
+    "time": datetime.time.fromisoformat,
+    "timedelta": lambda payload: datetime.timedelta(*payload),
+    "bytes": bytes.fromhex,
+    "uuid": uuid.UUID,
+}
+
+
+def _pack(value: Any) -> Any:
+    """JSON-safe form of a value; types without a tag (ranges, inet, ...) are kept as text."""
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return {"t": "list", "v": [_pack(item) for item in value]}
+    if isinstance(value, dict):
+        return {"t": "dict", "v": [[key, _pack(item)] for key, item in value.items()]}
+    for types, tag, pack in _PACKERS:
+        if isinstance(value, types):
+            return {"t": tag, "v": pack(value)}
+    return str(value)
+
+
+def _unpack(value: Any) -> Any:
+    if not isinstance(value, dict):
+        return value
+    tag, payload = value["t"], value["v"]
+    if tag == "list":
+        return [_unpack(item) for item in payload]
+    if tag == "dict":
+        return {key: _unpack(item) for key, item in payload}
+    return _UNPACKERS[tag](payload)
+
+
+def _private_dir(path: str) -> None:
+    """
+    Create a directory only the current user can use, or check an existing one.
+
+    Raises:
+        PermissionError: If it is a symlink, belongs to another user or is
+            writable by group or others
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"{path} is not a directory")
+    if hasattr(os, "getuid") and info.st_uid != os.getuid():
+        raise PermissionError(f"{path} belongs to another user")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise PermissionError(f"{path} is writable by other users")
+
+
+def _sort_key(values: List[Any], descending: bool, as_text: bool = False):
+    """Key for sorting row numbers by one column, nulls last in either direction."""
+    present = 1 if descending else 0
+    missing = 0 if descending else 1
+    if as_text:
+        return lambda row: (present, str(values[row])) if values[row] is not None else (missing,)
+    return lambda row: (present, values[row]) if values[row] is not None else (missing,)
+
+
+def sort_order(result: ColumnarResult, sort: SortSpec) -> array:
+    """
+    Row numbers of a result in sort order.
+
+    Sorts once per column, last key first, relying on sort stability; rows
+    that tie on every key keep their original order. A column whose values
+    cannot be compared with each other is sorted by their text.
+    """
+    order = list(range(result.row_count))
+    for index, descending in reversed(sort):
+        values = result.data[index]
+        try:
+            order.sort(key=_sort_key(values, descending), reverse=descending)
+        except TypeError:
+            order.sort(key=_sort_key(values, descending, as_text=True), reverse=descending)
+    return array("q", order)
+
+
+def _positions(order: array) -> array:
+    """Inverse of a sort order: the position of every row number."""
+    positions = array("q", bytes(8 * len(order)))
+    for position, row in enumerate(order):
+        positions[row] = position
+    return positions
+
+
+def parse_sort(sort: Optional[str], columns: List[str]) -> SortSpec:
+    """Parse ``"col,-other"`` (``-`` for descending) into (column index, descending) pairs."""
+    spec = []
+    for item in (sort or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        descending = item.startswith("-")
+        name = item.lstrip("+-")
+        if name not in columns:
+            raise PageError(f"Unknown sort column {name!r}.")
+        spec.append((columns.index(name), descending))
+    return tuple(spec)
+
+
+def parse_columns(names: Optional[str], columns: List[str]) -> Optional[List[int]]:
+    """Parse a comma-separated projection into column indexes (None keeps every column)."""
+    if not names:
+        return None
+    selected = []
+    for name in names.split(","):
+        name = name.strip()
+        if name not in columns:
+            raise PageError(f"Unknown column {name!r}.")
+        selected.append(columns.index(name))
+    return selected
+
+
+def encode_cursor(sort: SortSpec, row: int) -> str:
+    raw = json.dumps([[list(key) for key in sort], row], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: SortSpec) -> int:
+    """Return the row number a cursor points at, checking it was issued for this sort."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        keys, row = json.loads(raw)
+        issued = tuple((int(index), bool(descending)) for index, descending in keys)
+        row = int(row)
+    except (ValueError, TypeError):
+        raise PageError("Malformed cursor.") from None
+    if issued != sort:
+        raise PageError("The cursor was issued for a different sort order.")
+    return row
+
+
+class ResultStore:
+    """
+    Memory-bounded store of results with spill-to-disk, TTL and paged reads.
+
+    Args:
+        max_bytes: Memory budget for all stored results
+        max_disk_bytes: Budget for spilled results; 0 drops results instead of spilling
+        spill_dir: Directory spilled results are written to; spilling is
+            turned off when it is not private to the current user
+        ttl: Seconds a result stays available after it was stored
+
+    Attributes:
+        worker: Random id of this store (one per worker process), prefixed to its result ids
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = RESULT_STORE_MAX_BYTES,
+        max_disk_bytes: int = RESULT_STORE_MAX_DISK_BYTES,
+        spill_dir: str = RESULT_STORE_DIR,
+        ttl: float = RESULT_STORE_TTL,
+    ):
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.spill_dir = spill_dir
+        self.ttl = ttl
+        self.worker = uuid.uuid4().hex[:8]
+        self._entries: Dict[str, _StoredResult] = {}
+        # In-memory results, least recently used first, and spilled ones, oldest first
+        self._memory: "OrderedDict[str, None]" = OrderedDict()
+        self._disk: "OrderedDict[str, None]" = OrderedDict()
+        self._orders: "OrderedDict[Tuple[str, SortSpec], Tuple[array, array]]" = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        # Serializes spilling, so each victim is written exactly once
+        self._spill_lock = threading.Lock()
+
+        self.stored = 0
+        self.spilled = 0
+        self.evictions = 0
+        self.expirations = 0
+        if max_disk_bytes > 0:
+            try:
+                _private_dir(spill_dir)
+            except OSError as e:
+                print(f"Warning: not spilling stored results to {spill_dir}: {e}")
+                self.max_disk_bytes = 0
+            else:
+                self._purge_stale_files()
+
+    def _purge_stale_files(self) -> None:
+        """Remove spill files left behind by earlier processes and already expired."""
+        cutoff = time.time() - self.ttl
+        for path in glob.glob(os.path.join(self.spill_dir, f"*{_SPILL_SUFFIX}")):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _unlink_locked(self, result_id: str) -> Optional[str]:
+        """Forget a result; returns its spill file, for the caller to delete outside the lock."""
+        entry = self._entries.pop(result_id, None)
+        if entry is None:
+            return None
+        if result_id in self._memory:
+            del self._memory[result_id]
+            self._bytes -= entry.size
+        if result_id in self._disk:
+            del self._disk[result_id]
+            self._disk_bytes -= entry.disk_size
+        for key in [key for key in self._orders if key[0] == result_id]:
+            del self._orders[key]
+        return entry.path
+
+    def _expire_locked(self, now: float) -> List[str]:
+        expired = [result_id for result_id, entry in self._entries.items() if entry.expires_at < now]
+        self.expirations += len(expired)
+        return [path for path in map(self._unlink_locked, expired) if path]
+
+    @staticmethod
+    def _remove_files(paths: List[str]) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def put(self, result: ColumnarResult) -> str:
+        """
+        Store a result and return its id.
+
+        Blocks on disk I/O when the store spills, so call it off the event loop.
+        """
+        result_id = f"{self.worker}-{uuid.uuid4().hex}"
+        entry = _StoredResult(result, result.estimate_size(), time.monotonic() + self.ttl)
+        with self._lock:
+            removed = self._expire_locked(time.monotonic())
+            self._entries[result_id] = entry
+            self._memory[result_id] = None
+            self._bytes += entry.size
+            self.stored += 1
+        self._remove_files(removed)
+        large = entry.size > self.max_bytes // 4 and self.max_disk_bytes > 0
+        self._enforce_budgets(result_id if large else None)
+        return result_id
+
+    def _enforce_budgets(self, spill_first: Optional[str] = None) -> None:
+        """Spill (or drop) results until memory and disk are within their budgets."""
+        with self._spill_lock:
+            while True:
+                with self._lock:
+                    if spill_first is not None and spill_first in self._memory:
+                        victim = spill_first
+                        spill_first = None
+                    elif self._bytes > self.max_bytes and self._memory:
+                        victim = next(iter(self._memory))
+                    else:
+                        break
+                    entry = self._entries[victim]
+                    if self.max_disk_bytes <= 0 or entry.size > self.max_disk_bytes:
+                        self._unlink_locked(victim)
+                        self.evictions += 1
+                        continue
+                path = os.path.join(self.spill_dir, f"{victim}{_SPILL_SUFFIX}")
+                try:
+                    self._write(path, entry.result)
+                except OSError as e:
+                    print(f"Warning: could not spill a stored result to {self.spill_dir}: {e}")
+                    with self._lock:
+                        self._unlink_locked(victim)
+                        self.evictions += 1
+                    continue
+                with self._lock:
+                    if self._entries.get(victim) is not entry:
+                        # Expired while it was being written
+                        self._remove_files([path])
+                        continue
+                    del self._memory[victim]
+                    self._bytes -= entry.size
+                    entry.result = None
+                    entry.path = path
+                    entry.disk_size = os.path.getsize(path)
+                    self._disk[victim] = None
+                    self._disk_bytes += entry.disk_size
+                    self.spilled += 1
+                    removed = []
+                    while self._disk_bytes > self.max_disk_bytes and self._disk:
+                        removed.append(self._unlink_locked(next(iter(self._disk))))
+                        self.evictions += 1
+                self._remove_files(removed)
+
+    @staticmethod
+    def _write(path: str, result: ColumnarResult) -> None:
+        partial = f"{path}.partial"
+        with open(os.open(partial, _SPILL_WRITE_FLAGS, 0o600), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "columns": result.columns,
+                    "row_count": result.row_count,
+                    "data": [[_pack(value) for value in values] for values in result.data],
+                },
+                f,
+                separators=(",", ":"),
+            )
+        os.replace(partial, path)
+
+    @staticmethod
+    def _read(path: str) -> ColumnarResult:
+        with open(os.open(path, _SPILL_READ_FLAGS), encoding="utf-8") as f:
+            spilled = json.load(f)
+        data = [[_unpack(value) for value in values] for values in spilled["data"]]
+        return ColumnarResult(spilled["columns"], data, spilled["row_count"])
+
+    def get(self, result_id: str) -> Optional[ColumnarResult]:
+        """Return a stored result (loading it from disk if it was spilled), or None."""
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None and entry.expires_at < time.monotonic():
+                path = self._unlink_locked(result_id)
+                self.expirations += 1
+                entry = None
+                self._remove_files([path] if path else [])
+            if entry is None:
+                return None
+            if entry.result is not None:
+                self._memory.move_to_end(result_id)
+                return entry.result
+            path = entry.path
+        try:
+            return self._read(path)
+        except OSError:
+            # Deleted to make room on disk since the lookup
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"Warning: discarding unreadable spilled result {path}: {e}")
+            self.delete(result_id)
+            return None
+
+    def _order(self, result_id: str, result: ColumnarResult, sort: SortSpec) -> Tuple[array, array]:
+        key = (result_id, sort)
+        with self._lock:
+            cached = self._orders.get(key)
+            if cached is not None:
+                self._orders.move_to_end(key)
+                return cached
+        order = sort_order(result, sort)
+        cached = (order, _positions(order))
+        with self._lock:
+            if result_id in self._entries:
+                self._orders[key] = cached
+                while len(self._orders) > _SORT_CACHE_SIZE:
+                    self._orders.popitem(last=False)
+        return cached
+
+    def page(
+        self,
+        result_id: str,
+        limit: int = RESULT_PAGE_SIZE,
+        after: Optional[str] = None,
+        columns: Optional[str] = None,
+        sort: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Read one page of a stored result.
+
+        Args:
+            result_id: Id returned by put
+            limit: Rows per page (capped at RESULT_PAGE_MAX_SIZE)
+            after: Cursor of the previous page (``next_cursor``), None for the first page
+            columns: Comma-separated column names to return (default: all)
+            sort: Comma-separated sort columns, ``-`` prefix for descending
+                (default: the order the query returned)
+
+        Returns:
+            The page (``result`` as a ColumnarResult, ``row_count`` of the
+            whole result and ``next_cursor``, None on the last page), or None
+            when the result does not exist or expired
+
+        Raises:
+            PageError: For unknown columns or a cursor that does not match the sort
+        """
+        result = self.get(result_id)
+        if result is None:
+            return None
+        limit = max(1, min(limit, RESULT_PAGE_MAX_SIZE))
+        spec = parse_sort(sort, result.columns)
+        selected = parse_columns(columns, result.columns)
+
+        if spec:
+            order, positions = self._order(result_id, result, spec)
+        else:
+            order = positions = None
+        start = 0
+        if after:
+            row = decode_cursor(after, spec)
+            if not 0 <= row < result.row_count:
+                raise PageError("The cursor points outside the result.")
+            start = (positions[row] if positions is not None else row) + 1
+        end = min(start + limit, result.row_count)
+        rows = order[start:end] if order is not None else range(start, end)
+
+        next_cursor = encode_cursor(spec, rows[-1]) if end < result.row_count and len(rows) else None
+        return {
+            "result": result.take(rows, selected),
+            "row_count": result.row_count,
+            "next_cursor": next_cursor,
+        }
+
+    def held_elsewhere(self, result_id: str) -> bool:
+        """True if the id was issued by the result store of another worker process."""
+        match = _RESULT_ID.fullmatch(result_id)
+        return match is not None and match.group(1) != self.worker
+
+    def delete(self, result_id: str) -> None:
+        with self._lock:
+            path = self._unlink_locked(result_id)
+        self._remove_files([path] if path else [])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "worker": self.worker,
+                "results": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "spilled_results": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "stored": self.stored,
+                "spilled": self.spilled,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_store: Optional[ResultStore] = None
+_store_lock = threading.Lock()
+
+
+def get_result_store() -> Optional[ResultStore]:
+    """Return the process-wide result store, or None when RESULT_STORE_ENABLED is false."""
+    global _store
+    if not RESULT_STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ResultStore()
+    return _store
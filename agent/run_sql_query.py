@@ -1,12 +1,22 @@
 import os
-from typing import Optional, List, Dict, Any
-from dotenv import load_dotenv
+import time
+import uuid
+from typing import Optional, List, Dict, Any, Callable, FrozenSet, Iterator, TypeVar
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.errors
+from .config import load_environment
+from .connection_pool import ConnectionPool, PoolTimeout, get_pool
+from .cost_guard import CostVerdict, get_cost_guard
+from .index_advisor import get_index_advisor
+from .replica_router import ReplicaRouter, get_replica_router, is_failover_error, serving_backend
+from .sql_validator import SQLValidation, validate_sql
+from .result_format import ColumnarResult
+from .result_cache import ResultCache, TableChangeListener, estimate_size, get_result_cache
 from .generate_sql_query import generate_sql_query
+from .telemetry import record_cache, record_db
 
 # Load environment variables from .env file
-load_dotenv()
+load_environment()
 
 # Configuration: Database Connection
 db_user = os.getenv("POSTGRES_USER")
@@ -17,6 +27,92 @@ db_port = os.getenv("POSTGRES_PORT", "5432")
 
 DATABASE_URL = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 
+# Configuration: Streaming execution
+STREAM_FETCH_SIZE = int(os.getenv("STREAM_FETCH_SIZE", "1000"))
+STREAM_MAX_ROWS = int(os.getenv("STREAM_MAX_ROWS", "1000000"))
+STREAM_MAX_BYTES = int(os.getenv("STREAM_MAX_BYTES", str(256 * 1024 * 1024)))
+
+DEFAULT_CONNECT_KWARGS = {
+    "host": db_host,
+    "port": db_port,
+    "database": db_name,
+    "user": db_user,
+    "password": db_password,
+}
+
+T = TypeVar("T")
+
+
+class QueryError(Exception):
+    """
+    Raised when a read-only query cannot be executed.
+    
+    Attributes:
+        kind: "invalid" (not read-only), "rejected" (plan over the cost limit),
+              "timeout" (statement_timeout hit), "generation" (the model
+              returned no SQL) or "database" (any other failure)
+        code: Postgres SQLSTATE of a database error, if there is one
+    """
+    
+    def __init__(self, message: str, kind: str = "database", code: Optional[str] = None):
+        super().__init__(message)
+        self.kind = kind
+        self.code = code
+
+
+def get_connection_pool(connection_string: str = None) -> ConnectionPool:
+    """Return the shared read-only pool for the given (or default) database."""
+    return get_pool(connection_string, default_kwargs=DEFAULT_CONNECT_KWARGS)
+
+
+def get_query_router(connection_string: str = None) -> Optional[ReplicaRouter]:
+    """
+    Return the replica router for the default database.
+    
+    Returns:
+        The router, or None for ad-hoc DSNs and when POSTGRES_REPLICAS is empty
+    """
+    # Only the default database is routed; ad-hoc DSNs use their own pool.
+    if connection_string is not None:
+        return None
+    return get_replica_router(DEFAULT_CONNECT_KWARGS)
+
+
+def prepare_database() -> None:
+    """Open the primary pool's warm connections and health-check the replicas."""
+    get_connection_pool().prewarm()
+    router = get_query_router()
+    if router is not None:
+        router.start()
+
+
+def _with_connection(
+    connection_string: Optional[str],
+    work: Callable[[Any], T],
+    max_staleness: Optional[float] = None
+) -> T:
+    """Run ``work(conn)`` on a pooled connection, through the replica router if there is one."""
+    router = get_query_router(connection_string)
+    if router is not None:
+        return router.execute(work, max_staleness)
+    with get_connection_pool(connection_string).connection() as conn:
+        return work(conn)
+
+
+def _executor_for(connection_string: Optional[str]):
+    """The router or pool whose executor runs blocking queries for this database."""
+    return get_query_router(connection_string) or get_connection_pool(connection_string)
+
+
+def start_table_change_listener() -> Optional[TableChangeListener]:
+    """Start the thread that invalidates cached results when watched tables change."""
+    cache = get_result_cache()
+    if cache is None:
+        return None
+    listener = TableChangeListener(cache, DEFAULT_CONNECT_KWARGS)
+    listener.start()
+    return listener
+
 
 def is_readonly_query(query: str) -> bool:
     """
@@ -28,32 +124,269 @@ def is_readonly_query(query: str) -> bool:
     Returns:
         True if the query is read-only, False otherwise
     """
-    # Remove comments and normalize whitespace
-    query_clean = " ".join(query.split())
-    query_upper = query_clean.upper().strip()
+    return validate_sql(query).valid
+
+
+def _guarded_statement(conn, sql_query: str, max_rows: Optional[int] = None) -> CostVerdict:
+    """Apply the statement timeout and cost guard; the verdict's ``sql`` is what to execute."""
+    verdict = get_cost_guard().prepare(conn, sql_query, max_rows)
+    if verdict.rejected:
+        raise QueryError(verdict.reason, kind="rejected")
+    if verdict.rewritten:
+        print(f"Cost guard: {verdict.reason}")
+    return verdict
+
+
+def _query_error(e: Exception) -> QueryError:
+    """Translate a driver/pool exception into a QueryError."""
+    if isinstance(e, psycopg2.errors.QueryCanceled):
+        return QueryError(
+            f"The query was cancelled after exceeding the statement timeout: {e}".strip(),
+            kind="timeout",
+        )
+    return QueryError(str(e).strip(), kind="database", code=getattr(e, "pgcode", None))
+
+
+def _fetch_result(
+    sql_query: str,
+    connection_string: Optional[str],
+    cache: Optional[ResultCache],
+    tables: Optional[FrozenSet[str]] = None,
+    max_staleness: Optional[float] = None
+) -> ColumnarResult:
+    """Run an already validated query on a pooled connection and cache the result."""
+    phases: Dict[str, float] = {}
+    served: Dict[str, Any] = {"lag": 0.0, "cacheable": True}
+    # Read before executing: a change notified while the query runs keeps its result out of the cache
+    generation = cache.generation(tables) if cache is not None and tables is not None else None
+    started = time.perf_counter()
     
-    # Check if query starts with SELECT
-    if not query_upper.startswith("SELECT"):
-        return False
+    def work(conn) -> ColumnarResult:
+        # Repeated on the next backend after a failover; "connect" includes the failed attempts
+        phases["connect"] = time.perf_counter() - started
+        verdict = _guarded_statement(conn, sql_query)
+        phases["plan"] = time.perf_counter() - started - phases["connect"]
+        # A plain cursor returns tuples, which are transposed into columns
+        # without building a dictionary per row
+        with conn.cursor() as cursor:
+            executed = time.perf_counter()
+            cursor.execute(verdict.sql)
+            fetched = time.perf_counter()
+            phases["execute"] = fetched - executed
+            result = ColumnarResult.from_cursor(cursor)
+            phases["fetch"] = time.perf_counter() - fetched
+        if verdict.limit is not None:
+            # The rewritten query fetches one extra row to tell whether it was cut
+            result.cap(verdict.limit)
+        backend = serving_backend()
+        if backend is not None and backend.role != "primary":
+            # Invalidations come from the primary, so rows a lagging replica
+            # returns could outlive the NOTIFY that should have dropped them
+            served["lag"] = backend.staleness(time.monotonic())
+            served["cacheable"] = backend.lag == 0
+        return result
     
-    # List of potentially dangerous SQL keywords that modify data
-    dangerous_keywords = [
-        "INSERT", "UPDATE", "DELETE", "DROP", "CREATE", "ALTER",
-        "TRUNCATE", "GRANT", "REVOKE", "EXEC", "EXECUTE"
-    ]
+    try:
+        # Borrow a pooled connection; the read-only session is set once per connection
+        result = _with_connection(connection_string, work, max_staleness)
+    except (psycopg2.Error, PoolTimeout) as e:
+        raise _query_error(e) from e
     
-    # Check for dangerous keywords (excluding SELECT)
-    for keyword in dangerous_keywords:
-        # Use word boundaries to avoid false positives
-        if f" {keyword} " in query_upper or query_upper.endswith(f" {keyword}"):
-            return False
+    record_db("query", phases, result.row_count)
+    advisor = get_index_advisor()
+    if advisor is not None:
+        advisor.record(sql_query, phases["execute"] + phases["fetch"], result.row_count)
+    # A result cut by the cost guard's LIMIT must not answer the unlimited query
+    if cache is not None and not result.truncated and served["cacheable"]:
+        cache.put(sql_query, result, tables=tables, generation=generation, lag=served["lag"])
+    return result
+
+
+def _check_readonly(sql_query: str) -> SQLValidation:
+    validation = validate_sql(sql_query)
+    if not validation.valid:
+        raise QueryError(validation.reason, kind="invalid")
+    return validation
+
+
+def _explain_statement(sql_query: str, connection_string: Optional[str]) -> None:
+    """Have the planner parse and plan a query without executing it."""
+    guard = get_cost_guard()
+    started = time.perf_counter()
     
-    return True
+    def work(conn) -> None:
+        connected = time.perf_counter()
+        with conn.cursor() as cursor:
+            if guard.statement_timeout > 0:
+                cursor.execute(
+                    "SET LOCAL statement_timeout = %s", (int(guard.statement_timeout * 1000),)
+                )
+            guard.explain(cursor, sql_query)
+        record_db(
+            "check",
+            {"connect": connected - started, "explain": time.perf_counter() - connected},
+        )
+    
+    try:
+        _with_connection(connection_string, work)
+    except (psycopg2.Error, PoolTimeout) as e:
+        raise _query_error(e) from e
+
+
+def check_readonly_query(sql_query: str, connection_string: str = None) -> None:
+    """
+    Check that a query is read-only and that Postgres can plan it, without running it.
+    
+    Catches syntax errors, unknown tables/columns and type errors for the
+    price of one EXPLAIN.
+    
+    Raises:
+        QueryError: If the query is not read-only or cannot be planned
+    """
+    _check_readonly(sql_query)
+    _explain_statement(sql_query, connection_string)
+
+
+async def check_readonly_query_async(sql_query: str, connection_string: str = None) -> None:
+    """
+    Async variant of check_readonly_query.
+    
+    Raises:
+        QueryError: As check_readonly_query
+    """
+    _check_readonly(sql_query)
+    await _executor_for(connection_string).run(_explain_statement, sql_query, connection_string)
+
+
+def _cache_for(connection_string: Optional[str], use_cache: bool) -> Optional[ResultCache]:
+    # Only the default database is cached; ad-hoc DSNs bypass the cache.
+    return get_result_cache() if use_cache and connection_string is None else None
+
+
+def _cached_result(
+    cache: Optional[ResultCache], sql_query: str, max_staleness: Optional[float]
+) -> Optional[ColumnarResult]:
+    # A cached result may have been read from a replica; a request for
+    # up-to-date data (max_staleness=0) goes to the primary instead.
+    if cache is None or (max_staleness is not None and max_staleness <= 0):
+        return None
+    router = get_query_router()
+    if max_staleness is None and router is not None:
+        max_staleness = router.max_staleness
+    cached = cache.get(sql_query, max_staleness)
+    record_cache("result", "hit" if cached is not None else "miss")
+    return cached
+
+
+def run_readonly_query_columnar(
+    sql_query: str,
+    connection_string: str = None,
+    use_cache: bool = True,
+    max_staleness: Optional[float] = None
+) -> ColumnarResult:
+    """
+    Execute a read-only query and return its result column by column.
+    
+    Args:
+        sql_query: The SQL query to execute
+        connection_string: PostgreSQL connection string. If None, uses environment variables.
+        use_cache: Serve and store results through the result cache (default database only)
+        max_staleness: Maximum replication lag in seconds accepted from a read
+            replica (default REPLICA_MAX_STALENESS); 0 reads from the primary
+    
+    Returns:
+        A ColumnarResult. Results served from the result cache are shared and
+        must not be mutated.
+    
+    Raises:
+        QueryError: If the query is not read-only, is rejected by the cost
+            guard, times out or fails in the database
+    """
+    validation = _check_readonly(sql_query)
+    
+    cache = _cache_for(connection_string, use_cache)
+    cached = _cached_result(cache, sql_query, max_staleness)
+    if cached is not None:
+        return cached
+    
+    return _fetch_result(sql_query, connection_string, cache, validation.tables, max_staleness)
+
+
+async def run_readonly_query_columnar_async(
+    sql_query: str,
+    connection_string: str = None,
+    use_cache: bool = True,
+    max_staleness: Optional[float] = None
+) -> ColumnarResult:
+    """
+    Async variant of run_readonly_query_columnar for use inside the event loop.
+    
+    Cache hits are answered inline. Misses run the blocking psycopg2 call on
+    the pool's own executor, so awaiting it never stalls other requests served
+    by the same worker.
+    
+    Raises:
+        QueryError: As run_readonly_query_columnar
+    """
+    validation = _check_readonly(sql_query)
+    
+    cache = _cache_for(connection_string, use_cache)
+    cached = _cached_result(cache, sql_query, max_staleness)
+    if cached is not None:
+        return cached
+    
+    return await _executor_for(connection_string).run(
+        _fetch_result, sql_query, connection_string, cache, validation.tables, max_staleness
+    )
+
+
+def run_readonly_query(
+    sql_query: str,
+    connection_string: str = None,
+    use_cache: bool = True,
+    max_staleness: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """
+    Execute a read-only query, raising QueryError instead of returning None.
+    
+    Args:
+        sql_query: The SQL query to execute
+        connection_string: PostgreSQL connection string. If None, uses environment variables.
+        use_cache: Serve and store results through the result cache (default database only)
+        max_staleness: Maximum replication lag in seconds accepted from a read replica
+    
+    Returns:
+        List of dictionaries representing query results
+    
+    Raises:
+        QueryError: If the query is not read-only, is rejected by the cost
+            guard, times out or fails in the database
+    """
+    return run_readonly_query_columnar(sql_query, connection_string, use_cache, max_staleness).to_rows()
+
+
+async def run_readonly_query_async(
+    sql_query: str,
+    connection_string: str = None,
+    use_cache: bool = True,
+    max_staleness: Optional[float] = None
+) -> List[Dict[str, Any]]:
+    """
+    Async variant of run_readonly_query for use inside the event loop.
+    
+    Raises:
+        QueryError: As run_readonly_query
+    """
+    result = await run_readonly_query_columnar_async(
+        sql_query, connection_string, use_cache, max_staleness
+    )
+    return result.to_rows()
 
 
 def execute_readonly_query(
     sql_query: str,
-    connection_string: str = None
+    connection_string: str = None,
+    use_cache: bool = True
 ) -> Optional[List[Dict[str, Any]]]:
     """
     Execute a SQL query against PostgreSQL in read-only mode.
@@ -61,51 +394,215 @@ def execute_readonly_query(
     Args:
         sql_query: The SQL query to execute
         connection_string: PostgreSQL connection string. If None, uses environment variables.
+        use_cache: Serve and store results through the result cache (default database only)
     
     Returns:
         List of dictionaries representing query results, or None if an error occurred
     """
-    
-    # Validate that the query is read-only
-    if not is_readonly_query(sql_query):
-        print("Error: Only SELECT queries are allowed in read-only mode.")
+    try:
+        return run_readonly_query(sql_query, connection_string, use_cache)
+    except QueryError as e:
+        print(f"Error: {e}")
         return None
+    except Exception as e:
+        print(f"Error executing query: {e}")
+        return None
+
+
+async def execute_readonly_query_async(
+    sql_query: str,
+    connection_string: str = None,
+    use_cache: bool = True
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Async variant of execute_readonly_query for use inside the event loop.
     
-    try:
-        # Connect to database
-        conn = psycopg2.connect(
-            host=db_host,
-            port=db_port,
-            database=db_name,
-            user=db_user,
-            password=db_password
-        )
-        
-        # Set connection to read-only mode
-        conn.set_session(readonly=True, autocommit=False)
-        
-        try:
-            # Use RealDictCursor to get results as dictionaries
-            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                cursor.execute(sql_query)
-                
-                # Fetch all results
-                results = cursor.fetchall()
-                
-                # Convert to list of dictionaries
-                return [dict(row) for row in results]
-        
-        finally:
-            conn.close()
+    Args:
+        sql_query: The SQL query to execute
+        connection_string: PostgreSQL connection string. If None, uses environment variables.
+        use_cache: Serve and store results through the result cache (default database only)
     
-    except psycopg2.Error as e:
-        print(f"Database error: {e}")
+    Returns:
+        List of dictionaries representing query results, or None if an error occurred
+    """
+    try:
+        return await run_readonly_query_async(sql_query, connection_string, use_cache)
+    except QueryError as e:
+        print(f"Error: {e}")
         return None
     except Exception as e:
         print(f"Error executing query: {e}")
         return None
 
 
+class QueryStream:
+    """
+    Iterate over the results of a read-only query in row batches.
+    
+    Rows are pulled from a named (server-side) cursor ``fetch_size`` at a
+    time, so memory stays bounded by one batch regardless of result size.
+    Iteration stops early, with ``truncated`` set, once either cap is hit.
+    After iteration, ``row_count``, ``byte_count``, ``truncated``, ``error``
+    and ``error_kind`` (see QueryError) describe the outcome. The cost guard
+    runs with ``max_rows`` as its row threshold, so oversized plans are
+    capped with a LIMIT before the cursor is opened. With read replicas, a
+    stream whose backend fails before the first batch was yielded is
+    restarted on the next one.
+    
+    Args:
+        sql_query: The SQL query to execute
+        connection_string: PostgreSQL connection string. If None, uses environment variables.
+        fetch_size: Rows fetched from the server per batch
+        max_rows: Hard cap on the number of rows yielded
+        max_bytes: Hard cap on the approximate size of the rows yielded
+        max_staleness: Maximum replication lag in seconds accepted from a read replica
+    """
+    
+    def __init__(
+        self,
+        sql_query: str,
+        connection_string: str = None,
+        fetch_size: int = STREAM_FETCH_SIZE,
+        max_rows: int = STREAM_MAX_ROWS,
+        max_bytes: int = STREAM_MAX_BYTES,
+        max_staleness: Optional[float] = None
+    ):
+        self.sql_query = sql_query
+        self.connection_string = connection_string
+        self.fetch_size = fetch_size
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_staleness = max_staleness
+        self.row_count = 0
+        self.byte_count = 0
+        self.truncated = False
+        self.error: Optional[str] = None
+        self.error_kind: Optional[str] = None
+    
+    def _fail(self, error: QueryError) -> None:
+        self.error = str(error)
+        self.error_kind = error.kind
+        print(f"Error: {self.error}")
+    
+    def _record(self, phases: Dict[str, float]) -> None:
+        record_db("stream", phases, self.row_count)
+        advisor = get_index_advisor()
+        if advisor is not None:
+            advisor.record(
+                self.sql_query, phases.get("execute", 0.0) + phases.get("fetch", 0.0), self.row_count
+            )
+    
+    def __iter__(self) -> Iterator[List[Dict[str, Any]]]:
+        phases: Dict[str, float] = {}
+        started = time.perf_counter()
+        try:
+            _check_readonly(self.sql_query)
+            router = get_query_router(self.connection_string)
+            if router is None:
+                with get_connection_pool(self.connection_string).connection() as conn:
+                    yield from self._stream(conn, phases, started)
+                return
+            targets = router.candidates(self.max_staleness)
+            for attempt, backend in enumerate(targets, 1):
+                try:
+                    with router.checkout(backend) as conn:
+                        yield from self._stream(conn, phases, started)
+                    return
+                except (psycopg2.Error, PoolTimeout) as e:
+                    # Rows already sent cannot be taken back; only an unstarted stream fails over
+                    if attempt == len(targets) or self.row_count or not is_failover_error(e):
+                        raise
+                    router.record_failover(backend, e)
+        
+        except QueryError as e:
+            self._fail(e)
+        except (psycopg2.Error, PoolTimeout) as e:
+            self._fail(_query_error(e))
+        except Exception as e:
+            self._fail(QueryError(str(e)))
+        finally:
+            if self.error is None and "execute" in phases:
+                self._record(phases)
+    
+    def _stream(self, conn, phases: Dict[str, float], started: float) -> Iterator[List[Dict[str, Any]]]:
+        phases["connect"] = time.perf_counter() - started
+        verdict = _guarded_statement(conn, self.sql_query, self.max_rows)
+        phases["plan"] = time.perf_counter() - started - phases["connect"]
+        cursor_name = f"db_agent_stream_{uuid.uuid4().hex}"
+        with conn.cursor(name=cursor_name) as cursor:
+            cursor.itersize = self.fetch_size
+            executed = time.perf_counter()
+            cursor.execute(verdict.sql)
+            phases["execute"] = time.perf_counter() - executed
+            phases["fetch"] = 0.0
+            columns: List[str] = []
+            while True:
+                fetched = time.perf_counter()
+                results = cursor.fetchmany(self.fetch_size)
+                phases["fetch"] += time.perf_counter() - fetched
+                if not results:
+                    # A LIMIT added by the cost guard fetches one row past max_rows,
+                    # so a cut result was already marked by _take
+                    return
+                # A named cursor only has a description after the first fetch
+                if not columns:
+                    columns = [column[0] for column in cursor.description]
+                batch = self._take([dict(zip(columns, row)) for row in results])
+                if batch:
+                    yield batch
+                if self.truncated:
+                    return
+    
+    def _take(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Trim a batch to the remaining row/byte allowance."""
+        remaining_rows = self.max_rows - self.row_count
+        if len(batch) > remaining_rows:
+            batch = batch[:remaining_rows]
+            self.truncated = True
+        
+        size = estimate_size(batch)
+        if self.byte_count + size > self.max_bytes:
+            kept: List[Dict[str, Any]] = []
+            for row in batch:
+                row_size = estimate_size([row])
+                if self.byte_count + row_size > self.max_bytes:
+                    break
+                kept.append(row)
+                self.byte_count += row_size
+            self.truncated = True
+            batch = kept
+        else:
+            self.byte_count += size
+        
+        self.row_count += len(batch)
+        return batch
+
+
+def stream_readonly_query(
+    sql_query: str,
+    connection_string: str = None,
+    fetch_size: int = STREAM_FETCH_SIZE,
+    max_rows: int = STREAM_MAX_ROWS,
+    max_bytes: int = STREAM_MAX_BYTES,
+    max_staleness: Optional[float] = None
+) -> QueryStream:
+    """
+    Execute a read-only query through a server-side cursor, yielding row batches.
+    
+    Args:
+        sql_query: The SQL query to execute
+        connection_string: PostgreSQL connection string. If None, uses environment variables.
+        fetch_size: Rows fetched from the server per batch
+        max_rows: Hard cap on the number of rows yielded
+        max_bytes: Hard cap on the approximate size of the rows yielded
+        max_staleness: Maximum replication lag in seconds accepted from a read replica
+    
+    Returns:
+        A QueryStream; iterate it to receive lists of row dictionaries
+    """
+    return QueryStream(sql_query, connection_string, fetch_size, max_rows, max_bytes, max_staleness)
+
+
 def generate_and_run_query(
     user_input: str,
     schema_path: str = None,
@@ -0,0 +1,150 @@
+"""
+Concurrency scheduler for LLM generations and database queries.
+
+LLM calls and DB queries are admitted through separate lanes, each with its
+own concurrency cap and a bounded wait queue. Once a lane's queue is full new
+work is rejected with SchedulerOverloaded so the API can answer 503 with a
+Retry-After header instead of piling up requests behind a slow model.
+"""
+
+import asyncio
+import os
+import threading
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from .config import load_environment
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Lane limits
+LLM_MAX_CONCURRENCY = int(
+    os.getenv("LLM_MAX_CONCURRENCY", os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+)
+# Read replicas add their own pools, so the default scales with them
+_DB_BACKENDS = 1 + len([entry for entry in os.getenv("POSTGRES_REPLICAS", "").split(",") if entry.strip()])
+DB_MAX_CONCURRENCY = int(
+    os.getenv("DB_MAX_CONCURRENCY", int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10")) * _DB_BACKENDS)
+)
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "32"))
+SCHEDULER_QUEUE_TIMEOUT = float(os.getenv("SCHEDULER_QUEUE_TIMEOUT", "60"))
+SCHEDULER_RETRY_AFTER = int(os.getenv("SCHEDULER_RETRY_AFTER", "5"))
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when a lane's wait queue is full or a queued task waited too long."""
+
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"The {lane} lane is saturated; retry in {retry_after}s.")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class SchedulerLane:
+    """
+    A concurrency-limited lane with a bounded wait queue.
+
+    Args:
+        name: Lane name used in errors and metrics (e.g. "llm", "db")
+        max_concurrency: Tasks allowed to run at the same time
+        max_queue: Tasks allowed to wait for a slot before new ones are rejected
+        queue_timeout: Seconds a task may wait for a slot before it is rejected
+        retry_after: Seconds suggested to clients when the lane rejects work
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        max_queue: int = SCHEDULER_MAX_QUEUE,
+        queue_timeout: float = SCHEDULER_QUEUE_TIMEOUT,
+        retry_after: int = SCHEDULER_RETRY_AFTER,
+    ):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Wait for a free slot in this lane, raising SchedulerOverloaded on backpressure."""
+        semaphore = self._get_semaphore()
+        if not semaphore.locked():
+            # Fast path: a slot is free, acquiring it does not suspend.
+            await semaphore.acquire()
+        else:
+            if self.waiting >= self.max_queue:
+                self.rejected += 1
+                raise SchedulerOverloaded(self.name, self.retry_after)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise SchedulerOverloaded(self.name, self.retry_after) from None
+            finally:
+                self.waiting -= 1
+
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self.completed += 1
+            semaphore.release()
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return queue-depth and throughput counters for this lane."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+class RequestScheduler:
+    """Holds the independent LLM and DB lanes used by the workflow nodes."""
+
+    def __init__(
+        self,
+        llm_concurrency: int = LLM_MAX_CONCURRENCY,
+        db_concurrency: int = DB_MAX_CONCURRENCY,
+        max_queue: int = SCHEDULER_MAX_QUEUE,
+    ):
+        self.llm = SchedulerLane("llm", llm_concurrency, max_queue)
+        self.db = SchedulerLane("db", db_concurrency, max_queue)
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Return metrics for every lane."""
+        return {"llm": self.llm.snapshot(), "db": self.db.snapshot()}
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    """Return the process-wide scheduler, creating it on first use."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = RequestScheduler()
+    return _scheduler
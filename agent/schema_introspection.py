@@ -0,0 +1,318 @@
+"""
+Schema extraction straight from the Postgres catalog.
+
+Instead of maintaining schema.json by hand, the introspector reads columns,
+comments, primary/foreign keys, index definitions and row-count estimates
+(pg_class.reltuples) from pg_catalog and builds the same structure the
+schema registry renders for the prompt.
+
+Refreshes are incremental: one cheap catalog query returns a per-table DDL
+fingerprint, and only tables whose fingerprint changed are read in detail.
+Descriptions and business_logic from the hand-written schema.json are kept
+as an overlay, so curated documentation is not lost; its rollup hints are
+added once the rollup tables exist, and its internal_tables are left out.
+"""
+
+import argparse
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import load_environment
+from .run_sql_query import get_connection_pool
+from .schema_registry import DEFAULT_SCHEMA_PATH, SchemaSnapshot, with_rollups
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Introspection
+SCHEMA_INTROSPECTION_SCHEMA = os.getenv("SCHEMA_INTROSPECTION_SCHEMA", "public")
+SCHEMA_REFRESH_INTERVAL = float(os.getenv("SCHEMA_REFRESH_INTERVAL", "60"))
+
+# One row per table/view: a hash over its columns, constraints, indexes and
+# comments, plus the planner's row estimate. Reads only catalog tables.
+FINGERPRINT_QUERY = """
+SELECT c.oid,
+       c.relname,
+       md5(
+           coalesce((
+               SELECT string_agg(
+                   a.attname || ':' || format_type(a.atttypid, a.atttypmod)
+                   || ':' || coalesce(col_description(c.oid, a.attnum), ''),
+                   ',' ORDER BY a.attnum)
+               FROM pg_attribute a
+               WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+           ), '')
+           || '|' || coalesce((
+               SELECT string_agg(pg_get_constraintdef(con.oid), ',' ORDER BY con.conname)
+               FROM pg_constraint con
+               WHERE con.conrelid = c.oid
+           ), '')
+           || '|' || coalesce((
+               SELECT string_agg(pg_get_indexdef(i.indexrelid), ',' ORDER BY i.indexrelid)
+               FROM pg_index i
+               WHERE i.indrelid = c.oid
+           ), '')
+           || '|' || coalesce(obj_description(c.oid, 'pg_class'), '')
+       ) AS ddl_hash,
+       c.reltuples::bigint AS row_estimate
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = %s
+  AND c.relkind IN ('r', 'p', 'v', 'm')
+"""
+
+COLUMNS_QUERY = """
+SELECT a.attrelid, a.attname, format_type(a.atttypid, a.atttypmod),
+       col_description(a.attrelid, a.attnum)
+FROM pg_attribute a
+WHERE a.attrelid = ANY(%s) AND a.attnum > 0 AND NOT a.attisdropped
+ORDER BY a.attrelid, a.attnum
+"""
+
+CONSTRAINTS_QUERY = """
+SELECT con.conrelid,
+       con.contype,
+       ARRAY(SELECT a.attname FROM unnest(con.conkey) WITH ORDINALITY k(num, ord)
+             JOIN pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = k.num
+             ORDER BY k.ord),
+       ref.relname,
+       ARRAY(SELECT a.attname FROM unnest(con.confkey) WITH ORDINALITY k(num, ord)
+             JOIN pg_attribute a ON a.attrelid = con.confrelid AND a.attnum = k.num
+             ORDER BY k.ord)
+FROM pg_constraint con
+LEFT JOIN pg_class ref ON ref.oid = con.confrelid
+WHERE con.conrelid = ANY(%s) AND con.contype IN ('p', 'f')
+"""
+
+INDEXES_QUERY = """
+SELECT i.indrelid, pg_get_indexdef(i.indexrelid)
+FROM pg_index i
+WHERE i.indrelid = ANY(%s)
+ORDER BY i.indrelid, i.indexrelid
+"""
+
+TABLE_COMMENTS_QUERY = """
+SELECT c.oid, obj_description(c.oid, 'pg_class')
+FROM pg_class c
+WHERE c.oid = ANY(%s)
+"""
+
+
+def _load_overlay(schema_path) -> Dict[str, Any]:
+    """Read the hand-written schema.json used for descriptions and business logic."""
+    try:
+        with open(schema_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class SchemaIntrospector:
+    """
+    Build and incrementally refresh a schema description from pg_catalog.
+
+    Args:
+        schema_name: Postgres schema (namespace) to introspect
+        overlay_path: schema.json whose descriptions and business_logic are merged in
+        connection_string: PostgreSQL connection string. If None, uses environment variables.
+    """
+
+    def __init__(
+        self,
+        schema_name: str = SCHEMA_INTROSPECTION_SCHEMA,
+        overlay_path=DEFAULT_SCHEMA_PATH,
+        connection_string: Optional[str] = None,
+    ):
+        self.schema_name = schema_name
+        self.overlay_path = overlay_path
+        self.connection_string = connection_string
+        # oid -> (ddl_hash, table dict without row_estimate)
+        self._tables: Dict[int, Tuple[str, Dict[str, Any]]] = {}
+        self._row_estimates: Dict[int, int] = {}
+        self.tables_reloaded = 0
+
+    def _load_details(self, cursor, oids: List[int], names: Dict[int, str]) -> Dict[int, Dict[str, Any]]:
+        """Read columns, keys, indexes and comments for the given tables only."""
+        tables: Dict[int, Dict[str, Any]] = {
+            oid: {"name": names[oid], "columns": [], "relationships": [], "indexes": []}
+            for oid in oids
+        }
+        primary_keys: Dict[int, List[str]] = {}
+        foreign_keys: Dict[Tuple[int, str], str] = {}
+
+        cursor.execute(CONSTRAINTS_QUERY, (oids,))
+        for oid, contype, columns, ref_table, ref_columns in cursor.fetchall():
+            if contype == "p":
+                primary_keys[oid] = list(columns)
+                continue
+            for column, ref_column in zip(columns, ref_columns):
+                target = f"{ref_table}.{ref_column}"
+                foreign_keys[(oid, column)] = target
+                tables[oid]["relationships"].append(
+                    f"{names[oid]}.{column} refers to {target}"
+                )
+
+        cursor.execute(COLUMNS_QUERY, (oids,))
+        for oid, name, data_type, comment in cursor.fetchall():
+            description = comment or ""
+            if not description:
+                if name in primary_keys.get(oid, []):
+                    description = "Primary Key"
+                elif (oid, name) in foreign_keys:
+                    description = f"Foreign Key -> {foreign_keys[(oid, name)]}"
+            tables[oid]["columns"].append(
+                {"name": name, "type": data_type.upper(), "description": description}
+            )
+
+        cursor.execute(INDEXES_QUERY, (oids,))
+        for oid, definition in cursor.fetchall():
+            tables[oid]["indexes"].append(definition)
+
+        cursor.execute(TABLE_COMMENTS_QUERY, (oids,))
+        for oid, comment in cursor.fetchall():
+            if comment:
+                tables[oid]["description"] = comment
+
+        for table in tables.values():
+            if not table["relationships"]:
+                del table["relationships"]
+        return tables
+
+    def refresh(self) -> bool:
+        """
+        Re-read the catalog, loading details only for tables whose DDL changed.
+
+        Returns:
+            True if any table was added, removed or changed
+        """
+        with get_connection_pool(self.connection_string).connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(FINGERPRINT_QUERY, (self.schema_name,))
+                fingerprints = cursor.fetchall()
+
+                names = {oid: name for oid, name, _, _ in fingerprints}
+                changed = [
+                    oid for oid, _, ddl_hash, _ in fingerprints
+                    if self._tables.get(oid, (None,))[0] != ddl_hash
+                ]
+                removed = set(self._tables) - set(names)
+                details = self._load_details(cursor, changed, names) if changed else {}
+
+        hashes = {oid: ddl_hash for oid, _, ddl_hash, _ in fingerprints}
+        for oid in removed:
+            self._tables.pop(oid, None)
+        for oid, table in details.items():
+            self._tables[oid] = (hashes[oid], table)
+        self._row_estimates = {oid: estimate for oid, _, _, estimate in fingerprints}
+        self.tables_reloaded += len(changed)
+        return bool(changed or removed)
+
+    def build_schema(self) -> Dict[str, Any]:
+        """
+        Return the introspected schema in schema.json format.
+
+        Hand-written table/column descriptions and business_logic from the
+        overlay file take precedence over catalog comments.
+        """
+        overlay = _load_overlay(self.overlay_path)
+        curated_tables = overlay.get("tables", []) + (overlay.get("rollups") or {}).get("tables", [])
+        overlay_tables = {table["name"]: table for table in curated_tables}
+        internal = set(overlay.get("internal_tables", []))
+
+        tables: List[Dict[str, Any]] = []
+        for oid, (_, table) in sorted(self._tables.items(), key=lambda item: item[1][1]["name"]):
+            if table["name"] in internal:
+                continue
+            merged = copy.deepcopy(table)
+            curated = overlay_tables.get(merged["name"], {})
+            if curated.get("description"):
+                merged["description"] = curated["description"]
+            curated_columns = {
+                column["name"]: column.get("description")
+                for column in curated.get("columns", [])
+            }
+            for column in merged["columns"]:
+                if curated_columns.get(column["name"]):
+                    column["description"] = curated_columns[column["name"]]
+            estimate = self._row_estimates.get(oid, -1)
+            if estimate >= 0:
+                merged["row_estimate"] = estimate
+            tables.append(merged)
+
+        schema: Dict[str, Any] = {"tables": tables}
+        # Rollup hints only apply once the rollup tables exist
+        business_logic = with_rollups(overlay, [table["name"] for table in tables]).get("business_logic")
+        if business_logic:
+            schema["business_logic"] = business_logic
+        return schema
+
+
+class DatabaseSchemaRegistry:
+    """
+    Schema registry backed by live introspection instead of schema.json.
+
+    Exposes the same ``get()`` interface as SchemaRegistry. The catalog is
+    re-checked at most every ``refresh_interval`` seconds; the snapshot (and
+    therefore its version) only changes when the rendered schema changes.
+
+    Args:
+        introspector: The SchemaIntrospector to refresh from
+        refresh_interval: Minimum seconds between catalog checks
+    """
+
+    def __init__(
+        self,
+        introspector: Optional[SchemaIntrospector] = None,
+        refresh_interval: float = SCHEMA_REFRESH_INTERVAL,
+    ):
+        self.introspector = introspector or SchemaIntrospector()
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[SchemaSnapshot] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> SchemaSnapshot:
+        now = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and now - self._checked_at < self.refresh_interval:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is not None and now - self._checked_at < self.refresh_interval:
+                return self._snapshot
+            self._checked_at = now
+            try:
+                self.introspector.refresh()
+                schema = self.introspector.build_schema()
+                snapshot = SchemaSnapshot(schema, "")
+                version = hashlib.sha256(snapshot.prompt_context.encode()).hexdigest()
+                if self._snapshot is None or version != self._snapshot.version:
+                    snapshot.version = version
+                    self._snapshot = snapshot
+            except Exception as e:
+                if self._snapshot is None:
+                    raise
+                print(f"Warning: keeping previous schema, introspection failed: {e}")
+            return self._snapshot
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate schema.json from the database catalog.")
+    parser.add_argument("--output", default=None, help="File to write (default: print to stdout)")
+    parser.add_argument("--schema", default=SCHEMA_INTROSPECTION_SCHEMA, help="Postgres schema to read")
+    args = parser.parse_args()
+
+    introspector = SchemaIntrospector(schema_name=args.schema)
+    introspector.refresh()
+    document = json.dumps(introspector.build_schema(), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(document + "\n")
+        print(f"Wrote {len(introspector._tables)} tables to {args.output}")
+    else:
+        print(document)
@@ -0,0 +1,237 @@
+"""
+Registry that parses the database schema once and shares it across requests.
+
+The schema file is parsed on first use and re-read only when its mtime or
+size changes, so a chat turn no longer reads and serializes schema.json from
+disk. Each parsed version carries a compact prompt rendering and a content
+hash that caches use as the schema version.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .config import load_environment
+
+# Load environment variables from .env file
+load_environment()
+
+# Seconds between mtime checks of the schema file
+SCHEMA_RELOAD_INTERVAL = float(os.getenv("SCHEMA_RELOAD_INTERVAL", "2"))
+# "file" reads schema.json; "database" introspects the Postgres catalog
+SCHEMA_SOURCE = os.getenv("SCHEMA_SOURCE", "file").lower()
+# Include the "rollups" section of schema.json (tables maintained by database/rollups.py)
+SCHEMA_ROLLUPS = os.getenv("SCHEMA_ROLLUPS", "false").lower() == "true"
+
+_INDEX_COLUMNS = re.compile(r"USING \w+ \((.*)\)")
+
+DEFAULT_SCHEMA_PATH = Path(__file__).parent / "schema.json"
+
+
+def format_row_estimate(estimate: int) -> str:
+    """Round a row estimate to one significant figure ("~30K"), so small drifts do not change the prompt."""
+    if estimate < 1000:
+        return str(estimate)
+    magnitude = 10 ** (len(str(estimate)) - 1)
+    rounded = round(estimate / magnitude) * magnitude
+    for unit, size in (("B", 10**9), ("M", 10**6), ("K", 10**3)):
+        if rounded >= size:
+            return f"~{rounded // size}{unit}"
+    return str(rounded)
+
+
+def _index_columns(definition: str) -> str:
+    """Extract the column list from a pg_get_indexdef() definition."""
+    match = _INDEX_COLUMNS.search(definition)
+    return match.group(1) if match else definition
+
+
+def render_table(table: Dict[str, Any]) -> str:
+    """Render one table as a compact, DDL-like block for the prompt."""
+    header = f"TABLE {table['name']}"
+    if table.get("row_estimate") is not None:
+        header += f" ({format_row_estimate(table['row_estimate'])} rows)"
+    if table.get("description"):
+        header += f" -- {table['description']}"
+    lines = [header]
+    for column in table.get("columns", []):
+        line = f"  {column['name']} {column.get('type', '')}".rstrip()
+        if column.get("description"):
+            line += f" -- {column['description']}"
+        lines.append(line)
+    relationships = table.get("relationships") or []
+    if relationships:
+        lines.append(f"  Relationships: {'; '.join(relationships)}")
+    indexes = table.get("indexes") or []
+    if indexes:
+        lines.append(f"  Indexed on: {'; '.join(_index_columns(index) for index in indexes)}")
+    return "\n".join(lines)
+
+
+def render_business_logic(business_logic: Dict[str, str]) -> str:
+    """Render the business_logic section as one 'name: formula' line per entry."""
+    if not business_logic:
+        return ""
+    lines = ["Business logic:"]
+    lines.extend(f"  {name}: {formula}" for name, formula in business_logic.items())
+    return "\n".join(lines)
+
+
+def with_rollups(schema: Dict[str, Any], present: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Merge the rollup tables and their business logic hints into a schema.
+
+    Args:
+        schema: Parsed schema.json (its "rollups" section is used)
+        present: Table names known to exist. If given, the hints are only added
+            when every rollup table is among them, and no tables are added.
+
+    Returns:
+        A new schema dictionary
+    """
+    rollups = schema.get("rollups") or {}
+    rollup_tables = rollups.get("tables", [])
+    merged = dict(schema)
+    if present is None:
+        merged["tables"] = list(schema.get("tables", [])) + list(rollup_tables)
+    elif not rollup_tables or not {t["name"] for t in rollup_tables} <= set(present):
+        return merged
+    merged["business_logic"] = {
+        **schema.get("business_logic", {}),
+        **rollups.get("business_logic", {}),
+    }
+    return merged
+
+
+class SchemaSnapshot:
+    """
+    An immutable, parsed version of the schema.
+
+    Attributes:
+        schema: The parsed schema dictionary (treat as read-only)
+        version: SHA-256 of the schema content
+        tables: Table definitions keyed by table name
+        prompt_context: Compact rendering of the full schema for the prompt
+    """
+
+    def __init__(self, schema: Dict[str, Any], version: str):
+        self.schema = schema
+        self.version = version
+        self.tables: Dict[str, Dict[str, Any]] = {
+            table["name"]: table for table in schema.get("tables", [])
+        }
+        self._rendered_tables = {
+            name: render_table(table) for name, table in self.tables.items()
+        }
+        self._business_logic = render_business_logic(schema.get("business_logic", {}))
+        self.prompt_context = self.render()
+
+    def render(self, tables: Optional[Iterable[str]] = None) -> str:
+        """
+        Render the schema, or a subset of its tables, for the prompt.
+
+        Args:
+            tables: Table names to include. If None, all tables in schema order.
+
+        Returns:
+            The rendered schema text, followed by the business logic section
+        """
+        names: List[str] = list(self.tables) if tables is None else [
+            name for name in tables if name in self.tables
+        ]
+        blocks = [self._rendered_tables[name] for name in names]
+        if self._business_logic:
+            blocks.append(self._business_logic)
+        return "\n\n".join(blocks)
+
+
+class SchemaRegistry:
+    """
+    Loads schema.json once and hot-reloads it when the file changes.
+
+    Args:
+        schema_path: Path to the schema file (default: agent/schema.json)
+        check_interval: Minimum seconds between mtime checks
+    """
+
+    def __init__(
+        self,
+        schema_path: Optional[str] = None,
+        check_interval: float = SCHEMA_RELOAD_INTERVAL,
+    ):
+        self.schema_path = Path(schema_path) if schema_path else DEFAULT_SCHEMA_PATH
+        self.check_interval = check_interval
+        self._snapshot: Optional[SchemaSnapshot] = None
+        self._stat: Optional[Tuple[float, int]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self) -> SchemaSnapshot:
+        raw = self.schema_path.read_bytes()
+        schema = json.loads(raw)
+        if SCHEMA_ROLLUPS:
+            schema = with_rollups(schema)
+            raw += b"\nrollups"
+        return SchemaSnapshot(schema, hashlib.sha256(raw).hexdigest())
+
+    def get(self) -> SchemaSnapshot:
+        """
+        Return the current schema snapshot, reloading it if the file changed.
+
+        Raises:
+            FileNotFoundError: If the schema file does not exist on first load
+            json.JSONDecodeError: If the schema file is invalid on first load
+        """
+        now = time.monotonic()
+        snapshot = self._snapshot
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is not None and now - self._checked_at < self.check_interval:
+                return self._snapshot
+            self._checked_at = now
+            try:
+                stat = self.schema_path.stat()
+                key = (stat.st_mtime, stat.st_size)
+                if self._snapshot is None or key != self._stat:
+                    self._snapshot = self._load()
+                    self._stat = key
+            except (OSError, ValueError) as e:
+                if self._snapshot is None:
+                    raise
+                print(f"Warning: keeping previous schema, reload failed: {e}")
+            return self._snapshot
+
+
+_registries: Dict[str, SchemaRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_schema_registry(schema_path: Optional[str] = None):
+    """
+    Return the shared registry for a schema file, creating it on first use.
+
+    With SCHEMA_SOURCE=database and no explicit path, the registry is backed
+    by live catalog introspection instead of schema.json.
+    """
+    use_database = schema_path is None and SCHEMA_SOURCE == "database"
+    key = "database" if use_database else str(schema_path or DEFAULT_SCHEMA_PATH)
+    registry = _registries.get(key)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.get(key)
+            if registry is None:
+                if use_database:
+                    from .schema_introspection import DatabaseSchemaRegistry
+
+                    registry = DatabaseSchemaRegistry()
+                else:
+                    registry = SchemaRegistry(schema_path)
+                _registries[key] = registry
+    return registry
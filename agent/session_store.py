@@ -0,0 +1,404 @@
+"""
+Pluggable storage for per-session chat state.
+
+Three backends share one interface (get / put / update / delete / stats /
+close):
+
+- ``memory``: in-process LRU bounded by a byte budget, with a TTL. Fast, but
+  private to one worker and lost on restart.
+- ``sqlite``: a local SQLite file in WAL mode; survives restarts and can be
+  shared by several workers on the same host.
+- ``postgres``: a table in the application database, shared by every worker
+  and replica behind a load balancer.
+
+Sessions are stored as compact JSON (zlib-compressed above a small size), so
+every backend holds the same bytes and the memory budget is exact. Callers
+are expected to store result summaries rather than full row lists.
+
+``update`` is an atomic read-modify-write: concurrent requests of one session
+are serialized per backend (a lock, a SQLite write transaction or a Postgres
+advisory lock), so a turn appended by one request is never overwritten by
+another that loaded the session before it was saved.
+"""
+
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .config import load_environment
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Session storage
+SESSION_STORE = os.getenv("SESSION_STORE", "memory").lower()
+SESSION_TTL = float(os.getenv("SESSION_TTL", "86400"))
+SESSION_STORE_MAX_BYTES = int(os.getenv("SESSION_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", "sessions.db")
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL")
+SESSION_STORE_TABLE = os.getenv("SESSION_STORE_TABLE", "db_agent_sessions")
+
+# Payloads above this size are zlib-compressed
+_COMPRESS_THRESHOLD = 1024
+# Expired rows are purged from durable backends every this many writes
+_PURGE_EVERY = 256
+
+# Receives the stored session (None if missing) and returns the version to store
+SessionUpdate = Callable[[Optional[Dict[str, Any]]], Dict[str, Any]]
+
+
+def encode_session(data: Dict[str, Any]) -> bytes:
+    """Serialize a session dictionary to compact (and possibly compressed) bytes."""
+    raw = json.dumps(data, separators=(",", ":"), default=str).encode()
+    if len(raw) > _COMPRESS_THRESHOLD:
+        return b"z" + zlib.compress(raw)
+    return b"j" + raw
+
+
+def decode_session(payload: bytes) -> Dict[str, Any]:
+    """Inverse of encode_session."""
+    payload = bytes(payload)
+    if payload[:1] == b"z":
+        return json.loads(zlib.decompress(payload[1:]))
+    return json.loads(payload[1:])
+
+
+class SessionStore(abc.ABC):
+    """
+    Interface shared by the session backends.
+
+    Attributes:
+        blocking: True when calls do I/O and should run off the event loop
+    """
+
+    blocking = False
+
+    @abc.abstractmethod
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored session, or None if it does not exist or expired."""
+
+    @abc.abstractmethod
+    def put(self, session_id: str, data: Dict[str, Any]) -> None:
+        """Store a session, replacing any previous version and refreshing its TTL."""
+
+    @abc.abstractmethod
+    def update(self, session_id: str, change: SessionUpdate) -> Dict[str, Any]:
+        """
+        Atomically replace a session with ``change(current)`` and refresh its TTL.
+
+        No other update of the same session runs between the read and the
+        write. ``change`` runs while the session is locked, so it must not
+        block on anything else.
+
+        Returns:
+            The stored session
+        """
+
+    @abc.abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Remove a session."""
+
+    def stats(self) -> Dict[str, Any]:
+        """Return backend occupancy counters."""
+        return {}
+
+    def close(self) -> None:
+        """Release backend resources."""
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process LRU of encoded sessions bounded by bytes, with a TTL.
+
+    Args:
+        max_bytes: Budget for all encoded sessions; least recently used are evicted first
+        ttl: Seconds a session survives without being written
+    """
+
+    def __init__(self, max_bytes: int = SESSION_STORE_MAX_BYTES, ttl: float = SESSION_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _unlink_locked(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    def _payload_locked(self, session_id: str) -> Optional[bytes]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic():
+            self._unlink_locked(session_id)
+            return None
+        self._entries.move_to_end(session_id)
+        return entry[0]
+
+    def _store_locked(self, session_id: str, payload: bytes) -> None:
+        self._unlink_locked(session_id)
+        self._entries[session_id] = (payload, time.monotonic() + self.ttl)
+        self._bytes += len(payload)
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            oldest = next(iter(self._entries))
+            self._unlink_locked(oldest)
+            self.evictions += 1
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            payload = self._payload_locked(session_id)
+        return decode_session(payload) if payload is not None else None
+
+    def put(self, session_id: str, data: Dict[str, Any]) -> None:
+        payload = encode_session(data)
+        with self._lock:
+            self._store_locked(session_id, payload)
+
+    def update(self, session_id: str, change: SessionUpdate) -> Dict[str, Any]:
+        with self._lock:
+            payload = self._payload_locked(session_id)
+            data = change(decode_session(payload) if payload is not None else None)
+            self._store_locked(session_id, encode_session(data))
+        return data
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._unlink_locked(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "sessions": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a local SQLite database (WAL mode, safe across worker processes).
+
+    Args:
+        path: Database file
+        ttl: Seconds a session survives without being written
+    """
+
+    blocking = True
+
+    def __init__(self, path: str = SESSION_SQLITE_PATH, ttl: float = SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND expires_at >= ?",
+                (session_id, time.time()),
+            ).fetchone()
+        return decode_session(row[0]) if row else None
+
+    def _write_locked(self, session_id: str, data: Dict[str, Any]) -> None:
+        self._conn.execute(
+            "INSERT INTO sessions (session_id, data, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data, "
+            "expires_at = excluded.expires_at",
+            (session_id, encode_session(data), time.time() + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % _PURGE_EVERY == 0:
+            self._conn.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+        self._conn.commit()
+
+    def put(self, session_id: str, data: Dict[str, Any]) -> None:
+        with self._lock:
+            self._write_locked(session_id, data)
+
+    def update(self, session_id: str, change: SessionUpdate) -> Dict[str, Any]:
+        with self._lock:
+            # Takes the database write lock, so other processes wait until the commit
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT data FROM sessions WHERE session_id = ? AND expires_at >= ?",
+                    (session_id, time.time()),
+                ).fetchone()
+                data = change(decode_session(row[0]) if row else None)
+                self._write_locked(session_id, data)
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return data
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, size = self._conn.execute(
+                "SELECT count(*), coalesce(sum(length(data)), 0) FROM sessions"
+            ).fetchone()
+        return {"backend": "sqlite", "sessions": count, "bytes": size, "path": self.path}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class PostgresSessionStore(SessionStore):
+    """
+    Sessions in a Postgres table, shared by every worker and replica.
+
+    Uses its own small writable connection pool; the query pool stays read-only.
+
+    Args:
+        connect_kwargs: psycopg2.connect keyword arguments
+        ttl: Seconds a session survives without being written
+        table: Table name (created if missing)
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        connect_kwargs: Dict[str, Any],
+        ttl: float = SESSION_TTL,
+        table: str = SESSION_STORE_TABLE,
+    ):
+        from .connection_pool import ConnectionPool
+
+        self.ttl = ttl
+        self.table = table
+        self._writes = 0
+        self._pool = ConnectionPool(connect_kwargs, min_size=0, max_size=4, readonly=False)
+        with self._pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f'CREATE TABLE IF NOT EXISTS "{table}" ('
+                    "session_id TEXT PRIMARY KEY, data BYTEA NOT NULL, "
+                    "expires_at TIMESTAMPTZ NOT NULL)"
+                )
+            conn.commit()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT data FROM "{self.table}" WHERE session_id = %s AND expires_at >= now()',
+                    (session_id,),
+                )
+                row = cursor.fetchone()
+        return decode_session(row[0]) if row else None
+
+    def _write(self, cursor, session_id: str, data: Dict[str, Any]) -> None:
+        self._writes += 1
+        cursor.execute(
+            f'INSERT INTO "{self.table}" (session_id, data, expires_at) '
+            "VALUES (%s, %s, now() + %s * interval '1 second') "
+            "ON CONFLICT (session_id) DO UPDATE SET data = EXCLUDED.data, "
+            "expires_at = EXCLUDED.expires_at",
+            (session_id, encode_session(data), self.ttl),
+        )
+        if self._writes % _PURGE_EVERY == 0:
+            cursor.execute(f'DELETE FROM "{self.table}" WHERE expires_at < now()')
+
+    def put(self, session_id: str, data: Dict[str, Any]) -> None:
+        with self._pool.connection() as conn:
+            with conn.cursor() as cursor:
+                self._write(cursor, session_id, data)
+            conn.commit()
+
+    def update(self, session_id: str, change: SessionUpdate) -> Dict[str, Any]:
+        # An uncommitted transaction (and its lock) is rolled back when the pool takes the connection back
+        with self._pool.connection() as conn:
+            with conn.cursor() as cursor:
+                # A transaction-scoped advisory lock also covers sessions that have no row yet
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{self.table}:{session_id}",)
+                )
+                cursor.execute(
+                    f'SELECT data FROM "{self.table}" WHERE session_id = %s AND expires_at >= now()',
+                    (session_id,),
+                )
+                row = cursor.fetchone()
+                data = change(decode_session(row[0]) if row else None)
+                self._write(cursor, session_id, data)
+            conn.commit()
+        return data
+
+    def delete(self, session_id: str) -> None:
+        with self._pool.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f'DELETE FROM "{self.table}" WHERE session_id = %s', (session_id,))
+            conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "postgres", "table": self.table, "pool": self._pool.stats()}
+
+    def close(self) -> None:
+        self._pool.close()
+
+
+def create_session_store(backend: str = SESSION_STORE) -> SessionStore:
+    """
+    Build the configured session backend.
+
+    Args:
+        backend: "memory", "sqlite" or "postgres"
+    """
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend == "postgres":
+        if SESSION_STORE_URL:
+            connect_kwargs: Dict[str, Any] = {"dsn": SESSION_STORE_URL}
+        else:
+            from .run_sql_query import DEFAULT_CONNECT_KWARGS
+
+            connect_kwargs = dict(DEFAULT_CONNECT_KWARGS)
+        return PostgresSessionStore(connect_kwargs)
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_STORE backend: {backend!r}")
+    return MemorySessionStore()
+
+
+_store: Optional[SessionStore] = None
+_store_lock = threading.Lock()
+
+
+def get_session_store() -> SessionStore:
+    """Return the process-wide session store, creating it on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_session_store()
+    return _store
+
+
+def close_session_store() -> None:
+    """Close the process-wide session store, if one was created."""
+    global _store
+    with _store_lock:
+        store, _store = _store, None
+    if store is not None:
+        store.close()
@@ -0,0 +1,327 @@
+"""
+Semantic cache for generated SQL, placed in front of generate_sql_query.
+
+Lookups go through two tiers:
+1. Exact match on the normalized question text.
+2. Embedding similarity against previously answered questions (off unless
+   SQL_CACHE_SEMANTIC is set). Questions that differ only in a time window or
+   an entity ("revenue this month" / "revenue last month") embed very close
+   together, so a semantic hit is only returned when both questions also name
+   the same numbers, quoted literals, time expressions and capitalized names.
+
+Entries are evicted LRU-first once the cache is full and expire after a TTL.
+The whole cache is dropped when the schema registry reports a new schema
+version, so SQL written against an old schema is never served.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .config import load_environment
+from .schema_registry import get_schema_registry
+from .vector_index import create_vector_index
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Cache behaviour
+SQL_CACHE_ENABLED = os.getenv("SQL_CACHE_ENABLED", "true").lower() == "true"
+SQL_CACHE_SEMANTIC = os.getenv("SQL_CACHE_SEMANTIC", "false").lower() == "true"
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1024"))
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "3600"))
+SQL_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("SQL_CACHE_SIMILARITY_THRESHOLD", "0.95"))
+SQL_CACHE_EMBEDDING_MODEL = os.getenv("SQL_CACHE_EMBEDDING_MODEL", "nomic-embed-text")
+SQL_CACHE_COLLECTION = os.getenv("SQL_CACHE_COLLECTION", "sql_cache")
+OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
+# Seconds the semantic tier stays disabled after the embedding model fails.
+_EMBEDDING_RETRY_BACKOFF = 60.0
+
+_WHITESPACE = re.compile(r"\s+")
+
+_QUOTED = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+_NUMBER = re.compile(r"\d+(?:[.,:/-]\d+)*")
+_TEMPORAL = re.compile(
+    r"\b(this|last|next|previous|current|past|today|yesterday|tomorrow|ago|"
+    r"days?|weeks?|months?|quarters?|years?|ytd|mtd|q[1-4]|"
+    r"january|february|march|april|may|june|july|august|september|october|november|december|"
+    r"jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b"
+)
+_WORD = re.compile(r"[A-Za-z][\w-]*")
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return _WHITESPACE.sub(" ", question.lower()).strip().rstrip("?.!; ")
+
+
+def question_literals(question: str) -> List[str]:
+    """
+    The parts of a question that change its SQL but barely move its embedding.
+
+    Quoted literals, numbers and dates, time expressions and capitalized
+    words after the first one (names such as "Berlin" or "Product A").
+    """
+    literals = set()
+    for match in _QUOTED.finditer(question):
+        literals.add("'" + (match.group(1) if match.group(1) is not None else match.group(2)).lower())
+    unquoted = _QUOTED.sub(" ", question)
+    literals.update(_NUMBER.findall(unquoted))
+    literals.update(_TEMPORAL.findall(unquoted.lower()))
+    words = _WORD.findall(unquoted)
+    literals.update(word.lower() for word in words[1:] if word[0].isupper())
+    return sorted(literals)
+
+
+class _Entry:
+    __slots__ = ("sql", "expires_at")
+
+    def __init__(self, sql: str, expires_at: float):
+        self.sql = sql
+        self.expires_at = expires_at
+
+
+class SQLQueryCache:
+    """
+    Two-tier (exact + embedding similarity) LRU/TTL cache of generated SQL.
+
+    Args:
+        max_entries: Maximum number of cached questions
+        ttl: Seconds an entry stays valid
+        similarity_threshold: Minimum cosine similarity for a semantic hit
+        embeddings: LangChain embeddings object; None builds OllamaEmbeddings
+        index: Vector index for the semantic tier; None picks Qdrant or in-memory
+        schema_path: Schema file whose registry version keys the cache
+        semantic: Enable the embedding-similarity tier (SQL_CACHE_SEMANTIC)
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SQL_CACHE_MAX_ENTRIES,
+        ttl: float = SQL_CACHE_TTL,
+        similarity_threshold: float = SQL_CACHE_SIMILARITY_THRESHOLD,
+        embeddings: Any = None,
+        index: Any = None,
+        schema_path: Optional[str] = None,
+        semantic: bool = SQL_CACHE_SEMANTIC,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.semantic = semantic
+        self.schema_path = schema_path
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._embeddings = embeddings
+        self._index = index
+        self._embedding_disabled_until = 0.0
+        # Vectors computed during a missed lookup, reused by the following store().
+        self._pending_vectors: "OrderedDict[str, List[float]]" = OrderedDict()
+
+        self._schema_hash: Optional[str] = None
+
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.semantic_rejections = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ------------------------------------------------------------------ #
+    # Schema versioning
+    # ------------------------------------------------------------------ #
+    def _current_schema_hash(self) -> Optional[str]:
+        """Return the schema version tracked by the schema registry."""
+        try:
+            return get_schema_registry(self.schema_path).get().version
+        except (OSError, ValueError):
+            return self._schema_hash
+
+    def _check_schema_version(self) -> None:
+        digest = self._current_schema_hash()
+        if digest != self._schema_hash:
+            if self._schema_hash is not None:
+                self.invalidate()
+            self._schema_hash = digest
+
+    # ------------------------------------------------------------------ #
+    # Semantic tier helpers
+    # ------------------------------------------------------------------ #
+    def _get_index(self):
+        if self._index is None:
+            self._index = create_vector_index(SQL_CACHE_COLLECTION)
+        return self._index
+
+    def _embed(self, text: str) -> Optional[List[float]]:
+        if not self.semantic or time.monotonic() < self._embedding_disabled_until:
+            return None
+        try:
+            if self._embeddings is None:
+                from langchain_ollama import OllamaEmbeddings
+
+                self._embeddings = OllamaEmbeddings(
+                    base_url=OLLAMA_URL, model=SQL_CACHE_EMBEDDING_MODEL
+                )
+            return self._embeddings.embed_query(text)
+        except Exception as e:
+            print(f"Warning: SQL cache embedding failed, semantic tier paused: {e}")
+            self._embedding_disabled_until = time.monotonic() + _EMBEDDING_RETRY_BACKOFF
+            return None
+
+    def _semantic_lookup(self, key: str, question: str) -> Optional[str]:
+        vector = self._embed(key)
+        if vector is None:
+            return None
+        with self._lock:
+            self._pending_vectors[key] = vector
+            while len(self._pending_vectors) > self.max_entries:
+                self._pending_vectors.popitem(last=False)
+        try:
+            hits = self._get_index().search(
+                vector, limit=1, min_score=self.similarity_threshold
+            )
+        except Exception as e:
+            print(f"Warning: SQL cache vector search failed: {e}")
+            return None
+        for _, payload in hits:
+            # A near-identical question about another period or entity needs other SQL
+            if payload.get("literals") != question_literals(question):
+                self.semantic_rejections += 1
+                continue
+            entry = self._get_live_entry(payload.get("key", ""))
+            if entry is not None:
+                return entry.sql
+        return None
+
+    # ------------------------------------------------------------------ #
+    # Public API
+    # ------------------------------------------------------------------ #
+    def _get_live_entry(self, key: str) -> Optional[_Entry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at >= time.monotonic():
+                self._entries.move_to_end(key)
+                return entry
+            del self._entries[key]
+        # Expired: drop the matching vector as well.
+        if self.semantic:
+            self._remove_vector(key)
+        return None
+
+    def _remove_vector(self, key: str) -> None:
+        try:
+            self._get_index().remove(key)
+        except Exception as e:
+            print(f"Warning: SQL cache vector removal failed: {e}")
+
+    def lookup(self, question: str) -> Optional[str]:
+        """
+        Return cached SQL for a question, or None on a miss.
+
+        Args:
+            question: The user's natural language question
+
+        Returns:
+            The cached SQL query, or None if neither tier matched
+        """
+        self._check_schema_version()
+        key = normalize_question(question)
+
+        entry = self._get_live_entry(key)
+        if entry is not None:
+            self.hits_exact += 1
+            return entry.sql
+
+        sql = self._semantic_lookup(key, question)
+        if sql is not None:
+            self.hits_semantic += 1
+            return sql
+
+        self.misses += 1
+        return None
+
+    def store(self, question: str, sql_query: str) -> None:
+        """
+        Cache the SQL generated for a question.
+
+        Args:
+            question: The user's natural language question
+            sql_query: SQL that answered it successfully
+        """
+        self._check_schema_version()
+        key = normalize_question(question)
+        evicted: List[str] = []
+        with self._lock:
+            self._entries[key] = _Entry(sql_query, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                evicted.append(old_key)
+                self.evictions += 1
+            vector = self._pending_vectors.pop(key, None)
+
+        if not self.semantic:
+            return
+        for old_key in evicted:
+            self._remove_vector(old_key)
+        if vector is None:
+            vector = self._embed(key)
+        if vector is not None:
+            try:
+                self._get_index().add(
+                    key, vector, {"key": key, "literals": question_literals(question)}
+                )
+            except Exception as e:
+                print(f"Warning: SQL cache vector insert failed: {e}")
+
+    def invalidate(self) -> None:
+        """Drop every cached entry from both tiers."""
+        with self._lock:
+            self._entries.clear()
+            self._pending_vectors.clear()
+            self.invalidations += 1
+        if self._index is not None:
+            try:
+                self._index.clear()
+            except Exception as e:
+                print(f"Warning: SQL cache vector index clear failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and occupancy."""
+        lookups = self.hits_exact + self.hits_semantic + self.misses
+        hits = self.hits_exact + self.hits_semantic
+        return {
+            "entries": len(self._entries),
+            "hits_exact": self.hits_exact,
+            "hits_semantic": self.hits_semantic,
+            "semantic_rejections": self.semantic_rejections,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "schema_hash": self._schema_hash,
+        }
+
+
+_cache: Optional[SQLQueryCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_sql_cache() -> Optional[SQLQueryCache]:
+    """Return the process-wide SQL cache, or None when SQL_CACHE_ENABLED is false."""
+    global _cache
+    if not SQL_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SQLQueryCache()
+    return _cache
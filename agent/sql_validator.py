@@ -0,0 +1,376 @@
+"""
+Token-based validator for generated SQL.
+
+The statement is tokenized in a single regex pass that understands string
+literals (including E'' and dollar-quoted bodies), quoted identifiers and
+comments, so keywords hidden inside them are never mistaken for real ones and
+keywords next to parentheses, semicolons or newlines are never missed.
+
+The token stream is then checked for:
+- exactly one statement, starting with SELECT, WITH, VALUES, TABLE or "("
+- no data-modifying keywords (including data-modifying CTEs and SELECT INTO)
+- no row-locking clauses and no blocked server functions
+
+Alongside the verdict the validator returns the tables the statement reads
+from (CTE names excluded), so the result cache can index entries by table
+without parsing the SQL again. Verdicts are memoized by statement
+fingerprint: the token stream with literals masked, so queries that differ
+only in constants share one entry.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from .config import load_environment
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Memoization
+SQL_VALIDATOR_CACHE_SIZE = int(os.getenv("SQL_VALIDATOR_CACHE_SIZE", "4096"))
+
+_TOKEN = re.compile(
+    r"""
+    (?P<space>\s+)
+    |(?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<string>[Ee]'(?:[^'\\]|\\.|'')*'|[BbXxNn]?'(?:[^']|'')*')
+    |(?P<dollar>\$(?P<tag>[A-Za-z_][A-Za-z0-9_]*|)\$.*?\$(?P=tag)\$)
+    |(?P<ident>"(?:[^"]|"")*")
+    |(?P<param>\$\d+)
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_$]*)
+    |(?P<unterminated>'|"|/\*|\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$)
+    |(?P<op>::|<=|>=|<>|!=|\|\||.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Statements may only start with one of these tokens
+_READ_STARTS = frozenset({"select", "with", "values", "table", "("})
+
+# Keywords that modify data or the schema wherever they appear
+_FORBIDDEN_KEYWORDS = frozenset({
+    "insert", "update", "delete", "merge", "drop", "create", "alter",
+    "truncate", "grant", "revoke", "exec", "execute", "copy", "call",
+    "into", "lock", "vacuum", "reindex", "cluster", "listen", "notify",
+})
+
+# Functions with side effects or server filesystem/network access
+_FORBIDDEN_FUNCTIONS = frozenset({
+    "pg_terminate_backend", "pg_cancel_backend", "pg_reload_conf",
+    "pg_read_file", "pg_read_binary_file", "pg_ls_dir", "pg_stat_file",
+    "lo_import", "lo_export", "dblink", "dblink_exec", "set_config",
+    "pg_advisory_lock", "pg_advisory_xact_lock", "nextval", "setval",
+})
+
+# Keywords that end a FROM list at the same nesting level
+_FROM_TERMINATORS = frozenset({
+    "where", "group", "having", "order", "limit", "offset", "union",
+    "intersect", "except", "window", "fetch", "for",
+})
+
+Token = Tuple[str, str]
+
+
+class SQLValidation:
+    """
+    Verdict for one statement.
+
+    Attributes:
+        valid: True if the statement is a single read-only query
+        reason: Why the statement was rejected (empty when valid)
+        tables: Lowercase names of the tables read, without schema or CTE names
+        fingerprint: Hash of the statement with literals masked
+    """
+
+    __slots__ = ("valid", "reason", "tables", "fingerprint")
+
+    def __init__(self, valid: bool, reason: str, tables: FrozenSet[str], fingerprint: str):
+        self.valid = valid
+        self.reason = reason
+        self.tables = tables
+        self.fingerprint = fingerprint
+
+    def __bool__(self) -> bool:
+        return self.valid
+
+
+class SQLSyntaxError(ValueError):
+    """Raised by tokenize_sql for unterminated literals or comments."""
+
+
+def tokenize_sql(sql: str) -> List[Token]:
+    """
+    Split SQL into (kind, value) tokens, dropping whitespace and comments.
+
+    Kinds are "word" (lowercased keyword or identifier), "ident" (quoted
+    identifier without quotes), "string", "number", "param" and "op".
+
+    Raises:
+        SQLSyntaxError: On an unterminated string, identifier or comment
+    """
+    tokens: List[Token] = []
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        if kind in ("space", "comment"):
+            continue
+        value = match.group(kind)
+        if kind == "unterminated":
+            raise SQLSyntaxError(f"Unterminated literal or comment starting with {value!r}.")
+        if kind == "dollar":
+            kind = "string"
+        elif kind == "word":
+            value = value.lower()
+        elif kind == "ident":
+            value = value[1:-1].replace('""', '"')
+        tokens.append((kind, value))
+    return tokens
+
+
+def strip_statement(sql: str) -> str:
+    """
+    Return a statement without trailing terminators and comments, so it can be nested.
+
+    ``SELECT 1; -- done`` becomes ``SELECT 1``; semicolons and comments inside
+    literals are kept. Text that does not tokenize is only stripped of
+    whitespace and trailing semicolons.
+    """
+    end = 0
+    for match in _TOKEN.finditer(sql):
+        kind = match.lastgroup
+        if kind == "unterminated":
+            return sql.strip().rstrip(";").rstrip()
+        if kind in ("space", "comment") or (kind == "op" and match.group(kind) == ";"):
+            continue
+        end = match.end()
+    return sql[:end].strip()
+
+
+def fingerprint_tokens(tokens: List[Token]) -> str:
+    """Hash the token stream with literals and parameters masked."""
+    masked = " ".join(
+        "?" if kind in ("string", "number", "param") else f"{kind[0]}:{value}"
+        for kind, value in tokens
+    )
+    return hashlib.blake2b(masked.encode(), digest_size=16).hexdigest()
+
+
+def _split_statements(tokens: List[Token]) -> List[List[Token]]:
+    statements: List[List[Token]] = [[]]
+    for token in tokens:
+        if token == ("op", ";"):
+            statements.append([])
+        else:
+            statements[-1].append(token)
+    return [statement for statement in statements if statement]
+
+
+def _is_name(token: Token) -> bool:
+    return token[0] in ("word", "ident")
+
+
+def _cte_names(tokens: List[Token]) -> Set[str]:
+    """Names defined as "name [(columns)] AS [NOT] [MATERIALIZED] ("."""
+    names: Set[str] = set()
+    for i, token in enumerate(tokens):
+        if token != ("word", "as"):
+            continue
+        j = i + 1
+        while j < len(tokens) and tokens[j] in (("word", "not"), ("word", "materialized")):
+            j += 1
+        if j >= len(tokens) or tokens[j] != ("op", "("):
+            continue
+        k = i - 1
+        if k >= 0 and tokens[k] == ("op", ")"):
+            # Skip a column list back to its opening parenthesis
+            depth = 0
+            while k >= 0:
+                if tokens[k] == ("op", ")"):
+                    depth += 1
+                elif tokens[k] == ("op", "("):
+                    depth -= 1
+                    if depth == 0:
+                        break
+                k -= 1
+            k -= 1
+        if k >= 0 and _is_name(tokens[k]):
+            names.add(tokens[k][1])
+    return names
+
+
+def _referenced_tables(tokens: List[Token], cte_names: Set[str]) -> FrozenSet[str]:
+    """Collect the relations named after FROM / JOIN / commas in a FROM list."""
+    tables: Set[str] = set()
+    depth = 0
+    select_depths: Set[int] = set()
+    from_depths: Set[int] = set()
+    expect_table = False
+    i = 0
+    while i < len(tokens):
+        kind, value = tokens[i]
+        if kind == "op":
+            if value == "(":
+                depth += 1
+                expect_table = False  # Subquery or VALUES list instead of a table
+            elif value == ")":
+                select_depths.discard(depth)
+                from_depths.discard(depth)
+                depth -= 1
+            elif value == "," and depth in from_depths:
+                expect_table = True
+            i += 1
+            continue
+
+        if expect_table and _is_name(tokens[i]) and value not in ("lateral", "only"):
+            # Qualified name: keep the last part, ignore function calls
+            j = i
+            while j + 2 < len(tokens) and tokens[j + 1] == ("op", ".") and _is_name(tokens[j + 2]):
+                j += 2
+            is_call = j + 1 < len(tokens) and tokens[j + 1] == ("op", "(")
+            name = tokens[j][1]
+            if not is_call and name not in cte_names:
+                tables.add(name)
+            expect_table = False
+            i = j + 1
+            continue
+
+        if kind == "word":
+            if value == "select":
+                select_depths.add(depth)
+            elif value == "from" and depth in select_depths and tokens[i - 1] != ("word", "distinct"):
+                from_depths.add(depth)
+                expect_table = True
+            elif value == "join":
+                from_depths.add(depth)
+                expect_table = True
+            elif value in _FROM_TERMINATORS:
+                from_depths.discard(depth)
+        i += 1
+    return frozenset(tables)
+
+
+def _check_statement(tokens: List[Token]) -> str:
+    """Return the rejection reason for a single statement, or "" if it is read-only."""
+    first_kind, first = tokens[0]
+    if first not in _READ_STARTS or first_kind not in ("word", "op"):
+        return f"Only SELECT queries are allowed (statement starts with {first.upper()})."
+    for i, (kind, value) in enumerate(tokens):
+        if kind != "word":
+            continue
+        if value in _FORBIDDEN_KEYWORDS:
+            return f"Data-modifying keyword {value.upper()} is not allowed."
+        if value == "for" and i + 1 < len(tokens) and tokens[i + 1][1] in ("update", "share", "no", "key"):
+            return "Row-locking clauses (FOR UPDATE/SHARE) are not allowed."
+        if value in _FORBIDDEN_FUNCTIONS and i + 1 < len(tokens) and tokens[i + 1] == ("op", "("):
+            return f"Function {value}() is not allowed."
+    return ""
+
+
+def analyze_sql(sql: str) -> SQLValidation:
+    """Validate a statement without memoization."""
+    try:
+        tokens = tokenize_sql(sql)
+    except SQLSyntaxError as e:
+        return SQLValidation(False, str(e), frozenset(), "")
+    fingerprint = fingerprint_tokens(tokens)
+    return _analyze_tokens(tokens, fingerprint)
+
+
+def _analyze_tokens(tokens: List[Token], fingerprint: str) -> SQLValidation:
+    statements = _split_statements(tokens)
+    if not statements:
+        return SQLValidation(False, "The query is empty.", frozenset(), fingerprint)
+    if len(statements) > 1:
+        return SQLValidation(
+            False, "Multiple statements are not allowed.", frozenset(), fingerprint
+        )
+    statement = statements[0]
+    reason = _check_statement(statement)
+    tables = _referenced_tables(statement, _cte_names(statement))
+    return SQLValidation(not reason, reason, tables, fingerprint)
+
+
+class SQLValidator:
+    """
+    Memoizing front end for analyze_sql.
+
+    Repeated statements are answered from an exact-text map without
+    tokenizing; new text is tokenized once and looked up by fingerprint
+    before the (cheap) structural checks run.
+
+    Args:
+        cache_size: Verdicts kept per map (LRU)
+    """
+
+    def __init__(self, cache_size: int = SQL_VALIDATOR_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._by_text: "OrderedDict[str, SQLValidation]" = OrderedDict()
+        self._by_fingerprint: "OrderedDict[str, SQLValidation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, memo: "OrderedDict[str, SQLValidation]", key: str, verdict: SQLValidation) -> None:
+        memo[key] = verdict
+        memo.move_to_end(key)
+        while len(memo) > self.cache_size:
+            memo.popitem(last=False)
+
+    def validate(self, sql: str) -> SQLValidation:
+        """Return the (possibly memoized) verdict for a statement."""
+        with self._lock:
+            verdict = self._by_text.get(sql)
+            if verdict is not None:
+                self._by_text.move_to_end(sql)
+                self.hits += 1
+                return verdict
+
+        try:
+            tokens = tokenize_sql(sql)
+        except SQLSyntaxError as e:
+            return SQLValidation(False, str(e), frozenset(), "")
+        fingerprint = fingerprint_tokens(tokens)
+
+        with self._lock:
+            verdict = self._by_fingerprint.get(fingerprint)
+            if verdict is not None:
+                self.hits += 1
+        if verdict is None:
+            verdict = _analyze_tokens(tokens, fingerprint)
+            with self._lock:
+                self.misses += 1
+                self._remember(self._by_fingerprint, fingerprint, verdict)
+        with self._lock:
+            self._remember(self._by_text, sql, verdict)
+        return verdict
+
+    def stats(self) -> Dict[str, Any]:
+        """Return memo hit/miss counters."""
+        return {
+            "entries": len(self._by_fingerprint),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+_validator: Optional[SQLValidator] = None
+_validator_lock = threading.Lock()
+
+
+def get_sql_validator() -> SQLValidator:
+    """Return the process-wide validator, creating it on first use."""
+    global _validator
+    if _validator is None:
+        with _validator_lock:
+            if _validator is None:
+                _validator = SQLValidator()
+    return _validator
+
+
+def validate_sql(sql: str) -> SQLValidation:
+    """Validate a statement through the shared memoizing validator."""
+    return get_sql_validator().validate(sql)
@@ -0,0 +1,128 @@
+"""
+Deferred initialization and readiness tracking.
+
+Importing the application only loads configuration and light modules; the
+expensive work (importing LangGraph and the Ollama clients, compiling the
+graphs, loading the schema, warming the model and the connection pool) runs
+as named warmup steps after the server has started. ``/ready`` reports the
+state of every step and answers 503 until all of them finished, so an
+orchestrator routes traffic to a replica only once it is warm.
+
+A step marked optional (e.g. the model warmup, which fails while Ollama is
+down) is reported when it fails but does not keep the service unready.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class Startup:
+    """
+    Records the warmup steps of one application start.
+
+    Attributes:
+        steps: Per step: ``status`` (running, done, failed or skipped),
+            ``required``, ``seconds`` and ``error``
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self._done: Optional[asyncio.Event] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def step(self, name: str, func: Callable[[], Awaitable[Any]], required: bool = True) -> Any:
+        """
+        Run one warmup step and record its outcome.
+
+        Returns:
+            What the step returned, or None if an optional step failed
+
+        Raises:
+            Exception: Whatever a required step raised
+        """
+        record: Dict[str, Any] = {"status": "running", "required": required, "seconds": None, "error": None}
+        self.steps[name] = record
+        started = time.monotonic()
+        try:
+            result = await func()
+        except Exception as e:
+            record["status"] = "failed"
+            record["error"] = str(e)
+            print(f"Warning: startup step {name} failed: {e}")
+            if required:
+                raise
+            return None
+        finally:
+            record["seconds"] = round(time.monotonic() - started, 4)
+        record["status"] = "done"
+        return result
+
+    def skip(self, name: str, reason: str) -> None:
+        """Record a step that is disabled by configuration."""
+        self.steps[name] = {"status": "skipped", "required": False, "seconds": 0.0, "error": reason}
+
+    def start(self, warmup: Callable[["Startup"], Awaitable[None]]) -> None:
+        """Run ``warmup(self)`` in the background of the running event loop."""
+        self._done = asyncio.Event()
+
+        async def run() -> None:
+            try:
+                await warmup(self)
+            except Exception as e:
+                print(f"Warning: startup failed: {e}")
+            finally:
+                self.finished_at = time.monotonic()
+                self._done.set()
+
+        self._task = asyncio.ensure_future(run())
+
+    @property
+    def ready(self) -> bool:
+        """True once warmup finished and every required step succeeded."""
+        if self.finished_at is None:
+            return False
+        return all(step["status"] != "failed" or not step["required"] for step in self.steps.values())
+
+    async def wait(self) -> None:
+        """Wait for warmup to finish; returns at once when warmup was never started."""
+        if self._done is not None:
+            await self._done.wait()
+
+    async def stop(self) -> None:
+        """Cancel a warmup that is still running (on shutdown)."""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def snapshot(self) -> Dict[str, Any]:
+        finished = self.finished_at if self.finished_at is not None else time.monotonic()
+        return {
+            "ready": self.ready,
+            "warmup_seconds": round(finished - self.started_at, 4),
+            "steps": {name: dict(step) for name, step in self.steps.items()},
+        }
+
+
+_startup: Optional[Startup] = None
+
+
+def get_startup() -> Startup:
+    """Return the startup record of the current application start."""
+    global _startup
+    if _startup is None:
+        _startup = Startup()
+    return _startup
+
+
+def reset_startup() -> Startup:
+    """Begin a new startup record (the application may be started several times in tests)."""
+    global _startup
+    _startup = Startup()
+    return _startup
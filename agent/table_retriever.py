@@ -0,0 +1,195 @@
+"""
+Relevant-table retrieval for the SQL generation prompt.
+
+Each table in the schema is described by one short document (name,
+description and columns). Those documents are embedded once per schema
+version and kept in a vector index; a question then selects only its top-k
+most similar tables plus their foreign-key neighbours, so the prompt stays
+roughly constant in size as the schema grows.
+"""
+
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from .config import load_environment
+from .schema_registry import SchemaSnapshot
+from .vector_index import create_vector_index
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Retrieval behaviour
+TABLE_RETRIEVAL_TOP_K = int(os.getenv("TABLE_RETRIEVAL_TOP_K", "5"))
+TABLE_RETRIEVAL_MAX_TABLES = int(os.getenv("TABLE_RETRIEVAL_MAX_TABLES", "12"))
+# Schemas whose rendered context is at most this long are still sent whole, as part of the
+# constant prompt prefix; the selected tables are then only named after it as a hint
+TABLE_RETRIEVAL_FULL_SCHEMA_CHARS = int(os.getenv("TABLE_RETRIEVAL_FULL_SCHEMA_CHARS", "4000"))
+TABLE_RETRIEVAL_EMBEDDING_MODEL = os.getenv(
+    "TABLE_RETRIEVAL_EMBEDDING_MODEL",
+    os.getenv("SQL_CACHE_EMBEDDING_MODEL", "nomic-embed-text"),
+)
+TABLE_RETRIEVAL_COLLECTION = os.getenv("TABLE_RETRIEVAL_COLLECTION", "schema_tables")
+OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+
+# "purchases.product_id refers to products.id"
+_RELATIONSHIP = re.compile(r"(\w+)\.\w+\s+refers\s+to\s+(\w+)\.\w+", re.IGNORECASE)
+# "Foreign Key -> products.id"
+_FK_DESCRIPTION = re.compile(r"->\s*(\w+)\.\w+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def table_document(table: Dict[str, Any]) -> str:
+    """Text embedded for a table: its name, description and column descriptions."""
+    parts = [table["name"].replace("_", " "), table.get("description", "")]
+    for column in table.get("columns", []):
+        parts.append(f"{column['name'].replace('_', ' ')}: {column.get('description', '')}")
+    return "\n".join(part for part in parts if part)
+
+
+def foreign_key_graph(snapshot: SchemaSnapshot) -> Dict[str, Set[str]]:
+    """Undirected adjacency between tables linked by a foreign key."""
+    graph: Dict[str, Set[str]] = {name: set() for name in snapshot.tables}
+    for name, table in snapshot.tables.items():
+        targets = [
+            match.group(2)
+            for relationship in table.get("relationships") or []
+            for match in [_RELATIONSHIP.search(relationship)]
+            if match is not None
+        ]
+        targets.extend(
+            match.group(1)
+            for column in table.get("columns", [])
+            for match in [_FK_DESCRIPTION.search(column.get("description", ""))]
+            if match is not None
+        )
+        for target in targets:
+            if target in graph and target != name:
+                graph[name].add(target)
+                graph[target].add(name)
+    return graph
+
+
+class TableRetriever:
+    """
+    Select the tables relevant to a question.
+
+    Args:
+        top_k: Number of tables picked by similarity before adding FK neighbours
+        max_tables: Upper bound on selected tables including FK neighbours
+        embeddings: LangChain embeddings object; None builds OllamaEmbeddings
+        index: Vector index; None picks Qdrant or in-memory
+    """
+
+    def __init__(
+        self,
+        top_k: int = TABLE_RETRIEVAL_TOP_K,
+        max_tables: int = TABLE_RETRIEVAL_MAX_TABLES,
+        embeddings: Any = None,
+        index: Any = None,
+    ):
+        self.top_k = top_k
+        self.max_tables = max(max_tables, top_k)
+        self._embeddings = embeddings
+        self._index = index
+        self._indexed_version: Optional[str] = None
+        self._fk_graph: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def _get_embeddings(self):
+        if self._embeddings is None:
+            from langchain_ollama import OllamaEmbeddings
+
+            self._embeddings = OllamaEmbeddings(
+                base_url=OLLAMA_URL, model=TABLE_RETRIEVAL_EMBEDDING_MODEL
+            )
+        return self._embeddings
+
+    def _ensure_index(self, snapshot: SchemaSnapshot) -> None:
+        """(Re)embed every table document when the schema version changes."""
+        if self._indexed_version == snapshot.version:
+            return
+        with self._lock:
+            if self._indexed_version == snapshot.version:
+                return
+            if self._index is None:
+                self._index = create_vector_index(TABLE_RETRIEVAL_COLLECTION)
+            names = list(snapshot.tables)
+            documents = [table_document(snapshot.tables[name]) for name in names]
+            vectors = self._get_embeddings().embed_documents(documents)
+            self._index.clear()
+            for name, vector in zip(names, vectors):
+                self._index.add(name, vector, {"table": name})
+            self._fk_graph = foreign_key_graph(snapshot)
+            self._indexed_version = snapshot.version
+
+    def _lexical_rank(self, snapshot: SchemaSnapshot, question: str) -> List[str]:
+        """Fallback ranking by word overlap when embeddings are unavailable."""
+        words = set(_WORD.findall(question.lower()))
+        scored = []
+        for name, table in snapshot.tables.items():
+            document = set(_WORD.findall(table_document(table).lower()))
+            # Mentioning the table itself ("supplier" / "suppliers") outweighs column overlap
+            stem = name.rstrip("s")
+            bonus = 2 if any(word.rstrip("s") == stem for word in words) else 0
+            scored.append((len(words & document) + bonus, name))
+        scored.sort(key=lambda item: -item[0])
+        return [name for score, name in scored if score > 0]
+
+    def retrieve(self, snapshot: SchemaSnapshot, question: str) -> List[str]:
+        """
+        Return the relevant table names, in schema order.
+
+        Small schemas (no more tables than top_k) are returned whole without
+        any embedding call.
+
+        Args:
+            snapshot: Current schema snapshot from the registry
+            question: The user's natural language question
+
+        Returns:
+            Selected table names (top-k by similarity plus their FK neighbours,
+            capped at max_tables)
+        """
+        if len(snapshot.tables) <= self.top_k:
+            return list(snapshot.tables)
+
+        try:
+            self._ensure_index(snapshot)
+            vector = self._get_embeddings().embed_query(question)
+            hits = self._index.search(vector, limit=self.top_k)
+            ranked = [payload["table"] for _, payload in hits]
+            fk_graph = self._fk_graph
+        except Exception as e:
+            print(f"Warning: table retrieval fell back to keyword matching: {e}")
+            ranked = self._lexical_rank(snapshot, question)[: self.top_k]
+            fk_graph = foreign_key_graph(snapshot)
+
+        if not ranked:
+            # Nothing matched: fall back to the most connected (hub) tables
+            ranked = sorted(snapshot.tables, key=lambda name: -len(fk_graph.get(name, ())))
+            ranked = ranked[: self.top_k]
+
+        selected = set(ranked)
+        # Neighbours of the best matches first, so hub tables cannot crowd them out
+        for name in ranked:
+            for neighbour in sorted(fk_graph.get(name, ())):
+                if len(selected) >= self.max_tables:
+                    break
+                selected.add(neighbour)
+        return [name for name in snapshot.tables if name in selected]
+
+
+_retriever: Optional[TableRetriever] = None
+_retriever_lock = threading.Lock()
+
+
+def get_table_retriever() -> TableRetriever:
+    """Return the process-wide table retriever, creating it on first use."""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = TableRetriever()
+    return _retriever
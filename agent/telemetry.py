@@ -0,0 +1,557 @@
+"""
+Request tracing and Prometheus metrics.
+
+Every HTTP request gets a request id (taken from ``X-Request-ID`` or
+generated) that is carried in a context variable, so spans recorded by the
+workflow nodes, the LLM calls and the database layer - including those on
+executor threads - are attached to the request that caused them.
+
+Durations are also aggregated into histograms that ``render_metrics()``
+exposes in the Prometheus text format. Requests slower than
+SLOW_REQUEST_SECONDS are logged with their spans, and with
+PROFILE_SLOW_REQUESTS enabled a sampling profiler writes their stacks in
+collapsed (flame graph) format.
+"""
+
+import contextvars
+import functools
+import inspect
+import math
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .config import load_environment
+
+# Load environment variables from .env file
+load_environment()
+
+# Configuration: Tracing
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_SECONDS", "10"))
+# Configuration: Sampling profiler for slow requests
+PROFILE_SLOW_REQUESTS = os.getenv("PROFILE_SLOW_REQUESTS", "false").lower() == "true"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.01"))
+PROFILE_MAX_SAMPLES = int(os.getenv("PROFILE_MAX_SAMPLES", "50000"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Client-supplied request ids must match this; they end up in logs and file names
+_REQUEST_ID = re.compile(r"[A-Za-z0-9_-]{1,64}")
+_UNSAFE_FILENAME = re.compile(r"[^A-Za-z0-9_-]")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 100000, 1000000)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram with labels, in the Prometheus data model.
+
+    Args:
+        name: Metric name
+        help_text: One-line description
+        labels: Label names; ``observe`` takes their values in this order
+        buckets: Upper bounds of the buckets (+Inf is added)
+    """
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # label values -> [bucket counts..., sum, count]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        key = tuple(str(v) for v in label_values)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        for key, values in series:
+            for bound, count in zip(self.buckets, values):
+                labels = _label_text(self.labels, key, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _label_text(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_number(values[-2])}")
+            lines.append(f"{self.name}_count{labels} {values[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with labels, in the Prometheus data model."""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        key = tuple(str(v) for v in label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_label_text(self.labels, key)} {_number(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+REQUEST_SECONDS = METRICS.histogram(
+    "db_agent_request_seconds", "HTTP request latency.", ("route", "status")
+)
+NODE_SECONDS = METRICS.histogram(
+    "db_agent_node_seconds", "Wall time of a workflow node.", ("node",)
+)
+LLM_SECONDS = METRICS.histogram(
+    "db_agent_llm_seconds",
+    "LLM call latency by phase (first_token, eval, total).",
+    ("model", "phase"),
+)
+LLM_TOKENS = METRICS.histogram(
+    "db_agent_llm_tokens", "Tokens per LLM call (prompt, completion).", ("model", "kind"), COUNT_BUCKETS
+)
+DB_SECONDS = METRICS.histogram(
+    "db_agent_db_seconds",
+    "Database time by phase (connect, plan, execute, fetch, explain).",
+    ("operation", "phase"),
+)
+DB_ROWS = METRICS.histogram(
+    "db_agent_db_rows", "Rows returned per executed query.", ("operation",), COUNT_BUCKETS
+)
+CACHE_EVENTS = METRICS.counter(
+    "db_agent_cache_events_total", "Cache lookups by cache and outcome.", ("cache", "outcome")
+)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    return METRICS.render()
+
+
+class RequestTrace:
+    """
+    Spans recorded while serving one request.
+
+    Attributes:
+        request_id: Id propagated to every span (and the X-Request-ID header)
+        route: Route template of the request
+        status: Response status code, once known
+        spans: Recorded spans, as dicts with name, start offset, seconds and attributes
+    """
+
+    def __init__(self, request_id: str, route: str = ""):
+        self.request_id = request_id
+        self.route = route
+        self.status = ""
+        self.started = time.time()
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(self, name: str, started: float, seconds: Optional[float], **attributes: Any) -> None:
+        # list.append is atomic, so executor threads can record spans directly
+        self.spans.append({
+            "name": name,
+            "offset": round(started - self.started, 6),
+            "seconds": None if seconds is None else round(seconds, 6),
+            **attributes,
+        })
+
+    def summary(self) -> str:
+        return "; ".join(
+            f"{span['name']} {span['seconds']:.3f}s" if span["seconds"] is not None else span["name"]
+            for span in self.spans
+        )
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar(
+    "db_agent_request_trace", default=None
+)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def request_id_from(header: Optional[str]) -> str:
+    """The client's X-Request-ID if it is a safe token, otherwise a new id."""
+    if header and _REQUEST_ID.fullmatch(header):
+        return header
+    return new_request_id()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time a block and record it on the current request's trace.
+
+    Yields a dict the block can add attributes to (e.g. a row count).
+    """
+    started_wall = time.time()
+    started = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, started_wall, time.perf_counter() - started, **attributes)
+
+
+def record_event(name: str, **attributes: Any) -> None:
+    """Record an instantaneous event (e.g. a cache outcome) on the current trace."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, time.time(), None, **attributes)
+
+
+def record_cache(cache: str, outcome: str) -> None:
+    """Count a cache outcome ("hit", "miss", "coalesced", ...) and note it on the trace."""
+    CACHE_EVENTS.inc(cache, outcome)
+    record_event("cache", cache=cache, outcome=outcome)
+
+
+def record_db(operation: str, phases: Dict[str, float], rows: Optional[int] = None) -> None:
+    """Observe the phase timings (and row count) of one database operation."""
+    for phase, seconds in phases.items():
+        DB_SECONDS.observe(seconds, operation, phase)
+    if rows is not None:
+        DB_ROWS.observe(rows, operation)
+    attributes: Dict[str, Any] = {f"{phase}_seconds": round(s, 6) for phase, s in phases.items()}
+    if rows is not None:
+        attributes["rows"] = rows
+    trace = _current_trace.get()
+    if trace is not None:
+        total = sum(phases.values())
+        trace.add(f"db.{operation}", time.time() - total, total, **attributes)
+
+
+def record_llm(
+    model: str,
+    total_seconds: float,
+    first_token_seconds: Optional[float] = None,
+    eval_seconds: Optional[float] = None,
+    prompt_tokens: Optional[int] = None,
+    completion_tokens: Optional[int] = None,
+) -> None:
+    """Observe one LLM call; token counts and eval time are those reported by Ollama when available."""
+    LLM_SECONDS.observe(total_seconds, model, "total")
+    if first_token_seconds is not None:
+        LLM_SECONDS.observe(first_token_seconds, model, "first_token")
+    if eval_seconds is not None:
+        LLM_SECONDS.observe(eval_seconds, model, "eval")
+    if prompt_tokens is not None:
+        LLM_TOKENS.observe(prompt_tokens, model, "prompt")
+    if completion_tokens is not None:
+        LLM_TOKENS.observe(completion_tokens, model, "completion")
+    trace = _current_trace.get()
+    if trace is not None:
+        attributes = {
+            "model": model,
+            "first_token_seconds": first_token_seconds,
+            "eval_seconds": eval_seconds,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        }
+        trace.add(
+            "llm.generate",
+            time.time() - total_seconds,
+            total_seconds,
+            **{key: value for key, value in attributes.items() if value is not None},
+        )
+
+
+def _annotate_steps(update: Any, seconds: float) -> None:
+    """Add the node's wall time and the request id to the step it logged."""
+    if not isinstance(update, dict):
+        return
+    steps = update.get("history") or []
+    request_id = current_request_id()
+    for step in steps:
+        step["seconds"] = round(seconds, 6)
+        if request_id is not None:
+            step["request_id"] = request_id
+
+
+def instrument_node(name: str, func: Callable) -> Callable:
+    """
+    Wrap a LangGraph node (sync or async) to record its wall time.
+
+    The wrapper keeps the node's signature, so LangGraph still passes
+    ``config`` to nodes that accept it.
+    """
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(state, **kwargs):
+            started = time.perf_counter()
+            with span(f"node.{name}"):
+                update = await func(state, **kwargs)
+            seconds = time.perf_counter() - started
+            NODE_SECONDS.observe(seconds, name)
+            _annotate_steps(update, seconds)
+            return update
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(state, **kwargs):
+        started = time.perf_counter()
+        with span(f"node.{name}"):
+            update = func(state, **kwargs)
+        seconds = time.perf_counter() - started
+        NODE_SECONDS.observe(seconds, name)
+        _annotate_steps(update, seconds)
+        return update
+
+    return wrapper
+
+
+class SamplingProfiler:
+    """
+    Background sampler of every thread's stack, kept in a bounded ring buffer.
+
+    Sampling only runs while at least one request is in flight. When a request
+    turns out to be slow, the samples taken during it are aggregated into
+    collapsed stacks ("frame;frame;frame count"), the input format of most
+    flame graph tools.
+
+    Args:
+        interval: Seconds between samples
+        max_samples: Ring buffer size (older samples are dropped)
+        output_dir: Directory the collapsed stacks are written to
+    """
+
+    def __init__(
+        self,
+        interval: float = PROFILE_INTERVAL,
+        max_samples: int = PROFILE_MAX_SAMPLES,
+        output_dir: str = PROFILE_DIR,
+    ):
+        self.interval = interval
+        self.output_dir = output_dir
+        self._samples: Deque[Tuple[float, str]] = deque(maxlen=max_samples)
+        self._active = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.profiles_written = 0
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            with self._cond:
+                while self._active == 0:
+                    self._cond.wait()
+            now = time.time()
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self._samples.append((now, ";".join(reversed(stack))))
+            time.sleep(self.interval)
+
+    def begin(self) -> None:
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="db-agent-profiler", daemon=True)
+                self._thread.start()
+            self._active += 1
+            self._cond.notify_all()
+
+    def end(self) -> None:
+        with self._cond:
+            self._active = max(0, self._active - 1)
+
+    def collapsed(self, started: float, finished: float) -> Dict[str, int]:
+        """Sample counts per stack taken between two wall-clock times."""
+        counts: Dict[str, int] = {}
+        for at, stack in list(self._samples):
+            if started <= at <= finished:
+                counts[stack] = counts.get(stack, 0) + 1
+        return counts
+
+    def write(self, request_id: str, started: float, finished: float) -> Optional[str]:
+        counts = self.collapsed(started, finished)
+        if not counts:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        # Never let the id leave the output directory, even if a caller skipped request_id_from()
+        name = _UNSAFE_FILENAME.sub("_", request_id)[:64] or new_request_id()
+        path = os.path.join(self.output_dir, f"{name}.folded")
+        with open(path, "w") as f:
+            for stack, count in sorted(counts.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+        self.profiles_written += 1
+        return path
+
+
+_profiler: Optional[SamplingProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> Optional[SamplingProfiler]:
+    """The process-wide sampling profiler, or None when PROFILE_SLOW_REQUESTS is off."""
+    global _profiler
+    if not PROFILE_SLOW_REQUESTS:
+        return None
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = SamplingProfiler()
+    return _profiler
+
+
+@contextmanager
+def request_trace(request_id: str, route: str = "") -> Iterator[RequestTrace]:
+    """
+    Make ``request_id`` current for the duration of a request.
+
+    On exit the caller is expected to have set ``trace.route`` and
+    ``trace.status``; the request latency is observed, and slow requests are
+    logged (and profiled, if enabled).
+    """
+    trace = RequestTrace(request_id, route)
+    token = _current_trace.set(trace)
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.begin()
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        seconds = time.perf_counter() - started
+        _current_trace.reset(token)
+        if profiler is not None:
+            profiler.end()
+        REQUEST_SECONDS.observe(seconds, trace.route or "unmatched", trace.status)
+        if seconds >= SLOW_REQUEST_SECONDS:
+            message = f"Slow request {request_id} {trace.route} took {seconds:.2f}s: {trace.summary()}"
+            if profiler is not None:
+                path = profiler.write(request_id, trace.started, time.time())
+                if path:
+                    message += f" (profile: {path})"
+            print(f"Warning: {message}")
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware that runs every HTTP request inside a ``request_trace``.
+
+    The trace ends when the application returns, after the last body chunk
+    was sent, so a streamed response is timed (and profiled) including the
+    work done while its body is produced, not just until its headers were
+    ready. The request id is echoed in the ``X-Request-ID`` response header.
+    """
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or ())
+        header = headers.get(b"x-request-id")
+        request_id = request_id_from(header.decode("latin-1") if header is not None else None)
+
+        with request_trace(request_id) as trace:
+
+            async def send_with_id(message: Dict[str, Any]) -> None:
+                if message["type"] == "http.response.start":
+                    trace.status = str(message["status"])
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers") or ()) + [
+                        (b"x-request-id", request_id.encode("latin-1"))
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_id)
+            except BaseException:
+                trace.status = trace.status or "500"
+                raise
+            finally:
+                # The router stores the matched route in the shared scope
+                trace.route = getattr(scope.get("route"), "path", "")
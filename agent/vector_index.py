@@ -0,0 +1,177 @@
+"""
+Vector indexes used for embedding-similarity lookups.
+
+Two interchangeable backends are provided: a Qdrant collection (the service
+defined in docker-compose.yml) and a small in-process index that needs no
+external service, which is used for local runs and tests.
+"""
+
+import math
+import operator
+import os
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .config import load_environment
+
+# Load environment variables from .env file
+load_environment()
+
+QDRANT_URL = os.getenv("QDRANT_URL")
+
+SearchHit = Tuple[float, Dict[str, Any]]
+
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def point_id(key: str) -> str:
+    """Derive a stable point id (UUID string, as Qdrant requires) from a text key."""
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+
+
+class InMemoryVectorIndex:
+    """Brute-force cosine-similarity index kept in process memory."""
+
+    def __init__(self):
+        self._vectors: Dict[str, List[float]] = {}
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: str, vector: Sequence[float], payload: Dict[str, Any]) -> None:
+        pid = point_id(key)
+        with self._lock:
+            self._vectors[pid] = _normalize(vector)
+            self._payloads[pid] = dict(payload)
+
+    def search(
+        self,
+        vector: Sequence[float],
+        limit: int = 1,
+        min_score: float = 0.0,
+    ) -> List[SearchHit]:
+        query = _normalize(vector)
+        with self._lock:
+            items = list(self._vectors.items())
+        scored = []
+        for pid, candidate in items:
+            score = sum(map(operator.mul, query, candidate))
+            if score >= min_score:
+                scored.append((score, pid))
+        scored.sort(reverse=True)
+        with self._lock:
+            return [
+                (score, self._payloads[pid])
+                for score, pid in scored[:limit]
+                if pid in self._payloads
+            ]
+
+    def remove(self, key: str) -> None:
+        pid = point_id(key)
+        with self._lock:
+            self._vectors.pop(pid, None)
+            self._payloads.pop(pid, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vectors.clear()
+            self._payloads.clear()
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+
+class QdrantVectorIndex:
+    """
+    Cosine-similarity index stored in a Qdrant collection.
+
+    Args:
+        collection: Name of the Qdrant collection
+        url: Qdrant URL (default: QDRANT_URL environment variable)
+    """
+
+    def __init__(self, collection: str, url: Optional[str] = None):
+        from qdrant_client import QdrantClient
+
+        self.collection = collection
+        self._client = QdrantClient(url=url or QDRANT_URL)
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _ensure_collection(self, size: int) -> None:
+        if self._ready:
+            return
+        from qdrant_client.models import Distance, VectorParams
+
+        with self._lock:
+            if not self._ready:
+                if not self._client.collection_exists(self.collection):
+                    self._client.create_collection(
+                        collection_name=self.collection,
+                        vectors_config=VectorParams(size=size, distance=Distance.COSINE),
+                    )
+                self._ready = True
+
+    def add(self, key: str, vector: Sequence[float], payload: Dict[str, Any]) -> None:
+        from qdrant_client.models import PointStruct
+
+        self._ensure_collection(len(vector))
+        self._client.upsert(
+            collection_name=self.collection,
+            points=[PointStruct(id=point_id(key), vector=list(vector), payload=payload)],
+        )
+
+    def search(
+        self,
+        vector: Sequence[float],
+        limit: int = 1,
+        min_score: float = 0.0,
+    ) -> List[SearchHit]:
+        if not self._ready and not self._client.collection_exists(self.collection):
+            return []
+        response = self._client.query_points(
+            collection_name=self.collection,
+            query=list(vector),
+            limit=limit,
+            score_threshold=min_score,
+            with_payload=True,
+        )
+        return [(point.score, point.payload or {}) for point in response.points]
+
+    def remove(self, key: str) -> None:
+        from qdrant_client.models import PointIdsList
+
+        if not self._ready:
+            return
+        self._client.delete(
+            collection_name=self.collection,
+            points_selector=PointIdsList(points=[point_id(key)]),
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._client.collection_exists(self.collection):
+                self._client.delete_collection(self.collection)
+            self._ready = False
+
+
+def create_vector_index(collection: str):
+    """
+    Return a Qdrant-backed index when QDRANT_URL is configured, else an in-memory one.
+
+    Args:
+        collection: Qdrant collection name (ignored by the in-memory index)
+
+    Returns:
+        QdrantVectorIndex or InMemoryVectorIndex
+    """
+    if QDRANT_URL:
+        try:
+            return QdrantVectorIndex(collection)
+        except ImportError:
+            print("Warning: QDRANT_URL is set but qdrant-client is not installed; "
+                  "falling back to the in-memory vector index.")
+    return InMemoryVectorIndex()
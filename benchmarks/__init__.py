@@ -0,0 +1 @@
+"""End-to-end benchmarks for the agent with local stand-ins for Ollama and Postgres."""
@@ -0,0 +1,102 @@
+"""
+Compare two benchmark result files.
+
+Prints the change of every latency percentile, per-node p50, throughput and
+memory figure, and exits with status 1 when a latency or throughput metric
+regressed by more than the threshold, so it can gate CI.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# (label, path into the results, True if higher is better, gated)
+_Metric = Tuple[str, Tuple[str, ...], bool, bool]
+
+
+def _metrics(baseline: Dict[str, Any], candidate: Dict[str, Any]) -> Iterator[_Metric]:
+    for key in ("p50", "p95", "p99"):
+        yield f"latency {key}", ("latency", key), False, True
+    yield "throughput rps", ("throughput_rps",), True, True
+    nodes = sorted(set(baseline.get("nodes", {})) | set(candidate.get("nodes", {})))
+    for node in nodes:
+        yield f"node {node} p50", ("nodes", node, "p50"), False, False
+    memory = sorted(set(baseline.get("memory", {})) | set(candidate.get("memory", {})))
+    for key in memory:
+        yield f"memory {key}", ("memory", key), False, False
+
+
+def _lookup(results: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    value: Any = results
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return float(value)
+
+
+def compare(
+    baseline: Dict[str, Any], candidate: Dict[str, Any], threshold: float
+) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Compute relative changes between two result documents.
+
+    Returns:
+        The rows (metric, baseline, candidate, change) and the regressed gated metrics
+    """
+    rows: List[Dict[str, Any]] = []
+    regressions: List[str] = []
+    for label, path, higher_is_better, gated in _metrics(baseline, candidate):
+        before, after = _lookup(baseline, path), _lookup(candidate, path)
+        change = None
+        if before and after is not None:
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            if gated and worse > threshold:
+                regressions.append(label)
+        rows.append({"metric": label, "baseline": before, "candidate": after, "change": change})
+    return rows, regressions
+
+
+def _format(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.4f}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument(
+        "--threshold", type=float, default=0.10, help="Allowed relative regression (0.10 = 10%%)"
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(
+        f"baseline {baseline.get('meta', {}).get('commit')} -> "
+        f"candidate {candidate.get('meta', {}).get('commit')}"
+    )
+    width = max(len(row["metric"]) for row in rows) if rows else 10
+    for row in rows:
+        change = "-" if row["change"] is None else f"{row['change']:+.1%}"
+        print(
+            f"{row['metric']:<{width}}  {_format(row['baseline']):>12}  "
+            f"{_format(row['candidate']):>12}  {change:>8}"
+        )
+    if regressions:
+        print(f"Regressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Deterministic stand-in for the Ollama HTTP API.
+
+Serves ``/api/generate`` (streamed or not), ``/api/embed`` and ``/api/tags``
+with configurable latency, so benchmarks measure the agent rather than the
+model. The SQL returned for each benchmark question is fixed; unknown
+questions get a cheap count query.
+"""
+
+import hashlib
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+# Benchmark questions and the SQL the fake model answers them with
+QUESTIONS: List[Tuple[str, str]] = [
+    ("list all suppliers", "SELECT id, name, city FROM suppliers ORDER BY name;"),
+    (
+        "how many products are in each category",
+        "SELECT category, count(*) AS products FROM products GROUP BY category ORDER BY 2 DESC;",
+    ),
+    (
+        "total revenue per product",
+        "SELECT p.name, SUM(s.quantity * s.unit_price) AS revenue FROM sales s "
+        "JOIN products p ON p.id = s.product_id GROUP BY p.name ORDER BY revenue DESC LIMIT 20;",
+    ),
+    (
+        "total purchase cost per supplier",
+        "SELECT su.name, SUM(pu.quantity * pu.unit_cost) AS cost FROM purchases pu "
+        "JOIN suppliers su ON su.id = pu.supplier_id GROUP BY su.name ORDER BY cost DESC;",
+    ),
+    (
+        "daily revenue in january 2023",
+        "SELECT sale_date, SUM(quantity * unit_price) AS revenue FROM sales "
+        "WHERE sale_date BETWEEN '2023-01-01' AND '2023-01-31' GROUP BY sale_date ORDER BY sale_date;",
+    ),
+    (
+        "top 10 products by quantity sold",
+        "SELECT p.name, SUM(s.quantity) AS sold FROM sales s JOIN products p ON p.id = s.product_id "
+        "GROUP BY p.name ORDER BY sold DESC LIMIT 10;",
+    ),
+    (
+        "gross profit per product",
+        "WITH revenue AS (SELECT product_id, SUM(quantity * unit_price) AS amount FROM sales "
+        "GROUP BY product_id), cost AS (SELECT product_id, SUM(quantity * unit_cost) AS amount "
+        "FROM purchases GROUP BY product_id) SELECT p.name, COALESCE(r.amount, 0) - "
+        "COALESCE(c.amount, 0) AS gross_profit FROM products p LEFT JOIN revenue r ON "
+        "r.product_id = p.id LEFT JOIN cost c ON c.product_id = p.id ORDER BY gross_profit DESC LIMIT 20;",
+    ),
+    (
+        "products that were never sold",
+        "SELECT p.id, p.name FROM products p LEFT JOIN sales s ON s.product_id = p.id "
+        "WHERE s.id IS NULL ORDER BY p.id LIMIT 100;",
+    ),
+]
+
+_DEFAULT_SQL = "SELECT count(*) AS products FROM products;"
+_QUESTION_MARKER = "Here's user's question:"
+_EMBEDDING_SIZE = 64
+
+
+def _answer(prompt: str) -> str:
+    """SQL for the question embedded in a generation prompt."""
+    if not prompt.strip():
+        return ""
+    tail = prompt.rsplit(_QUESTION_MARKER, 1)[-1].strip().lower()
+    question = tail.splitlines()[0].strip() if tail else ""
+    for known, sql in QUESTIONS:
+        if question.startswith(known):
+            return sql
+    return _DEFAULT_SQL
+
+
+def _embed(text: str) -> List[float]:
+    """Deterministic bag-of-words embedding."""
+    vector = [0.0] * _EMBEDDING_SIZE
+    for word in text.lower().split():
+        vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % _EMBEDDING_SIZE] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+class FakeOllamaServer:
+    """
+    Threaded HTTP server imitating the parts of the Ollama API the agent uses.
+
+    Args:
+        latency: Seconds before the first token (prompt evaluation / queueing)
+        tokens_per_second: Streaming rate of the completion (0 streams instantly)
+        port: Port to bind on 127.0.0.1 (0 picks a free one)
+    """
+
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 0.0, port: int = 0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.requests: Dict[str, int] = {"generate": 0, "embed": 0}
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, payload: dict) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_chunk(self, payload: dict) -> None:
+                data = (json.dumps(payload) + "\n").encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def do_GET(self):
+                self._send_json({"models": []})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.startswith("/api/embed"):
+                    server.requests["embed"] += 1
+                    inputs = body.get("input") or body.get("prompt") or ""
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    self._send_json({"model": body.get("model"), "embeddings": [_embed(t) for t in inputs]})
+                    return
+                server.requests["generate"] += 1
+                self._generate(body)
+
+            def _generate(self, body: dict) -> None:
+                prompt = body.get("prompt", "")
+                text = _answer(prompt)
+                if text:
+                    time.sleep(server.latency)
+                tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+                final = {
+                    "model": body.get("model"),
+                    "response": "",
+                    "done": True,
+                    "done_reason": "stop",
+                    "prompt_eval_count": len(prompt) // 4,
+                    "eval_count": len(tokens),
+                }
+                if not body.get("stream", True):
+                    self._send_json({**final, "response": text})
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        if server.tokens_per_second > 0:
+                            time.sleep(1.0 / server.tokens_per_second)
+                        self._send_chunk({"model": body.get("model"), "response": token, "done": False})
+                    self._send_chunk(final)
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The agent stops reading at the statement terminator
+                    pass
+
+        return Handler
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> "FakeOllamaServer":
+        """Serve from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the fake Ollama server.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeOllamaServer(args.latency, args.tokens_per_second, args.port)
+    print(f"Fake Ollama listening on {fake.url}")
+    fake.serve_forever()
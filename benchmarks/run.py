@@ -0,0 +1,244 @@
+"""
+End-to-end benchmark of the chat API or the compiled workflow.
+
+Starts the fake Ollama server, points the agent at it and drives N concurrent
+sessions, each sending its questions one after another. Reports p50/p95/p99
+latency, throughput, memory per session and a per-node breakdown, and writes
+the results as JSON for ``python -m benchmarks.compare``.
+
+Usage:
+    python -m benchmarks.run --sessions 16 --turns 10 --llm-latency 0.2
+    python -m benchmarks.run --target workflow --db stub --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from .fake_llm import QUESTIONS, FakeOllamaServer
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated percentile of ``values`` (q in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """p50/p95/p99, mean and max of a list of durations, in seconds."""
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 6),
+        "p95": round(percentile(values, 95), 6),
+        "p99": round(percentile(values, 99), 6),
+        "mean": round(sum(values) / len(values), 6) if values else 0.0,
+        "max": round(max(values), 6) if values else 0.0,
+    }
+
+
+def node_durations(history: List[Dict[str, Any]], started_at: float) -> Dict[str, float]:
+    """
+    Seconds spent per node, from the completion timestamps of the step log.
+
+    Each step is charged the time since the previous step finished (the first
+    one since the request started); repeated nodes are summed.
+    """
+    durations: Dict[str, float] = defaultdict(float)
+    previous = started_at
+    for step in history:
+        at = step.get("at")
+        if at is None:
+            continue
+        durations[step["node"]] += max(0.0, at - previous)
+        previous = at
+    return durations
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class BenchmarkRun:
+    """
+    Collects per-request measurements.
+
+    Args:
+        target: "app" (HTTP API through ASGI) or "workflow" (compiled graph)
+    """
+
+    def __init__(self, target: str):
+        self.target = target
+        self.latencies: List[float] = []
+        self.nodes: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, latency: float, history: List[Dict[str, Any]], started_at: float) -> None:
+        self.latencies.append(latency)
+        for node, seconds in node_durations(history, started_at).items():
+            self.nodes[node].append(seconds)
+
+    async def _session_app(self, client, session_id: str, questions: List[str]) -> None:
+        for question in questions:
+            started_at = time.time()
+            started = time.perf_counter()
+            response = await client.post(f"/chat/{session_id}", params={"message": question})
+            latency = time.perf_counter() - started
+            if response.status_code != 200:
+                self.errors[f"http_{response.status_code}"] += 1
+                continue
+            self.record(latency, response.json().get("workflow_history", []), started_at)
+
+    async def _session_workflow(self, workflow, questions: List[str]) -> None:
+        for question in questions:
+            started_at = time.time()
+            started = time.perf_counter()
+            try:
+                result = await workflow.ainvoke({"user_input": question})
+            except Exception as e:
+                self.errors[type(e).__name__] += 1
+                continue
+            latency = time.perf_counter() - started
+            if result.get("query_error"):
+                self.errors[f"query_{result.get('query_error_kind')}"] += 1
+            self.record(latency, result.get("history", []), started_at)
+
+    async def run(self, sessions: int, turns: int) -> float:
+        """Drive all sessions concurrently; return the wall time in seconds."""
+        plans = [
+            [QUESTIONS[(session + turn) % len(QUESTIONS)][0] for turn in range(turns)]
+            for session in range(sessions)
+        ]
+        started = time.perf_counter()
+        if self.target == "app":
+            import httpx
+            from main import app
+
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+                async with httpx.AsyncClient(
+                    transport=transport, base_url="http://benchmark", timeout=None
+                ) as client:
+                    started = time.perf_counter()
+                    await asyncio.gather(*(
+                        self._session_app(client, f"bench-{index}", plan)
+                        for index, plan in enumerate(plans)
+                    ))
+        else:
+            from graph.workflow import get_workflow
+
+            workflow = get_workflow()
+            await asyncio.gather(*(self._session_workflow(workflow, plan) for plan in plans))
+        return time.perf_counter() - started
+
+
+def _configure_environment(args: argparse.Namespace, fake: FakeOllamaServer) -> None:
+    """Point the agent at the fake server before any agent module is imported."""
+    os.environ["OLLAMA_BASE_URL"] = fake.url
+    os.environ.setdefault("OLLAMA_KEEP_WARM_INTERVAL", "0")
+    os.environ.setdefault("LLM_MAX_CONCURRENCY", str(args.llm_parallel))
+    if not args.cache:
+        os.environ["SQL_CACHE_ENABLED"] = "false"
+        os.environ["RESULT_CACHE_ENABLED"] = "false"
+
+
+def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    fake = FakeOllamaServer(args.llm_latency, args.tokens_per_second).start()
+    try:
+        _configure_environment(args, fake)
+        if args.db == "stub":
+            from .stub_db import install_stub_database
+
+            install_stub_database(args.stub_rows, args.stub_latency)
+        elif args.seed_scale:
+            from agent.run_sql_query import DEFAULT_CONNECT_KWARGS
+            from .seed import seed
+
+            seed(DEFAULT_CONNECT_KWARGS, args.seed_scale)
+
+        if args.trace_memory:
+            tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0] if args.trace_memory else 0
+
+        run = BenchmarkRun(args.target)
+        wall = asyncio.run(run.run(args.sessions, args.turns))
+
+        memory: Dict[str, Any] = {}
+        if args.trace_memory:
+            memory["heap_bytes_per_session"] = int(
+                (tracemalloc.get_traced_memory()[0] - baseline) / max(1, args.sessions)
+            )
+            tracemalloc.stop()
+        if args.target == "app":
+            from agent.session_store import get_session_store
+
+            store = get_session_store().stats()
+            if store.get("sessions"):
+                memory["session_store_bytes_per_session"] = int(store["bytes"] / store["sessions"])
+    finally:
+        fake.stop()
+
+    completed = len(run.latencies)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "args": vars(args),
+        },
+        "requests": completed,
+        "errors": dict(run.errors),
+        "wall_seconds": round(wall, 4),
+        "throughput_rps": round(completed / wall, 3) if wall else 0.0,
+        "latency": summarize(run.latencies),
+        "nodes": {node: summarize(values) for node, values in sorted(run.nodes.items())},
+        "memory": memory,
+        "llm_requests": dict(fake.requests),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the database agent end to end.")
+    parser.add_argument("--target", choices=["app", "workflow"], default="app")
+    parser.add_argument("--sessions", type=int, default=8, help="Concurrent sessions")
+    parser.add_argument("--turns", type=int, default=10, help="Questions per session")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0)
+    parser.add_argument("--llm-parallel", type=int, default=4, help="LLM_MAX_CONCURRENCY for the run")
+    parser.add_argument("--db", choices=["postgres", "stub"], default="postgres")
+    parser.add_argument("--seed-scale", type=float, default=0.0, help="Reseed Postgres at this scale first")
+    parser.add_argument("--stub-rows", type=int, default=20)
+    parser.add_argument("--stub-latency", type=float, default=0.005)
+    parser.add_argument("--cache", action="store_true", help="Keep the SQL and result caches enabled")
+    parser.add_argument("--trace-memory", action="store_true", help="Measure heap growth (slower)")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = benchmark(args)
+    text = json.dumps(results, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
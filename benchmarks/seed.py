@@ -0,0 +1,83 @@
+"""
+Seed the benchmark database with synthetic rows.
+
+Rows are generated server-side with ``generate_series``, so seeding at scale
+takes seconds. Existing rows of the four sample tables are replaced.
+
+Usage:
+    python -m benchmarks.seed --scale 10
+"""
+
+import argparse
+from typing import Any, Dict
+
+import psycopg2
+
+# Rows per table at scale 1
+_BASE_ROWS = {"suppliers": 50, "products": 1000, "purchases": 20000, "sales": 100000}
+
+_DDL = """
+CREATE TABLE IF NOT EXISTS products (
+    id SERIAL PRIMARY KEY, name VARCHAR NOT NULL, category VARCHAR, description TEXT);
+CREATE TABLE IF NOT EXISTS suppliers (
+    id SERIAL PRIMARY KEY, name VARCHAR NOT NULL, city VARCHAR, address VARCHAR);
+CREATE TABLE IF NOT EXISTS purchases (
+    id SERIAL PRIMARY KEY, product_id INTEGER REFERENCES products(id),
+    supplier_id INTEGER REFERENCES suppliers(id), purchase_date DATE,
+    quantity INTEGER, unit_cost DOUBLE PRECISION);
+CREATE TABLE IF NOT EXISTS sales (
+    id SERIAL PRIMARY KEY, product_id INTEGER REFERENCES products(id),
+    sale_date DATE, quantity INTEGER, unit_price DOUBLE PRECISION);
+"""
+
+_FILL = [
+    """INSERT INTO suppliers (name, city, address)
+       SELECT 'Supplier ' || g, 'City ' || (g %% 20), g || ' Market Street'
+       FROM generate_series(1, %(suppliers)s) AS g""",
+    """INSERT INTO products (name, category, description)
+       SELECT 'Product ' || g, 'Category ' || (g %% 12), 'Description for product ' || g
+       FROM generate_series(1, %(products)s) AS g""",
+    """INSERT INTO purchases (product_id, supplier_id, purchase_date, quantity, unit_cost)
+       SELECT 1 + (g::bigint * 7919) %% %(products)s, 1 + g %% %(suppliers)s,
+              DATE '2022-01-01' + (g %% 730), 1 + g %% 50, 1 + (g %% 400) / 4.0
+       FROM generate_series(1, %(purchases)s) AS g""",
+    """INSERT INTO sales (product_id, sale_date, quantity, unit_price)
+       SELECT 1 + floor(%(products)s * power(random(), 3))::int, DATE '2022-01-01' + (g %% 730),
+              1 + g %% 10, 2 + (g %% 500) / 4.0
+       FROM generate_series(1, %(sales)s) AS g""",
+]
+
+
+def seed(connect_kwargs: Dict[str, Any], scale: float = 1.0) -> Dict[str, int]:
+    """
+    Replace the sample tables' rows with ``scale`` times the base row counts.
+
+    Sales are skewed towards low product ids, like real product popularity.
+
+    Returns:
+        Rows inserted per table
+    """
+    counts = {table: max(1, int(rows * scale)) for table, rows in _BASE_ROWS.items()}
+    conn = psycopg2.connect(**connect_kwargs)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(_DDL)
+            cursor.execute(
+                "TRUNCATE sales, purchases, products, suppliers RESTART IDENTITY CASCADE"
+            )
+            for statement in _FILL:
+                cursor.execute(statement, counts)
+            cursor.execute("ANALYZE products, suppliers, purchases, sales")
+        conn.commit()
+    finally:
+        conn.close()
+    return counts
+
+
+if __name__ == "__main__":
+    from agent.run_sql_query import DEFAULT_CONNECT_KWARGS
+
+    parser = argparse.ArgumentParser(description="Seed the benchmark database.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier of the base row counts")
+    args = parser.parse_args()
+    print(seed(DEFAULT_CONNECT_KWARGS, args.scale))
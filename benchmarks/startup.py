@@ -0,0 +1,181 @@
+"""
+Cold-start benchmark: import time of the application and time to readiness.
+
+Every measurement runs in a fresh interpreter, so nothing is cached in
+``sys.modules``. Reports the median and minimum time to ``import main``, the
+slowest modules from ``python -X importtime``, and (with ``--ready``) the
+time from process start until the lifespan warmup finished against the fake
+Ollama server. Exits with status 1 when a median exceeds its budget, so CI
+catches an import that became eager again.
+
+Usage:
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --ready --import-budget 1.0 --ready-budget 5 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from .run import _git_commit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Configuration: Cold-start budgets in seconds (median of the runs)
+STARTUP_IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "1.0"))
+STARTUP_READY_BUDGET = float(os.getenv("STARTUP_READY_BUDGET", "10.0"))
+
+# Modules that must not be imported by ``import main`` (they load in the warmup)
+DEFERRED_MODULES = ("langgraph", "langchain_ollama", "langchain_core", "ollama", "httpx")
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import main
+seconds = time.perf_counter() - started
+deferred = sorted(name for name in {deferred!r} if name in sys.modules)
+print(json.dumps({{"seconds": seconds, "eager": deferred}}))
+"""
+
+_READY_SCRIPT = """
+import asyncio, json, os, sys, time
+started = time.perf_counter()
+from benchmarks.fake_llm import FakeOllamaServer
+fake = FakeOllamaServer({latency!r}).start()
+os.environ["OLLAMA_BASE_URL"] = fake.url
+os.environ.setdefault("OLLAMA_KEEP_WARM_INTERVAL", "0")
+import main
+from agent.startup import get_startup
+imported = time.perf_counter() - started
+
+async def warm():
+    async with main.lifespan(main.app):
+        await get_startup().wait()
+        return time.perf_counter() - started, get_startup().snapshot()
+
+seconds, snapshot = asyncio.run(warm())
+fake.stop()
+print(json.dumps({{"import_seconds": imported, "seconds": seconds, "startup": snapshot}}))
+"""
+
+
+def _run_child(script: str, extra_args: Optional[List[str]] = None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *(extra_args or []), "-c", script],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _last_json_line(stdout: str) -> Dict[str, Any]:
+    """The measurement is the last line; modules may print before it."""
+    return json.loads(stdout.strip().splitlines()[-1])
+
+
+def measure_import(runs: int) -> Dict[str, Any]:
+    """Time ``import main`` in ``runs`` fresh interpreters."""
+    seconds = []
+    eager = set()
+    for _ in range(runs):
+        result = _last_json_line(_run_child(_IMPORT_SCRIPT.format(deferred=DEFERRED_MODULES)).stdout)
+        seconds.append(result["seconds"])
+        eager.update(result["eager"])
+    return {
+        "runs": runs,
+        "median": round(statistics.median(seconds), 4),
+        "min": round(min(seconds), 4),
+        "eager_modules": sorted(eager),
+    }
+
+
+def top_imports(limit: int) -> List[Dict[str, Any]]:
+    """
+    The packages that take the longest to import.
+
+    Parsed from ``python -X importtime``, whose report (on stderr) has one
+    ``self | cumulative | module`` line per imported module; the self times
+    of a package's modules are summed, so nothing is counted twice.
+    """
+    stderr = _run_child("import main", ["-X", "importtime"]).stderr
+    packages: Dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        package = fields[2].strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(fields[0])
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [{"module": name, "self_ms": round(micros / 1000, 1)} for name, micros in ranked]
+
+
+def measure_ready(runs: int, latency: float) -> Dict[str, Any]:
+    """Time from interpreter start until the lifespan warmup finished."""
+    seconds = []
+    snapshot: Dict[str, Any] = {}
+    for _ in range(runs):
+        result = _last_json_line(_run_child(_READY_SCRIPT.format(latency=latency)).stdout)
+        seconds.append(result["seconds"])
+        snapshot = result["startup"]
+    return {
+        "runs": runs,
+        "median": round(statistics.median(seconds), 4),
+        "min": round(min(seconds), 4),
+        "last_startup": snapshot,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the cold start of the database agent.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=10, help="Slowest packages to report")
+    parser.add_argument("--ready", action="store_true", help="Also measure time to readiness")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake Ollama latency for --ready")
+    parser.add_argument("--import-budget", type=float, default=STARTUP_IMPORT_BUDGET)
+    parser.add_argument("--ready-budget", type=float, default=STARTUP_READY_BUDGET)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results: Dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "args": vars(args),
+        },
+        "import": measure_import(args.runs),
+        "top_imports": top_imports(args.top),
+    }
+    failures = []
+    if results["import"]["median"] > args.import_budget:
+        failures.append(f"import main took {results['import']['median']}s (budget {args.import_budget}s)")
+    if results["import"]["eager_modules"]:
+        failures.append(f"deferred modules imported eagerly: {', '.join(results['import']['eager_modules'])}")
+    if args.ready:
+        results["ready"] = measure_ready(args.runs, args.llm_latency)
+        if results["ready"]["median"] > args.ready_budget:
+            failures.append(f"readiness took {results['ready']['median']}s (budget {args.ready_budget}s)")
+    results["failures"] = failures
+
+    text = json.dumps(results, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    if failures:
+        print("Over budget: " + "; ".join(failures), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
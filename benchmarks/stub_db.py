@@ -0,0 +1,65 @@
+"""
+In-process stand-in for Postgres.
+
+Replaces the workflow's query functions with ones that return synthetic rows
+after a fixed delay, so the rest of the pipeline (scheduler, caches, session
+store, serialization) can be benchmarked without a database server.
+"""
+
+import asyncio
+import time
+from typing import Callable
+
+from agent.result_format import ColumnarResult
+
+
+def _result(count: int) -> ColumnarResult:
+    return ColumnarResult.from_rows(
+        ["id", "name", "value"], [(i, f"Item {i}", i * 1.5) for i in range(count)]
+    )
+
+
+def install_stub_database(rows: int = 20, latency: float = 0.005) -> Callable[[], None]:
+    """
+    Patch graph.workflow to answer every query from memory.
+
+    Args:
+        rows: Rows returned by every query
+        latency: Seconds each execution takes
+
+    Returns:
+        A function that restores the original query functions
+    """
+    import graph.workflow as workflow_module
+
+    result = _result(rows)
+
+    def run(sql_query: str, *args, **kwargs) -> ColumnarResult:
+        time.sleep(latency)
+        return result
+
+    async def arun(sql_query: str, *args, **kwargs) -> ColumnarResult:
+        await asyncio.sleep(latency)
+        return result
+
+    def check(sql_query: str, *args, **kwargs) -> None:
+        return None
+
+    async def acheck(sql_query: str, *args, **kwargs) -> None:
+        return None
+
+    patches = {
+        "run_readonly_query_columnar": run,
+        "run_readonly_query_columnar_async": arun,
+        "check_readonly_query": check,
+        "check_readonly_query_async": acheck,
+    }
+    originals = {name: getattr(workflow_module, name) for name in patches}
+    for name, replacement in patches.items():
+        setattr(workflow_module, name, replacement)
+
+    def restore() -> None:
+        for name, original in originals.items():
+            setattr(workflow_module, name, original)
+
+    return restore
@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, Integer, String, Text, Date, Float, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Text, Date, DateTime, Float, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -42,9 +42,9 @@ class Supplier(Base):
 class Purchase(Base):
     __tablename__ = 'purchases'
     id = Column(Integer, primary_key=True)
-    product_id = Column(Integer, ForeignKey('products.id'))
-    supplier_id = Column(Integer, ForeignKey('suppliers.id'))
-    purchase_date = Column(Date)
+    product_id = Column(Integer, ForeignKey('products.id'), index=True)
+    supplier_id = Column(Integer, ForeignKey('suppliers.id'), index=True)
+    purchase_date = Column(Date, index=True)
     quantity = Column(Integer)
     unit_cost = Column(Float)
 
@@ -55,17 +55,46 @@ class Purchase(Base):
 class Sale(Base):
     __tablename__ = 'sales'
     id = Column(Integer, primary_key=True)
-    product_id = Column(Integer, ForeignKey('products.id'))
-    sale_date = Column(Date)
+    product_id = Column(Integer, ForeignKey('products.id'), index=True)
+    sale_date = Column(Date, index=True)
     quantity = Column(Integer)
     unit_price = Column(Float)
 
     product = relationship('Product', back_populates='sales')
 
-# Create Database Engine
-engine = create_engine(DATABASE_URL)
+# Daily revenue per product, rolled up from sales by rollups.py
+class DailyProductRevenue(Base):
+    __tablename__ = 'daily_product_revenue'
+    product_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    units = Column(Integer)
+    revenue = Column(Float)
 
-# Create all tables
-Base.metadata.create_all(engine)
+# Daily purchase cost per product, rolled up from purchases by rollups.py
+class DailyProductCost(Base):
+    __tablename__ = 'daily_product_cost'
+    product_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    units = Column(Integer)
+    cost = Column(Float)
 
-print("Models defined and tables created.")
+# Highest source row id folded into each rollup
+class RollupState(Base):
+    __tablename__ = 'rollup_state'
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False)
+    # txid_snapshot of the last refresh; rows it could not see are folded next
+    snapshot = Column(Text)
+    refreshed_at = Column(DateTime)
+
+# Create all tables (run this module as a script; importing it has no side effects)
+def create_tables(engine=None):
+    if engine is None:
+        engine = create_engine(DATABASE_URL)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+if __name__ == "__main__":
+    create_tables()
+    print("Models defined and tables created.")
@@ -0,0 +1,169 @@
+"""
+Maintain the per-product, per-day revenue and cost rollups.
+
+daily_product_revenue and daily_product_cost (see database_models.py) hold
+the business_logic formulas pre-aggregated, so revenue/cost/profit questions
+read a few thousand rollup rows instead of scanning sales and purchases.
+
+Refreshes are incremental: each refresh aggregates only rows it has not
+folded in yet and adds them to the existing (product, day) totals with
+INSERT ... ON CONFLICT. Ids alone cannot tell which rows those are, because
+transactions commit out of id order: a row whose insert committed after a
+higher id was folded would be skipped for good. rollup_state therefore keeps
+the highest source id and the transaction snapshot of the last refresh; the
+next refresh folds the rows that snapshot could not see, looking back
+ROLLUP_SAFETY_WINDOW ids below that id for late commits. sales and purchases
+are treated as append-only ledgers; after rows are updated or deleted, or
+when a source table was reloaded (its highest id went down, which is
+detected automatically), a full rebuild is needed.
+
+Usage (from the database/ directory):
+    python rollups.py                # incremental refresh
+    python rollups.py --full         # rebuild from scratch
+    python rollups.py --interval 60  # keep refreshing every minute
+"""
+
+import argparse
+import os
+import time
+from typing import Dict
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+from database_models import DATABASE_URL, Base
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration: Refresh loop
+ROLLUP_REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "0"))
+# Ids below the last refresh's highest id that are checked for rows committed late
+ROLLUP_SAFETY_WINDOW = int(os.getenv("ROLLUP_SAFETY_WINDOW", "100000"))
+
+# rollup table -> source table, date column, measure expression and rollup value column
+ROLLUPS = {
+    "daily_product_revenue": {
+        "source": "sales",
+        "date": "sale_date",
+        "amount": "quantity * unit_price",
+        "value": "revenue",
+    },
+    "daily_product_cost": {
+        "source": "purchases",
+        "date": "purchase_date",
+        "amount": "quantity * unit_cost",
+        "value": "cost",
+    },
+}
+
+# One statement, so the rows folded, the highest id and the saved snapshot all
+# come from the same snapshot. A row was folded by an earlier refresh exactly
+# when its inserting transaction (xmin, widened to 64 bits) is visible in that
+# refresh's snapshot.
+_FOLD = """
+WITH folded AS (
+    INSERT INTO {rollup} (product_id, day, units, {value})
+    SELECT product_id, {date}, SUM(quantity), SUM({amount})
+    FROM {source}
+    WHERE id > :low
+      AND (CAST(:snapshot AS txid_snapshot) IS NULL
+           OR NOT txid_visible_in_snapshot(:xid - age(xmin), CAST(:snapshot AS txid_snapshot)))
+      AND product_id IS NOT NULL AND {date} IS NOT NULL
+    GROUP BY product_id, {date}
+    ON CONFLICT (product_id, day) DO UPDATE
+    SET units = {rollup}.units + EXCLUDED.units,
+        {value} = {rollup}.{value} + EXCLUDED.{value}
+    RETURNING 1
+)
+SELECT (SELECT COALESCE(MAX(id), 0) FROM {source}), txid_current_snapshot()::text,
+       (SELECT count(*) FROM folded)
+"""
+
+_SAVE_STATE = """
+INSERT INTO rollup_state (name, last_id, snapshot, refreshed_at) VALUES (:name, :high, :snapshot, now())
+ON CONFLICT (name) DO UPDATE
+SET last_id = EXCLUDED.last_id, snapshot = EXCLUDED.snapshot, refreshed_at = EXCLUDED.refreshed_at
+"""
+
+# rollup_state tables created before the snapshot column existed
+_ADD_SNAPSHOT_COLUMN = "ALTER TABLE rollup_state ADD COLUMN IF NOT EXISTS snapshot TEXT"
+
+
+def refresh_rollup(conn, rollup: str, full: bool = False) -> Dict[str, int]:
+    """
+    Fold new source rows into one rollup, in the caller's transaction.
+
+    Concurrent refreshes of the same rollup are serialized with an advisory lock.
+
+    Returns:
+        The id range scanned, the number of (product, day) totals changed and
+        whether it was a full rebuild
+    """
+    spec = ROLLUPS[rollup]
+    # txid_current() first: age(xmin) is then measured from this transaction's id
+    xid = conn.execute(
+        text("SELECT txid_current() FROM (SELECT pg_advisory_xact_lock(hashtext(:name))) AS locked"),
+        {"name": rollup},
+    ).scalar()
+    state = conn.execute(
+        text("SELECT last_id, snapshot FROM rollup_state WHERE name = :name"), {"name": rollup}
+    ).first()
+    last_id, snapshot = state if state is not None else (None, None)
+    high = conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {spec['source']}")).scalar()
+
+    rebuild = full or last_id is None or high < last_id
+    if rebuild:
+        conn.execute(text(f"DELETE FROM {rollup}"))
+        low, snapshot = 0, None
+    elif snapshot is None:
+        # Saved before snapshots were kept: only the id mark is known
+        low = last_id
+    else:
+        low = max(0, last_id - ROLLUP_SAFETY_WINDOW)
+    high, snapshot, changed = conn.execute(
+        text(_FOLD.format(rollup=rollup, **spec)), {"low": low, "snapshot": snapshot, "xid": xid}
+    ).one()
+    conn.execute(text(_SAVE_STATE), {"name": rollup, "high": high, "snapshot": snapshot})
+    return {"from_id": low, "to_id": high, "changed": changed, "full": int(rebuild)}
+
+
+def refresh_rollups(engine, full: bool = False) -> Dict[str, Dict[str, int]]:
+    """Refresh every rollup, each in its own transaction, then ANALYZE them."""
+    results = {}
+    for rollup in ROLLUPS:
+        with engine.begin() as conn:
+            results[rollup] = refresh_rollup(conn, rollup, full)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for rollup in ROLLUPS:
+            conn.execute(text(f"ANALYZE {rollup}"))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the revenue and cost rollups.")
+    parser.add_argument("--full", action="store_true", help="Rebuild the rollups from scratch")
+    parser.add_argument(
+        "--interval", type=float, default=ROLLUP_REFRESH_INTERVAL,
+        help="Seconds between incremental refreshes (0 refreshes once)",
+    )
+    args = parser.parse_args()
+
+    engine = create_engine(DATABASE_URL)
+    Base.metadata.create_all(engine, tables=[Base.metadata.tables[name] for name in (*ROLLUPS, "rollup_state")])
+    with engine.begin() as conn:
+        conn.execute(text(_ADD_SNAPSHOT_COLUMN))
+    full = args.full
+    while True:
+        started = time.perf_counter()
+        for rollup, result in refresh_rollups(engine, full).items():
+            mode = "rebuilt" if result["full"] else "refreshed"
+            print(
+                f"{rollup} {mode}: source ids {result['from_id']}..{result['to_id']}, "
+                f"{result['changed']} totals changed"
+            )
+        print(f"Rollups refreshed in {time.perf_counter() - started:.2f}s")
+        if args.interval <= 0:
+            break
+        full = False
+        time.sleep(args.interval)
@@ -0,0 +1,397 @@
+"""
+Synthetic data generator for large-scale testing.
+
+Builds the tables defined in database_models.py without keys or indexes,
+streams generated rows into them with COPY FROM STDIN (one bounded chunk in
+memory at a time), loads partitions of every table in parallel worker
+processes, and only then adds primary keys, foreign keys and indexes.
+
+Product popularity follows a Zipf distribution, so a few products account for
+most sales, and dates are spread over a configurable range.
+
+Usage (from the database/ directory; existing rows are dropped):
+    python synthetic_data.py --sales 10000000 --purchases 1000000 --workers 8
+"""
+
+import argparse
+import bisect
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, text
+from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import CreateTable
+
+from database_models import DATABASE_URL, Base
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Configuration: Generator
+SYNTHETIC_CHUNK_ROWS = int(os.getenv("SYNTHETIC_CHUNK_ROWS", "20000"))
+SYNTHETIC_PARTITION_ROWS = int(os.getenv("SYNTHETIC_PARTITION_ROWS", "1000000"))
+SYNTHETIC_WORKERS = int(os.getenv("SYNTHETIC_WORKERS", str(os.cpu_count() or 4)))
+
+# Bytes handed to the server per read of the COPY stream
+COPY_BUFFER_SIZE = 1 << 16
+
+CATEGORIES = [
+    "Electronics", "Groceries", "Clothing", "Home", "Garden", "Toys",
+    "Sports", "Books", "Beauty", "Automotive", "Office", "Pet Supplies",
+]
+CITIES = [
+    "Berlin", "Madrid", "Paris", "Rome", "Vienna", "Warsaw", "Lisbon",
+    "Prague", "Dublin", "Oslo", "Athens", "Helsinki", "Zurich", "Brussels",
+]
+ADJECTIVES = ["Classic", "Compact", "Deluxe", "Eco", "Smart", "Ultra", "Basic", "Pro"]
+NOUNS = ["Widget", "Kettle", "Lamp", "Backpack", "Charger", "Chair", "Bottle", "Speaker"]
+STREETS = ["Main Street", "Market Street", "Station Road", "Harbor Lane", "Park Avenue"]
+
+
+class GeneratorConfig:
+    """
+    Table sizes and distributions of a synthetic data set.
+
+    Args:
+        rows: Rows per table name (products, suppliers, purchases, sales)
+        start_date: First date of purchases and sales
+        end_date: Last date of purchases and sales
+        popularity_skew: Zipf exponent of product popularity (0 = uniform)
+        seed: Seed of every random generator, so runs are reproducible
+        chunk_rows: Rows generated and buffered per COPY chunk
+    """
+
+    def __init__(
+        self,
+        rows: Dict[str, int],
+        start_date: date = date(2022, 1, 1),
+        end_date: date = date(2024, 12, 31),
+        popularity_skew: float = 1.1,
+        seed: int = 42,
+        chunk_rows: int = SYNTHETIC_CHUNK_ROWS,
+    ):
+        if end_date < start_date:
+            raise ValueError("end_date must not be before start_date")
+        self.rows = rows
+        self.start_date = start_date
+        self.end_date = end_date
+        self.popularity_skew = popularity_skew
+        self.seed = seed
+        self.chunk_rows = chunk_rows
+
+    @property
+    def days(self) -> int:
+        return (self.end_date - self.start_date).days + 1
+
+
+class ProductPicker:
+    """
+    Draws product ids with Zipf-distributed popularity.
+
+    Popularity ranks are shuffled over the ids (with the config seed), so the
+    best sellers are not simply the lowest ids.
+    """
+
+    def __init__(self, products: int, skew: float, seed: int):
+        weights = [1.0 / (rank ** skew) for rank in range(1, products + 1)]
+        total = 0.0
+        self._cumulative: List[float] = []
+        for weight in weights:
+            total += weight
+            self._cumulative.append(total)
+        self._total = total
+        self._ids = list(range(1, products + 1))
+        random.Random(f"{seed}:popularity").shuffle(self._ids)
+
+    def pick(self, rng: random.Random) -> int:
+        rank = bisect.bisect_left(self._cumulative, rng.random() * self._total)
+        return self._ids[min(rank, len(self._ids) - 1)]
+
+
+def base_price(product_id: int) -> float:
+    """Deterministic list price of a product, between 5 and 105."""
+    return 5 + (product_id * 2654435761 % 1000) / 10
+
+
+def _supplier_rows(config, rng, start_id, end_id) -> Iterator[str]:
+    for row_id in range(start_id, end_id):
+        yield (
+            f"{row_id}\tSupplier {row_id}\t{rng.choice(CITIES)}\t"
+            f"{rng.randint(1, 999)} {rng.choice(STREETS)}\n"
+        )
+
+
+def _product_rows(config, rng, start_id, end_id) -> Iterator[str]:
+    for row_id in range(start_id, end_id):
+        category = rng.choice(CATEGORIES)
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {row_id}"
+        yield f"{row_id}\t{name}\t{category}\t{name} from the {category.lower()} range\n"
+
+
+def _purchase_rows(config, rng, start_id, end_id) -> Iterator[str]:
+    picker = _product_picker(config)
+    suppliers = config.rows["suppliers"]
+    for row_id in range(start_id, end_id):
+        product_id = picker.pick(rng)
+        day = config.start_date + timedelta(days=rng.randrange(config.days))
+        cost = round(base_price(product_id) * rng.uniform(0.5, 0.7), 2)
+        yield (
+            f"{row_id}\t{product_id}\t{rng.randint(1, suppliers)}\t{day.isoformat()}\t"
+            f"{rng.randint(10, 200)}\t{cost}\n"
+        )
+
+
+def _sale_rows(config, rng, start_id, end_id) -> Iterator[str]:
+    picker = _product_picker(config)
+    for row_id in range(start_id, end_id):
+        product_id = picker.pick(rng)
+        day = config.start_date + timedelta(days=rng.randrange(config.days))
+        # Mostly single items, occasionally a bulk order
+        quantity = min(1 + int(rng.expovariate(0.6)), 50)
+        price = round(base_price(product_id) * rng.uniform(0.9, 1.2), 2)
+        yield f"{row_id}\t{product_id}\t{day.isoformat()}\t{quantity}\t{price}\n"
+
+
+_ROW_GENERATORS = {
+    "suppliers": _supplier_rows,
+    "products": _product_rows,
+    "purchases": _purchase_rows,
+    "sales": _sale_rows,
+}
+
+# One picker per worker process; building it is O(products)
+_pickers: Dict[Tuple[int, float, int], ProductPicker] = {}
+
+
+def _product_picker(config: GeneratorConfig) -> ProductPicker:
+    key = (config.rows["products"], config.popularity_skew, config.seed)
+    if key not in _pickers:
+        _pickers[key] = ProductPicker(*key)
+    return _pickers[key]
+
+
+class _CopyStream:
+    """
+    File-like reader over generated chunks for ``cursor.copy_expert``.
+
+    Only the current chunk is held in memory.
+    """
+
+    def __init__(self, chunks: Iterator[str]):
+        self._chunks = chunks
+        self._buffer = b""
+        self._offset = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if self._offset >= len(self._buffer):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return b""
+            self._buffer, self._offset = chunk.encode(), 0
+        end = len(self._buffer) if size is None or size < 0 else self._offset + size
+        data = self._buffer[self._offset:end]
+        self._offset += len(data)
+        return data
+
+
+def _chunks(rows: Iterator[str], chunk_rows: int) -> Iterator[str]:
+    batch: List[str] = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= chunk_rows:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def load_partition(table_name: str, start_id: int, end_id: int, config: GeneratorConfig) -> int:
+    """
+    Generate rows ``start_id``..``end_id - 1`` of a table and COPY them in.
+
+    Runs in a worker process with its own connection. Returns the row count.
+    """
+    table = Base.metadata.tables[table_name]
+    columns = ", ".join(column.name for column in table.columns)
+    rng = random.Random(f"{config.seed}:{table_name}:{start_id}")
+    rows = _ROW_GENERATORS[table_name](config, rng, start_id, end_id)
+
+    engine = create_engine(DATABASE_URL, poolclass=NullPool)
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table_name} ({columns}) FROM STDIN",
+                _CopyStream(_chunks(rows, config.chunk_rows)),
+                size=COPY_BUFFER_SIZE,
+            )
+        conn.commit()
+    finally:
+        conn.close()
+        engine.dispose()
+    return end_id - start_id
+
+
+def _partitions(config: GeneratorConfig, partition_rows: int) -> List[Tuple[str, int, int]]:
+    """(table, start_id, end_id) jobs, largest tables first."""
+    jobs = []
+    for table_name, count in sorted(config.rows.items(), key=lambda item: -item[1]):
+        for start in range(1, count + 1, partition_rows):
+            jobs.append((table_name, start, min(start + partition_rows, count + 1)))
+    return jobs
+
+
+def create_bare_tables(engine) -> None:
+    """
+    Drop the model tables and recreate the generated ones with columns only
+    (no keys or indexes). Derived tables, such as the rollups, are recreated
+    empty with their full definition.
+    """
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(text(f'DROP TABLE IF EXISTS "{table.name}" CASCADE'))
+        for table in Base.metadata.sorted_tables:
+            if table.name not in _ROW_GENERATORS:
+                table.create(conn)
+                continue
+            bare = Table(table.name, MetaData(), *(Column(c.name, c.type) for c in table.columns))
+            conn.execute(CreateTable(bare))
+
+
+def finalize_table(table_name: str, rows: int) -> float:
+    """
+    Add the primary key (as an identity column continuing after the loaded
+    ids) and the model's indexes of one table, then ANALYZE it. Returns the
+    seconds taken.
+    """
+    table = Base.metadata.tables[table_name]
+    started = time.perf_counter()
+    engine = create_engine(DATABASE_URL, poolclass=NullPool)
+    try:
+        with engine.begin() as conn:
+            keys = [column.name for column in table.primary_key.columns]
+            conn.execute(text(f'ALTER TABLE "{table_name}" ADD PRIMARY KEY ({", ".join(keys)})'))
+            if len(keys) == 1 and isinstance(table.columns[keys[0]].type, Integer):
+                conn.execute(text(
+                    f'ALTER TABLE "{table_name}" ALTER COLUMN {keys[0]} '
+                    f"ADD GENERATED BY DEFAULT AS IDENTITY (START WITH {rows + 1})"
+                ))
+            for index in table.indexes:
+                index.create(conn)
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f'ANALYZE "{table_name}"'))
+    finally:
+        engine.dispose()
+    return time.perf_counter() - started
+
+
+def add_foreign_keys(engine) -> None:
+    """Add the models' foreign keys once every primary key exists."""
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in _ROW_GENERATORS:
+                continue
+            for constraint in table.foreign_key_constraints:
+                columns = ", ".join(column.name for column in constraint.columns)
+                referred = constraint.referred_table.name
+                referred_columns = ", ".join(element.column.name for element in constraint.elements)
+                conn.execute(text(
+                    f'ALTER TABLE "{table.name}" ADD FOREIGN KEY ({columns}) '
+                    f'REFERENCES "{referred}" ({referred_columns})'
+                ))
+
+
+def generate(
+    config: GeneratorConfig,
+    workers: int = SYNTHETIC_WORKERS,
+    partition_rows: int = SYNTHETIC_PARTITION_ROWS,
+) -> Dict[str, float]:
+    """
+    Rebuild the model tables and fill them with synthetic data.
+
+    Args:
+        config: Table sizes and distributions
+        workers: Worker processes loading partitions (and finalizing tables) in parallel
+        partition_rows: Rows per COPY job; large tables are split into several jobs
+
+    Returns:
+        Seconds spent per phase
+    """
+    engine = create_engine(DATABASE_URL)
+    timings: Dict[str, float] = {}
+
+    started = time.perf_counter()
+    create_bare_tables(engine)
+    timings["create"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(load_partition, table_name, start, end, config): table_name
+            for table_name, start, end in _partitions(config, partition_rows)
+        }
+        for future in as_completed(futures):
+            future.result()
+    timings["load"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(finalize_table, table_name, count)
+            for table_name, count in config.rows.items()
+        ]
+        for future in as_completed(futures):
+            future.result()
+    timings["indexes"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    add_foreign_keys(engine)
+    timings["foreign_keys"] = time.perf_counter() - started
+    engine.dispose()
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load a synthetic data set (replaces existing rows).")
+    parser.add_argument("--products", type=int, default=10_000)
+    parser.add_argument("--suppliers", type=int, default=500)
+    parser.add_argument("--purchases", type=int, default=1_000_000)
+    parser.add_argument("--sales", type=int, default=10_000_000)
+    parser.add_argument("--start-date", type=date.fromisoformat, default=date(2022, 1, 1))
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date(2024, 12, 31))
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of product popularity")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-rows", type=int, default=SYNTHETIC_CHUNK_ROWS)
+    parser.add_argument("--partition-rows", type=int, default=SYNTHETIC_PARTITION_ROWS)
+    parser.add_argument("--workers", type=int, default=SYNTHETIC_WORKERS)
+    parser.add_argument(
+        "--change-triggers", action="store_true",
+        help="Reinstall the result cache NOTIFY triggers (dropped with the old tables)",
+    )
+    args = parser.parse_args()
+
+    config = GeneratorConfig(
+        rows={
+            "products": args.products,
+            "suppliers": args.suppliers,
+            "purchases": args.purchases,
+            "sales": args.sales,
+        },
+        start_date=args.start_date,
+        end_date=args.end_date,
+        popularity_skew=args.skew,
+        seed=args.seed,
+        chunk_rows=args.chunk_rows,
+    )
+    timings = generate(config, workers=args.workers, partition_rows=args.partition_rows)
+    if args.change_triggers:
+        from change_notifications import install_change_triggers
+
+        install_change_triggers(create_engine(DATABASE_URL))
+    print(f"Synthetic data loaded: {config.rows}")
+    print(", ".join(f"{phase} {seconds:.1f}s" for phase, seconds in timings.items()))
@@ -2,55 +2,265 @@
 LangGraph workflow that orchestrates the database agent pipeline.
 
 The workflow has four nodes:
-1. Retrieve table context
+1. Retrieve table context (top-k relevant tables plus FK neighbours)
 2. Generate SQL query
-3. Execute SQL query
+3. Execute SQL query (behind the EXPLAIN cost guard)
 4. Generate final response
+
+Generation is routed per question class: a small fast model is tried first
+and its SQL is validated (parse + EXPLAIN); the large model is used when the
+validation or the execution of that SQL fails. When the cost guard rejects a
+plan, execution loops back to generation with the rejection reason, up to
+QUERY_MAX_REGENERATIONS times; when a query fails validation or execution
+(unknown column, syntax error, ...), the Postgres error is fed back for up to
+QUERY_MAX_REPAIRS repair attempts.
+
+The LLM and database nodes have both sync and async implementations, so the
+compiled workflow supports ``invoke`` as well as ``ainvoke``. The async path
+admits work through the shared scheduler, which caps concurrent LLM calls and
+DB queries separately. Each node's wall time is recorded in the
+db_agent_node_seconds histogram and on the request trace, and added to the
+step it logs.
+
+LangGraph is imported and the graphs are compiled on first use
+(``get_workflow``), normally during application startup, so importing this
+module stays cheap.
 """
 
 from __future__ import annotations
 
-import json
-from typing import Any, Dict, List, Optional, TypedDict
+import asyncio
+import operator
+import threading
+import time
+from typing import TYPE_CHECKING, Annotated, Any, Dict, List, Optional, Tuple, TypedDict
 
-from langgraph.graph import END, StateGraph
+from agent.cost_guard import QUERY_MAX_REGENERATIONS
+from agent.generate_sql_query import agenerate_sql_query, generate_sql_query
+from agent.micro_batcher import generation_key, get_generation_single_flight
+from agent.model_router import classify_question, get_model_router
+from agent.query_repair import QUERY_MAX_REPAIRS, classify_error, repair_feedback
+from agent.run_sql_query import (
+    QueryError,
+    check_readonly_query,
+    check_readonly_query_async,
+    run_readonly_query_columnar,
+    run_readonly_query_columnar_async,
+)
+from agent.result_format import ColumnarResult
+from agent.scheduler import get_scheduler
+from agent.schema_registry import get_schema_registry
+from agent.table_retriever import TABLE_RETRIEVAL_FULL_SCHEMA_CHARS, get_table_retriever
+from agent.telemetry import instrument_node, record_cache
+from agent.sql_cache import get_sql_cache, normalize_question
 
-from agent.generate_sql_query import generate_sql_query, load_schema
-from agent.run_sql_query import execute_readonly_query
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
 
 
 class SQLAgentState(TypedDict, total=False):
     """
     State container passed between LangGraph nodes.
 
-    The history field stores past reasoning steps so the agent can answer
-    multi-step client questions.
+    ``history`` holds this turn's structured step log only; nodes return
+    their new step and the reducer concatenates it. ``routing`` likewise
+    collects every generation attempt (question class, model, generation and
+    validation latency, outcome) and ``attempts`` every execution (SQL, model,
+    generation and execution seconds, error class). Earlier turns reach the
+    graph solely as ``conversation_context``, the rendered part of the
+    session history that a follow-up question refers to. ``query_result``
+    is kept column by column; callers render it as rows or columns.
+    ``max_staleness`` is the replication lag in seconds the caller accepts
+    when the query runs on a read replica (None for the configured default).
+    ``table_hint`` names the retrieved tables when ``table_context`` is
+    nevertheless the whole schema (see TABLE_RETRIEVAL_FULL_SCHEMA_CHARS).
     """
 
     user_input: str
+    max_staleness: Optional[float]
+    conversation_context: str
     table_context: str
+    table_hint: Optional[List[str]]
+    relevant_tables: List[str]
+    schema_version: str
     sql_query: str
-    query_results: List[Dict[str, Any]]
+    sql_cache_hit: bool
+    query_error: Optional[str]
+    query_error_kind: Optional[str]
+    query_error_class: Optional[str]
+    regenerations: int
+    repairs: int
+    sql_model: Optional[str]
+    routing: Annotated[List[Dict[str, Any]], operator.add]
+    generation_seconds: float
+    attempts: Annotated[List[Dict[str, Any]], operator.add]
+    query_result: Optional[ColumnarResult]
     final_response: str
-    history: List[str]
+    history: Annotated[List[Dict[str, Any]], operator.add]
+
+
+# Failures the model can usually fix: the error is fed back to generation, and
+# SQL from a smaller model is regenerated by the large one
+_REPAIRABLE_KINDS = ("invalid", "database")
+
+# LangGraph aborts a run after 25 steps (its default recursion limit). A run
+# takes two steps besides the loop (retrieve, final response) and two per
+# execution (generate, execute), so repairs, regenerations and escalation
+# together stop after this many executions.
+_MAX_EXECUTIONS = (25 - 2) // 2
 
+_NO_SQL = "Failed to generate a SQL query."
 
-def _append_history(state: SQLAgentState, message: str) -> List[str]:
-    """Return an updated history list with the new message appended."""
-    history = list(state.get("history", []))
-    history.append(message)
-    return history
+
+def _step(node: str, message: str) -> List[Dict[str, Any]]:
+    """A single-entry step list for a node's ``history`` update."""
+    return [{"node": node, "message": message, "at": time.time()}]
 
 
 def retrieve_table_context(state: SQLAgentState) -> SQLAgentState:
-    """Load the schema and attach it to the state."""
-    schema_dict = load_schema()
-    table_context = json.dumps(schema_dict, indent=2)
-    history = _append_history(
-        state,
-        "Retrieved database schema context for downstream use.",
+    """Select the tables relevant to the question and render their schema context."""
+    snapshot = get_schema_registry().get()
+    question = state.get("user_input", "")
+    if state.get("conversation_context"):
+        # Follow-ups like "and last month?" name no tables; the earlier turn does
+        question = f"{state['conversation_context']}\n{question}"
+    tables = get_table_retriever().retrieve(snapshot, question)
+    table_hint = None
+    if len(tables) == len(snapshot.tables):
+        table_context = snapshot.prompt_context
+    elif len(snapshot.prompt_context) <= TABLE_RETRIEVAL_FULL_SCHEMA_CHARS:
+        # Keep the whole schema in the constant (warmed, reusable) prompt prefix
+        table_context = snapshot.prompt_context
+        table_hint = tables
+    else:
+        table_context = snapshot.render(tables)
+    return {
+        "table_context": table_context,
+        "table_hint": table_hint,
+        "relevant_tables": tables,
+        "schema_version": snapshot.version,
+        "history": _step(
+            "retrieve_table_context",
+            f"Retrieved schema context for tables: {', '.join(tables)}.",
+        ),
+    }
+
+
+def _sql_cache_for(state: SQLAgentState):
+    """
+    The SQL cache, unless the question is a follow-up.
+
+    A follow-up's SQL depends on the earlier turns, not only on its own
+    text, so it is neither served from nor stored in the shared cache.
+    """
+    if state.get("conversation_context"):
+        return None
+    return get_sql_cache()
+
+
+def _regeneration_feedback(state: SQLAgentState) -> Optional[str]:
+    """
+    Describe the failed query when execution looped back to generation:
+    the cost guard's reason for a rejected plan, or the error plus cached
+    repair instructions for a query that failed validation or execution.
+    """
+    kind = state.get("query_error_kind")
+    if kind == "rejected":
+        return f"Query: {state.get('sql_query', '')}\nReason: {state.get('query_error', '')}"
+    if kind in _REPAIRABLE_KINDS and state.get("repairs", 0) < QUERY_MAX_REPAIRS:
+        return repair_feedback(
+            state.get("sql_query") or "",
+            state.get("query_error") or "",
+            state.get("query_error_class") or kind,
+            state.get("relevant_tables", []),
+        )
+    return None
+
+
+def _escalating(state: SQLAgentState) -> bool:
+    """True when SQL from a smaller model passed validation but failed to execute."""
+    return state.get("query_error_kind") in _REPAIRABLE_KINDS and state.get("sql_model") not in (
+        None,
+        get_model_router().large_model,
+    )
+
+
+def _generation_update(
+    state: SQLAgentState,
+    sql_query: Optional[str],
+    cache_hit: bool,
+    feedback: Optional[str],
+    routing: Optional[List[Dict[str, Any]]] = None,
+) -> SQLAgentState:
+    model = routing[-1]["model"] if routing else None
+    regenerated = feedback is not None and state.get("query_error_kind") == "rejected"
+    repaired = feedback is not None and not regenerated
+    if regenerated:
+        message = "Regenerated a cheaper SQL query after the cost guard rejected the plan."
+    elif repaired:
+        message = (
+            f"Repaired the SQL query with {model} after it failed "
+            f"({state.get('query_error_class') or 'database'})."
+        )
+    elif cache_hit:
+        message = "Reused cached SQL query for the latest user request."
+    elif len(routing or []) > 1 or _escalating(state):
+        message = f"Generated SQL query with {model} after escalating from a smaller model."
+    else:
+        message = "Generated SQL query from the latest user request."
+    update: SQLAgentState = {
+        "sql_query": sql_query,
+        "sql_cache_hit": cache_hit,
+        "sql_model": model,
+        "routing": routing or [],
+        "generation_seconds": sum(
+            entry["generation_seconds"] + entry["validation_seconds"] for entry in routing or []
+        ),
+        "history": _step("generate_sql_query", message),
+    }
+    if regenerated:
+        update["regenerations"] = state.get("regenerations", 0) + 1
+    if repaired:
+        update["repairs"] = state.get("repairs", 0) + 1
+    return update
+
+
+def _routing_plan(state: SQLAgentState, feedback: Optional[str]):
+    """Return the question class and the models to try, in order."""
+    router = get_model_router()
+    question_class = classify_question(
+        state.get("user_input", ""),
+        state.get("relevant_tables", []),
+        state.get("conversation_context"),
+        feedback,
     )
-    return {"table_context": table_context, "history": history}
+    if _escalating(state):
+        router.record_execution_failure(state["sql_model"])
+        return question_class, [router.large_model]
+    return question_class, router.models_for(question_class)
+
+
+def _validation_failure(sql_query: Optional[str]) -> Optional[str]:
+    """Why SQL from a smaller model cannot be used (parse + EXPLAIN), or None."""
+    if not sql_query:
+        return "The model returned no SQL."
+    try:
+        check_readonly_query(sql_query)
+    except QueryError as e:
+        return str(e)
+    return None
+
+
+async def _avalidation_failure(sql_query: Optional[str]) -> Optional[str]:
+    """Async variant of _validation_failure, admitted through the DB lane."""
+    if not sql_query:
+        return "The model returned no SQL."
+    try:
+        async with get_scheduler().db.slot():
+            await check_readonly_query_async(sql_query)
+    except QueryError as e:
+        return str(e)
+    return None
 
 
 def generate_sql_query_node(state: SQLAgentState) -> SQLAgentState:
@@ -59,76 +269,336 @@ def generate_sql_query_node(state: SQLAgentState) -> SQLAgentState:
     if not user_query:
         raise ValueError("user_input must be provided before running the graph.")
 
-    sql_query = generate_sql_query(user_input=user_query)
-    history = _append_history(
-        state,
-        "Generated SQL query from the latest user request.",
-    )
-    return {"sql_query": sql_query, "history": history}
+    feedback = _regeneration_feedback(state)
+    cache = _sql_cache_for(state) if feedback is None and not _escalating(state) else None
+    sql_query = cache.lookup(user_query) if cache else None
+    cache_hit = sql_query is not None
+    if cache:
+        record_cache("sql", "hit" if cache_hit else "miss")
+    routing: List[Dict[str, Any]] = []
+    if not cache_hit:
+        question_class, models = _routing_plan(state, feedback)
+        for attempt, model in enumerate(models, 1):
+            started = time.perf_counter()
+            sql_query = generate_sql_query(
+                user_input=user_query,
+                schema_context=state.get("table_context"),
+                table_hint=state.get("table_hint"),
+                model=model,
+                feedback=feedback,
+                conversation_context=state.get("conversation_context"),
+            )
+            generated = time.perf_counter()
+            reason = _validation_failure(sql_query) if attempt < len(models) else None
+            routing.append(get_model_router().record(
+                question_class,
+                model,
+                generated - started,
+                time.perf_counter() - generated,
+                "escalated" if reason else "accepted",
+                reason,
+            ))
+            if reason is None:
+                break
+    return _generation_update(state, sql_query, cache_hit, feedback, routing)
+
+
+async def agenerate_sql_query_node(
+    state: SQLAgentState, config: RunnableConfig
+) -> SQLAgentState:
+    """
+    Async variant of generate_sql_query_node, admitted through the LLM lane.
+
+    Tokens stream through the node's config (visible via ``astream_events``).
+    Concurrent requests for the same question and context are coalesced into
+    one generation; only the first caller's config receives the tokens.
+    """
+    user_query = state.get("user_input", "")
+    if not user_query:
+        raise ValueError("user_input must be provided before running the graph.")
+
+    feedback = _regeneration_feedback(state)
+    cache = _sql_cache_for(state) if feedback is None and not _escalating(state) else None
+    sql_query = await asyncio.to_thread(cache.lookup, user_query) if cache else None
+    cache_hit = sql_query is not None
+    if cache:
+        record_cache("sql", "hit" if cache_hit else "miss")
+    routing: List[Dict[str, Any]] = []
+    if not cache_hit:
+        question_class, models = _routing_plan(state, feedback)
+
+        for attempt, model in enumerate(models, 1):
+
+            async def generate(model: str = model) -> str:
+                async with get_scheduler().llm.slot():
+                    return await agenerate_sql_query(
+                        user_input=user_query,
+                        schema_context=state.get("table_context"),
+                        table_hint=state.get("table_hint"),
+                        model=model,
+                        config=config,
+                        feedback=feedback,
+                        conversation_context=state.get("conversation_context"),
+                    )
+
+            # Identical questions already being generated share that generation
+            key = generation_key(
+                model,
+                normalize_question(user_query),
+                state.get("table_context"),
+                ",".join(state.get("table_hint") or ()),
+                state.get("conversation_context"),
+                feedback,
+            )
+            started = time.perf_counter()
+            sql_query = await get_generation_single_flight().run(key, generate)
+            generated = time.perf_counter()
+            reason = await _avalidation_failure(sql_query) if attempt < len(models) else None
+            routing.append(get_model_router().record(
+                question_class,
+                model,
+                generated - started,
+                time.perf_counter() - generated,
+                "escalated" if reason else "accepted",
+                reason,
+            ))
+            if reason is None:
+                break
+    return _generation_update(state, sql_query, cache_hit, feedback, routing)
+
+
+def _remember_sql(state: SQLAgentState, result: Optional[ColumnarResult]) -> bool:
+    """Return True when freshly generated SQL executed cleanly and should be cached."""
+    return result is not None and not state.get("sql_cache_hit", False)
+
+
+def _execution_update(
+    state: SQLAgentState,
+    result: Optional[ColumnarResult],
+    error: Optional[QueryError],
+    execution_seconds: float,
+) -> SQLAgentState:
+    error_class = classify_error(error.kind, error.code) if error is not None else None
+    if error is None:
+        message = "Executed SQL query and stored the raw results."
+    else:
+        message = f"SQL query failed ({error_class}): {error}"
+    attempt = {
+        "attempt": len(state.get("attempts", [])) + 1,
+        "sql_query": state.get("sql_query"),
+        "model": state.get("sql_model"),
+        "generation_seconds": round(state.get("generation_seconds", 0.0), 4),
+        "execution_seconds": round(execution_seconds, 4),
+        "error_class": error_class,
+    }
+    return {
+        "query_result": result,
+        "query_error": str(error) if error is not None else None,
+        "query_error_kind": error.kind if error is not None else None,
+        "query_error_class": error_class,
+        "attempts": [attempt],
+        "history": _step("execute_sql_query", message),
+    }
 
 
 def execute_sql_query_node(state: SQLAgentState) -> SQLAgentState:
     """Execute the generated SQL query against the warehouse."""
     sql_query = state.get("sql_query")
     if not sql_query:
-        raise ValueError("sql_query must be populated before executing it.")
+        # The model returned nothing usable; answer with the error instead of failing the run
+        return _execution_update(state, None, QueryError(_NO_SQL, kind="generation"), 0.0)
+
+    result: Optional[ColumnarResult] = None
+    error: Optional[QueryError] = None
+    started = time.perf_counter()
+    try:
+        result = run_readonly_query_columnar(sql_query, max_staleness=state.get("max_staleness"))
+    except QueryError as e:
+        print(f"Error: {e}")
+        error = e
+    execution_seconds = time.perf_counter() - started
+    cache = _sql_cache_for(state)
+    if cache and _remember_sql(state, result):
+        cache.store(state.get("user_input", ""), sql_query)
+    return _execution_update(state, result, error, execution_seconds)
+
 
-    results: Optional[List[Dict[str, Any]]] = execute_readonly_query(sql_query)
-    history = _append_history(
-        state,
-        "Executed SQL query and stored the raw results.",
+async def aexecute_sql_query_node(state: SQLAgentState) -> SQLAgentState:
+    """Async variant of execute_sql_query_node, admitted through the DB lane."""
+    sql_query = state.get("sql_query")
+    if not sql_query:
+        return _execution_update(state, None, QueryError(_NO_SQL, kind="generation"), 0.0)
+
+    result: Optional[ColumnarResult] = None
+    error: Optional[QueryError] = None
+    async with get_scheduler().db.slot():
+        started = time.perf_counter()
+        try:
+            result = await run_readonly_query_columnar_async(
+                sql_query, max_staleness=state.get("max_staleness")
+            )
+        except QueryError as e:
+            print(f"Error: {e}")
+            error = e
+        execution_seconds = time.perf_counter() - started
+    cache = _sql_cache_for(state)
+    if cache and _remember_sql(state, result):
+        await asyncio.to_thread(cache.store, state.get("user_input", ""), sql_query)
+    return _execution_update(state, result, error, execution_seconds)
+
+
+def route_after_execution(state: SQLAgentState) -> str:
+    """
+    Loop back to generation when the cost guard rejected the plan, when the
+    query failed with an error the model can repair (QUERY_MAX_REPAIRS times),
+    or when SQL from a smaller model failed and the large model has not been tried.
+    A turn whose model returned no SQL, or that used up _MAX_EXECUTIONS, ends
+    with the error.
+    """
+    kind = state.get("query_error_kind")
+    if kind == "generation" or len(state.get("attempts", [])) >= _MAX_EXECUTIONS:
+        return "generate_final_response"
+    if kind == "rejected" and state.get("regenerations", 0) < QUERY_MAX_REGENERATIONS:
+        return "generate_sql_query"
+    if kind in _REPAIRABLE_KINDS and state.get("repairs", 0) < QUERY_MAX_REPAIRS:
+        return "generate_sql_query"
+    if _escalating(state):
+        return "generate_sql_query"
+    return "generate_final_response"
+
+
+def summarize_results(
+    user_query: str,
+    row_count: int,
+    preview: List[Dict[str, Any]],
+    truncated: bool = False,
+) -> str:
+    """Build the end-user summary from a row count and a few sample rows."""
+    if not row_count:
+        return (
+            f"I ran the requested analysis: '{user_query}'. "
+            "No rows were returned for the given filters."
+        )
+    limit_note = " (truncated at the row limit)" if truncated else ""
+    return (
+        f"Answer to '{user_query}':\n"
+        f"- Returned {row_count} rows{limit_note}.\n"
+        f"- Sample rows: {preview}"
     )
-    return {"query_results": results or [], "history": history}
 
 
 def generate_final_response_node(state: SQLAgentState) -> SQLAgentState:
     """Summarize the execution results for the end user."""
     user_query = state.get("user_input", "")
-    query_results = state.get("query_results", [])
-
-    if not query_results:
+    result = state.get("query_result")
+    if state.get("query_error"):
         final_response = (
-            f"I ran the requested analysis: '{user_query}'. "
-            "No rows were returned for the given filters."
+            f"I could not run the query for '{user_query}': {state['query_error']}"
         )
     else:
-        preview = query_results[:3]
-        final_response = (
-            f"Answer to '{user_query}':\n"
-            f"- Returned {len(query_results)} rows.\n"
-            f"- Sample rows: {preview}"
+        final_response = summarize_results(
+            user_query, result.row_count, result.to_rows(3), truncated=result.truncated
         )
 
-    history = _append_history(
-        state,
-        "Summarized SQL results and produced the final response.",
+    return {
+        "final_response": final_response,
+        "history": _step(
+            "generate_final_response",
+            "Summarized SQL results and produced the final response.",
+        ),
+    }
+
+
+def _build_workflows() -> Tuple[Any, Any]:
+    """Compile the full workflow and the generation-only one."""
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.graph import END, StateGraph
+
+    # Every node records its wall time (db_agent_node_seconds and the request trace)
+    retrieve_node = instrument_node("retrieve_table_context", retrieve_table_context)
+    generate_node = RunnableLambda(
+        instrument_node("generate_sql_query", generate_sql_query_node),
+        afunc=instrument_node("generate_sql_query", agenerate_sql_query_node),
     )
-    return {"final_response": final_response, "history": history}
+    execute_node = RunnableLambda(
+        instrument_node("execute_sql_query", execute_sql_query_node),
+        afunc=instrument_node("execute_sql_query", aexecute_sql_query_node),
+    )
+    final_node = instrument_node("generate_final_response", generate_final_response_node)
+
+    builder = StateGraph(SQLAgentState)
+    builder.add_node("retrieve_table_context", retrieve_node)
+    builder.add_node("generate_sql_query", generate_node)
+    builder.add_node("execute_sql_query", execute_node)
+    builder.add_node("generate_final_response", final_node)
+
+    # Entry point: user query feeds directly into the context retrieval node.
+    builder.set_entry_point("retrieve_table_context")
+    builder.add_edge("retrieve_table_context", "generate_sql_query")
+    builder.add_edge("generate_sql_query", "execute_sql_query")
+    builder.add_conditional_edges(
+        "execute_sql_query",
+        route_after_execution,
+        ["generate_sql_query", "generate_final_response"],
+    )
+    builder.add_edge("generate_final_response", END)
+
+    # Context + generation only; used when the caller streams execution itself.
+    generation_builder = StateGraph(SQLAgentState)
+    generation_builder.add_node("retrieve_table_context", retrieve_node)
+    generation_builder.add_node("generate_sql_query", generate_node)
+    generation_builder.set_entry_point("retrieve_table_context")
+    generation_builder.add_edge("retrieve_table_context", "generate_sql_query")
+    generation_builder.add_edge("generate_sql_query", END)
+
+    return builder.compile(), generation_builder.compile()
+
+
+_compiled: Optional[Tuple[Any, Any]] = None
+_compile_lock = threading.Lock()
+
+
+def _workflows() -> Tuple[Any, Any]:
+    global _compiled
+    if _compiled is None:
+        with _compile_lock:
+            if _compiled is None:
+                _compiled = _build_workflows()
+    return _compiled
+
+
+def get_workflow():
+    """Return the compiled workflow, compiling it (and importing LangGraph) on first use."""
+    return _workflows()[0]
 
 
-builder = StateGraph(SQLAgentState)
-builder.add_node("retrieve_table_context", retrieve_table_context)
-builder.add_node("generate_sql_query", generate_sql_query_node)
-builder.add_node("execute_sql_query", execute_sql_query_node)
-builder.add_node("generate_final_response", generate_final_response_node)
+def get_generation_workflow():
+    """Return the compiled context + generation workflow, compiling it on first use."""
+    return _workflows()[1]
 
-# Entry point: user query feeds directly into the context retrieval node.
-builder.set_entry_point("retrieve_table_context")
-builder.add_edge("retrieve_table_context", "generate_sql_query")
-builder.add_edge("generate_sql_query", "execute_sql_query")
-builder.add_edge("execute_sql_query", "generate_final_response")
-builder.add_edge("generate_final_response", END)
 
-# Compiled workflow that can be imported elsewhere.
-workflow = builder.compile()
+def __getattr__(name: str) -> Any:
+    # ``from graph.workflow import workflow`` keeps working, compiled on first access
+    if name == "workflow":
+        return get_workflow()
+    if name == "generation_workflow":
+        return get_generation_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 __all__ = [
     "SQLAgentState",
     "workflow",
+    "generation_workflow",
+    "get_workflow",
+    "get_generation_workflow",
+    "summarize_results",
     "retrieve_table_context",
     "generate_sql_query_node",
+    "agenerate_sql_query_node",
     "execute_sql_query_node",
+    "aexecute_sql_query_node",
+    "route_after_execution",
     "generate_final_response_node",
 ]
 
@@ -1,46 +1,634 @@
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator, Optional, Tuple
+
+from agent.connection_pool import close_all_pools
+from agent.replica_router import close_replica_router
+from agent.cost_guard import get_cost_guard
+from agent.generate_sql_query import build_prompt_prefix
+from agent.history import ConversationHistory, Turn
+from agent.index_advisor import INDEX_ADVISOR_ALLOW_CREATE, get_index_advisor
+from agent.llm_clients import OLLAMA_WARMUP, get_llm_registry
+from agent.model_router import get_model_router
+from agent.query_repair import repair_cache_stats
+from agent.micro_batcher import (
+    BATCH_MAX_ITEMS,
+    gather_bounded,
+    get_generation_single_flight,
+)
+from agent.result_cache import get_result_cache
+from agent.result_format import (
+    ARROW_MEDIA_TYPE,
+    JSON_MEDIA_TYPE,
+    RESULT_FORMAT,
+    RESULT_FORMATS,
+    ColumnarResult,
+    arrow_available,
+    compress,
+    dumps,
+    format_results,
+)
+from agent.result_store import (
+    RESULT_PAGE_SIZE,
+    RESULT_PREVIEW_ROWS,
+    PageError,
+    get_result_store,
+)
+from agent.run_sql_query import (
+    get_connection_pool,
+    get_query_router,
+    prepare_database,
+    start_table_change_listener,
+    stream_readonly_query,
+)
+from agent.scheduler import SchedulerOverloaded, get_scheduler
+from agent.startup import Startup, get_startup, reset_startup
+from agent.schema_registry import get_schema_registry
+from agent.session_store import close_session_store, get_session_store
+from agent.sql_cache import get_sql_cache, normalize_question
+from agent.sql_validator import get_sql_validator
+from agent.telemetry import CONTENT_TYPE, TraceMiddleware, get_profiler, render_metrics
+from graph.workflow import (
+    SQLAgentState,
+    get_generation_workflow,
+    get_workflow,
+    summarize_results,
+)
+
+
+async def _warm_up(startup: Startup) -> None:
+    """
+    Compile the graphs, warm the connection pool and warm the models.
+
+    The three run concurrently; the model warmup waits for the schema,
+    whose rendered prompt prefix it sends.
+    """
+
+    async def schema() -> str:
+        snapshot = await asyncio.to_thread(get_schema_registry().get)
+        return build_prompt_prefix(snapshot.prompt_context)
+
+    async def models() -> None:
+        prompt_prefix = await startup.step("schema", schema, required=False) or ""
+        if not OLLAMA_WARMUP:
+            startup.skip("llm", "OLLAMA_WARMUP is off")
+            return
+
+        async def warm() -> None:
+            registry = get_llm_registry()
+            # Creating the first client imports the Ollama libraries; keep that off the loop
+            await asyncio.to_thread(registry.get)
+            if not await registry.start(prompt_prefix, tuple(get_model_router().models)):
+                raise RuntimeError("the model warmup did not succeed")
+
+        await startup.step("llm", warm, required=False)
+
+    await asyncio.gather(
+        startup.step("workflow", lambda: asyncio.to_thread(get_workflow)),
+        startup.step(
+            "database", lambda: asyncio.to_thread(prepare_database), required=False
+        ),
+        models(),
+        return_exceptions=True,
+    )
 
-from graph.workflow import SQLAgentState, workflow
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    listener = start_table_change_listener()
+    llm_registry = get_llm_registry()
+    startup = reset_startup()
+    startup.start(_warm_up)
+    yield
+    await startup.stop()
+    await llm_registry.aclose()
+    if listener is not None:
+        listener.stop()
+    close_session_store()
+    close_replica_router()
+    close_all_pools()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+# Give every request an id (X-Request-ID) that its spans carry, and time it to its last byte
+app.add_middleware(TraceMiddleware)
+
+
+# Rows of the latest result kept in a stored session; the full result is only
+# returned in the response of the turn that produced it.
+SESSION_PREVIEW_ROWS = 3
+
+
+class BatchRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
 
 
 class AgentState(BaseModel):
-    chat_history: List[str] = Field(default_factory=list)
-    workflow_history: List[str] = Field(default_factory=list)
+    # Bounded turn history (ConversationHistory.to_dict()) and the latest turn's steps
+    conversation: Dict[str, Any] = Field(default_factory=dict)
+    workflow_history: List[Dict[str, Any]] = Field(default_factory=list)
     user_query: str = ""
     sql_query: str = ""
     final_response: str = ""
     query_results: List[Dict[str, Any]] = Field(default_factory=list)
+    row_count: int = 0
+    # Id of the latest result in the result store, for GET /results/{result_id}
+    result_id: Optional[str] = None
 
 
-user_states: Dict[str, AgentState] = {}
+async def _load_session(session_id: str) -> AgentState:
+    store = get_session_store()
+    if store.blocking:
+        data = await asyncio.to_thread(store.get, session_id)
+    else:
+        data = store.get(session_id)
+    return AgentState(**data) if data else AgentState()
 
 
-@app.post("/chat/{session_id}")
-async def chat(session_id: str, message: str):
-    if session_id not in user_states:
-        user_states[session_id] = AgentState()
+async def _save_turn(
+    session_id: str,
+    state: AgentState,
+    tables: Optional[List[str]] = None,
+    error: Optional[str] = None,
+) -> ConversationHistory:
+    """
+    Append the finished turn to the stored session and persist the latest result preview.
 
-    state = user_states[session_id]
+    The conversation is re-read inside the store's atomic update rather than
+    taken from the session loaded when the turn started, so concurrent turns
+    of one session are all kept.
+    """
+    turn = Turn(state.user_query, state.sql_query, tables, state.row_count, error)
+
+    def change(stored: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        conversation = ConversationHistory.from_dict((stored or {}).get("conversation") or {})
+        conversation.add(turn)
+        state.conversation = conversation.to_dict()
+        data = state.dict()
+        data["query_results"] = data["query_results"][:SESSION_PREVIEW_ROWS]
+        return data
+
+    store = get_session_store()
+    if store.blocking:
+        await asyncio.to_thread(store.update, session_id, change)
+    else:
+        store.update(session_id, change)
+    return ConversationHistory.from_dict(state.conversation)
+
+
+async def _start_turn(
+    session_id: str, message: str, max_staleness: Optional[float] = None
+) -> Tuple[AgentState, SQLAgentState]:
+    """Record the user's message on the session and build the graph input."""
+    state = await _load_session(session_id)
 
-    state.chat_history.append(message)
     state.user_query = message
+    state.sql_query = ""
+    state.final_response = ""
+    state.query_results = []
+    state.row_count = 0
+    state.result_id = None
+    state.workflow_history = []
 
-    workflow_history = list(state.workflow_history)
-    workflow_history.append(message)
+    conversation = ConversationHistory.from_dict(state.conversation)
     graph_input: SQLAgentState = {
         "user_input": message,
-        "history": workflow_history,
+        "conversation_context": conversation.context_for(message),
+        "max_staleness": max_staleness,
     }
-    graph_result = workflow.invoke(graph_input)
+    return state, graph_input
+
+
+def _response_content(state: AgentState, conversation: ConversationHistory) -> Dict[str, Any]:
+    content = state.dict(exclude={"conversation"})
+    content["chat_history"] = conversation.questions()
+    return content
+
+
+def _encoded_response(request: Request, body: bytes, media_type: str = JSON_MEDIA_TYPE) -> Response:
+    """Send an encoded body, compressed with the best coding the client accepts."""
+    body, encoding = compress(body, request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+def _format_error(result_format: str, allowed: Tuple[str, ...]) -> Optional[JSONResponse]:
+    """A 400/406 response when a requested result format cannot be served."""
+    if result_format not in allowed:
+        return JSONResponse(
+            status_code=400,
+            content={"detail": f"Unknown result format {result_format!r}; use one of {', '.join(allowed)}."},
+        )
+    if result_format == "arrow" and not arrow_available():
+        return JSONResponse(
+            status_code=406,
+            content={"detail": "Arrow output requires the pyarrow package."},
+        )
+    return None
+
+
+def _overloaded_response(e: SchedulerOverloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(e), "lane": e.lane},
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+def _batch_item(
+    question: str,
+    graph_result: Optional[Dict[str, Any]],
+    error: Optional[Exception],
+    result_format: str = "rows",
+) -> Dict[str, Any]:
+    if error is not None:
+        item_error: Dict[str, Any] = {"detail": str(error)}
+        if isinstance(error, SchedulerOverloaded):
+            item_error["lane"] = error.lane
+        return {"question": question, "error": item_error}
+
+    result = graph_result.get("query_result")
+    item: Dict[str, Any] = {
+        "question": question,
+        "sql_query": graph_result.get("sql_query") or "",
+        "query_results": format_results(result, result_format),
+        "row_count": result.row_count if result is not None else 0,
+        "truncated": result.truncated if result is not None else False,
+        "final_response": graph_result.get("final_response", ""),
+        "error": None,
+    }
+    if graph_result.get("query_error"):
+        item["error"] = {
+            "detail": graph_result["query_error"],
+            "kind": graph_result.get("query_error_kind"),
+        }
+    return item
+
+
+@app.post("/chat/batch")
+async def chat_batch(
+    request: BatchRequest,
+    http_request: Request,
+    format: str = "rows",
+    max_staleness: Optional[float] = None,
+):
+    """
+    Answer several independent questions in one request (e.g. a dashboard).
+
+    Questions carry no session or conversation context. Repeated questions
+    are answered once; distinct ones run concurrently up to
+    ``BATCH_MAX_CONCURRENCY``. Every item gets its own result or error, so
+    one failing question does not fail the batch. ``format=columnar``
+    returns each item's results as column arrays. ``max_staleness`` applies
+    to every question (see ``/chat/{session_id}``).
+    """
+    invalid = _format_error(format, ("rows", "columnar"))
+    if invalid is not None:
+        return invalid
+    await get_startup().wait()
 
-    state.workflow_history = graph_result.get("history", workflow_history)
-    state.sql_query = graph_result.get("sql_query", "")
-    state.query_results = graph_result.get("query_results", [])
+    distinct: Dict[str, str] = {}
+    for question in request.questions:
+        distinct.setdefault(normalize_question(question), question)
+
+    outcomes = await gather_bounded(
+        {
+            key: (
+                lambda question=question: get_workflow().ainvoke(
+                    {"user_input": question, "max_staleness": max_staleness}
+                )
+            )
+            for key, question in distinct.items()
+        }
+    )
+    results = [
+        _batch_item(question, *outcomes[normalize_question(question)], format)
+        for question in request.questions
+    ]
+    return _encoded_response(http_request, dumps({"results": results}))
+
+
+@app.post("/chat/{session_id}")
+async def chat(
+    session_id: str,
+    message: str,
+    request: Request,
+    format: str = RESULT_FORMAT,
+    max_staleness: Optional[float] = None,
+):
+    """
+    Answer one question of a session.
+
+    The result is kept in the result store: the response carries its
+    ``result_id``, ``row_count``, ``columns`` and the first
+    ``RESULT_PREVIEW_ROWS`` rows, and ``GET /results/{result_id}`` pages
+    through the rest. ``format`` selects how ``query_results`` is returned:
+    ``rows`` (a list of row objects), ``columnar`` (column names once plus
+    one array per column) or ``arrow`` (an Arrow IPC stream of the whole
+    result whose schema metadata carries the rest of the response as JSON).
+    Bodies are compressed with zstd or gzip when the client accepts it.
+    ``max_staleness`` is the replication lag in seconds the question
+    accepts when it runs on a read replica (default
+    ``REPLICA_MAX_STALENESS``; ``0`` reads from the primary).
+    """
+    invalid = _format_error(format, RESULT_FORMATS)
+    if invalid is not None:
+        return invalid
+
+    await get_startup().wait()
+    state, graph_input = await _start_turn(session_id, message, max_staleness)
+    try:
+        graph_result = await get_workflow().ainvoke(graph_input)
+    except SchedulerOverloaded as e:
+        return _overloaded_response(e)
+
+    state.workflow_history = graph_result.get("history", [])
+    state.sql_query = graph_result.get("sql_query") or ""
+    result = graph_result.get("query_result") or ColumnarResult([], [], 0)
+    store = get_result_store()
+    if store is not None and graph_result.get("query_result") is not None:
+        state.result_id = await asyncio.to_thread(store.put, result)
+    # The session only keeps a short preview of the result
+    state.query_results = result.to_rows(SESSION_PREVIEW_ROWS)
+    state.row_count = result.row_count
     state.final_response = graph_result.get("final_response", "")
+    conversation = await _save_turn(
+        session_id, state, graph_result.get("relevant_tables"), graph_result.get("query_error")
+    )
+
+    content = _response_content(state, conversation)
+    content["columns"] = result.describe()
+    content["truncated"] = result.truncated
+    content["row_limit"] = result.limit
+    if format == "arrow":
+        del content["query_results"]
+        body = await asyncio.to_thread(result.to_arrow_ipc, content)
+        return _encoded_response(request, body, ARROW_MEDIA_TYPE)
+    if state.result_id is not None:
+        # The rest of the result is served by GET /results/{result_id}
+        result = result.take(range(min(RESULT_PREVIEW_ROWS, result.row_count)))
+    content["query_results"] = format_results(result, format)
+    return _encoded_response(request, dumps(content))
+
+
+def _encode_event(event: str, payload: Dict[str, Any], sse: bool) -> str:
+    data = dumps({"type": event, **payload}).decode()
+    if sse:
+        return f"event: {event}\ndata: {data}\n\n"
+    return data + "\n"
+
+
+async def _generation_events(
+    graph_input: SQLAgentState, result: Dict[str, Any]
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Run the generation workflow, yielding token and node progress events."""
+    async for event in get_generation_workflow().astream_events(graph_input, version="v2"):
+        kind = event["event"]
+        if kind == "on_llm_stream":
+            yield "token", {"text": event["data"]["chunk"].text}
+        elif kind == "on_chain_end":
+            if not event.get("parent_ids"):
+                result.update(event["data"].get("output") or {})
+            elif event["name"] == event.get("metadata", {}).get("langgraph_node"):
+                yield "node", {"node": event["name"]}
+
+
+@app.post("/chat/{session_id}/stream")
+async def chat_stream(
+    session_id: str,
+    message: str,
+    format: str = "ndjson",
+    max_staleness: Optional[float] = None,
+):
+    """
+    Run the agent and stream progress and result rows as they become available.
+
+    Emits ``token`` events while the model writes the SQL, ``node`` events as
+    workflow steps finish, one ``sql`` event, one ``rows`` event per fetched
+    batch and a final ``end`` event (or ``error``), as NDJSON lines or, with
+    ``format=sse``, as Server-Sent Events. ``max_staleness`` as for
+    ``/chat/{session_id}``.
+    """
+    invalid = _format_error(format, ("ndjson", "sse"))
+    if invalid is not None:
+        return invalid
+    sse = format == "sse"
+    await get_startup().wait()
+    state, graph_input = await _start_turn(session_id, message, max_staleness)
+    graph_result: Dict[str, Any] = {}
+    errors: List[str] = []
+
+    async def body() -> AsyncIterator[str]:
+        try:
+            async for line in turn():
+                yield line
+        finally:
+            await _save_turn(
+                session_id, state, graph_result.get("relevant_tables"), errors[-1] if errors else None
+            )
+
+    async def turn() -> AsyncIterator[str]:
+        try:
+            async for event, payload in _generation_events(graph_input, graph_result):
+                yield _encode_event(event, payload, sse)
+        except SchedulerOverloaded as e:
+            errors.append(str(e))
+            yield _encode_event("error", {"detail": str(e), "lane": e.lane}, sse)
+            return
+
+        sql_query = graph_result.get("sql_query") or ""
+        state.workflow_history = graph_result.get("history", [])
+        state.sql_query = sql_query
+
+        yield _encode_event("sql", {"sql_query": sql_query}, sse)
+        if not sql_query:
+            errors.append("Failed to generate a SQL query.")
+            yield _encode_event("error", {"detail": errors[-1]}, sse)
+            return
+
+        stream = stream_readonly_query(sql_query, max_staleness=max_staleness)
+        batches = iter(stream)
+        pool = get_connection_pool()
+        preview: List[Dict[str, Any]] = []
+        try:
+            async with get_scheduler().db.slot():
+                while True:
+                    batch = await pool.run(next, batches, None)
+                    if batch is None:
+                        break
+                    if len(preview) < 3:
+                        preview.extend(batch[: 3 - len(preview)])
+                    yield _encode_event("rows", {"rows": batch}, sse)
+        except SchedulerOverloaded as e:
+            errors.append(str(e))
+            yield _encode_event("error", {"detail": str(e), "lane": e.lane}, sse)
+            return
+        finally:
+            # Closing releases the server-side cursor and the connection; keep it off the loop
+            await pool.run(batches.close)
+
+        if stream.error is not None:
+            errors.append(stream.error)
+            yield _encode_event(
+                "error", {"detail": stream.error, "kind": stream.error_kind}, sse
+            )
+            return
+
+        # Follow-ups depend on earlier turns, so their SQL is not cached by question
+        sql_cache = get_sql_cache()
+        if (
+            sql_cache is not None
+            and not graph_result.get("sql_cache_hit", False)
+            and not graph_input.get("conversation_context")
+        ):
+            await asyncio.to_thread(sql_cache.store, message, sql_query)
+
+        state.query_results = preview
+        state.row_count = stream.row_count
+        state.final_response = summarize_results(
+            message, stream.row_count, preview, truncated=stream.truncated
+        )
+        state.workflow_history.append(
+            {"node": "stream", "message": "Streamed SQL results to the client.", "at": time.time()}
+        )
+        yield _encode_event(
+            "end",
+            {
+                "row_count": stream.row_count,
+                "truncated": stream.truncated,
+                "final_response": state.final_response,
+            },
+            sse,
+        )
+
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type)
+
+
+@app.get("/results/{result_id}")
+async def result_page(
+    result_id: str,
+    request: Request,
+    limit: int = RESULT_PAGE_SIZE,
+    after: Optional[str] = None,
+    columns: Optional[str] = None,
+    sort: Optional[str] = None,
+    format: str = "rows",
+):
+    """
+    Page through a stored result without running its query again.
+
+    ``columns`` (comma-separated) projects, ``sort`` (comma-separated, ``-``
+    for descending) orders the rows, and ``after`` takes the ``next_cursor``
+    of the previous page; it is null on the last page. ``format`` is
+    ``rows``, ``columnar`` or ``arrow`` as for ``/chat``.
+    """
+    invalid = _format_error(format, RESULT_FORMATS)
+    if invalid is not None:
+        return invalid
+    store = get_result_store()
+    if store is None:
+        return JSONResponse(status_code=404, content={"detail": "The result store is disabled."})
+    try:
+        page = await asyncio.to_thread(store.page, result_id, limit, after, columns, sort)
+    except PageError as e:
+        return JSONResponse(status_code=400, content={"detail": str(e)})
+    if page is None:
+        if store.held_elsewhere(result_id):
+            return JSONResponse(
+                status_code=409,
+                content={
+                    "detail": "The result is held by another worker process. Results are kept "
+                    "in the memory of the worker that ran the query; run a single worker or "
+                    "route each client to the same worker.",
+                },
+            )
+        return JSONResponse(status_code=404, content={"detail": "Unknown or expired result id."})
+
+    result = page.pop("result")
+    content = {"result_id": result_id, **page, "columns": result.describe()}
+    if format == "arrow":
+        body = await asyncio.to_thread(result.to_arrow_ipc, content)
+        return _encoded_response(request, body, ARROW_MEDIA_TYPE)
+    content["query_results"] = format_results(result, format)
+    return _encoded_response(request, dumps(content))
+
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 200 once the startup warmup finished, 503 before.
+
+    The body lists every warmup step (workflow compilation, schema, model
+    and connection pool warmup) with its status and duration. Requests that
+    arrive before readiness wait for the warmup instead of failing.
+    """
+    snapshot = get_startup().snapshot()
+    return JSONResponse(status_code=200 if snapshot["ready"] else 503, content=snapshot)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus histograms of request, node, LLM and database latency, plus cache outcomes."""
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+
+@app.get("/index-advisor")
+async def index_advisor():
+    """Indexes that would support the most expensive statements the agent executed."""
+    advisor = get_index_advisor()
+    if advisor is None:
+        return JSONResponse(status_code=404, content={"detail": "The index advisor is disabled."})
+    recommendations = await asyncio.to_thread(advisor.recommend)
+    return JSONResponse(content={"recommendations": recommendations})
+
+
+@app.post("/index-advisor/apply")
+async def apply_index_advice():
+    """Create the recommended indexes (requires INDEX_ADVISOR_ALLOW_CREATE=true)."""
+    advisor = get_index_advisor()
+    if advisor is None or not INDEX_ADVISOR_ALLOW_CREATE:
+        return JSONResponse(
+            status_code=403,
+            content={"detail": "Index creation is disabled (INDEX_ADVISOR_ALLOW_CREATE)."},
+        )
+    recommendations = await asyncio.to_thread(advisor.recommend)
+    created = await asyncio.to_thread(advisor.apply, recommendations)
+    return JSONResponse(content={"created": created})
+
 
-    return JSONResponse(content=state.dict())
+@app.get("/stats")
+async def stats():
+    sql_cache = get_sql_cache()
+    result_cache = get_result_cache()
+    result_store = get_result_store()
+    advisor = get_index_advisor()
+    profiler = get_profiler()
+    router = get_query_router()
+    return JSONResponse(
+        content={
+            "scheduler": get_scheduler().snapshot(),
+            "sql_cache": sql_cache.stats() if sql_cache else None,
+            "result_cache": result_cache.stats() if result_cache else None,
+            "result_store": result_store.stats() if result_store else None,
+            "cost_guard": get_cost_guard().stats(),
+            "sql_validator": get_sql_validator().stats(),
+            "session_store": get_session_store().stats(),
+            "generation_single_flight": get_generation_single_flight().stats(),
+            "llm_clients": get_llm_registry().stats(),
+            "model_router": get_model_router().stats(),
+            "repair_prompts": repair_cache_stats(),
+            "index_advisor": advisor.stats() if advisor else None,
+            "replicas": router.stats() if router else None,
+            "profiler": {"profiles_written": profiler.profiles_written} if profiler else None,
+        }
+    )
@@ -0,0 +1,65 @@
+"""Cache keys must merge formatting variants and never merge different queries."""
+
+import pytest
+
+from agent.micro_batcher import generation_key
+from agent.result_cache import ResultCache, canonicalize_sql
+from agent.result_format import ColumnarResult
+from agent.sql_cache import normalize_question
+from agent.sql_validator import fingerprint_tokens, tokenize_sql
+
+
+@pytest.mark.parametrize(
+    "left, right",
+    [
+        ("SELECT * FROM customers", "select *\n  from   customers;"),
+        ("SELECT 1", "SELECT 1 ;;"),
+        ("SELECT a FROM t", "SELECT a /* note */ FROM t -- trailing"),
+    ],
+)
+def test_result_keys_merge_formatting(left, right):
+    assert canonicalize_sql(left) == canonicalize_sql(right)
+
+
+@pytest.mark.parametrize(
+    "left, right",
+    [
+        ("SELECT * FROM products WHERE name = 'Product  A'", "SELECT * FROM products WHERE name = 'Product A'"),
+        ("SELECT * FROM products WHERE name = 'a'", "SELECT * FROM products WHERE name = 'A'"),
+        ("SELECT 'a'", 'SELECT "a"'),
+        ("SELECT 1", "SELECT '1'"),
+        ('SELECT "Name" FROM t', "SELECT name FROM t"),
+        ("SELECT ab FROM t", "SELECT a b FROM t"),
+        ("SELECT 'a;b'", "SELECT 'a'"),
+        ("SELECT 1 -- x\n+ 1", "SELECT 1"),
+    ],
+)
+def test_result_keys_keep_queries_apart(left, right):
+    assert canonicalize_sql(left) != canonicalize_sql(right)
+
+
+def test_result_cache_does_not_serve_a_different_literal():
+    cache = ResultCache(max_bytes=1 << 20, ttl=60)
+    result = ColumnarResult(["n"], [[1]], 1)
+    cache.put("SELECT count(*) AS n FROM products WHERE name = 'Product  A'", result)
+    assert cache.get("select count(*) as n from products where name = 'Product  A';") is result
+    assert cache.get("SELECT count(*) AS n FROM products WHERE name = 'Product A'") is None
+
+
+def test_fingerprints_mask_only_literals():
+    def fingerprint(sql):
+        return fingerprint_tokens(tokenize_sql(sql))
+
+    assert fingerprint("SELECT * FROM t WHERE id = 1") == fingerprint("SELECT * FROM t WHERE id = 'x'")
+    assert fingerprint("SELECT a FROM t") != fingerprint("SELECT b FROM t")
+    assert fingerprint('SELECT "a" FROM t') != fingerprint("SELECT 'a' FROM t")
+
+
+def test_question_keys():
+    assert normalize_question("How many  Customers?") == normalize_question("how many customers")
+    assert normalize_question("Sales in 2023") != normalize_question("Sales in 2024")
+
+
+def test_generation_keys_separate_their_parts():
+    assert generation_key("ab", "c") != generation_key("a", "bc")
+    assert generation_key("model", "question", None) == generation_key("model", "question", "")
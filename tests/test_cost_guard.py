@@ -0,0 +1,48 @@
+"""LIMIT rewrites: nested statements stay valid and only real cuts count as truncated."""
+
+from agent.cost_guard import QueryCostGuard, limit_query
+from agent.result_format import ColumnarResult
+
+
+class _ExplainCursor:
+    """Answers EXPLAIN with a large row estimate, and a cheap plan once limited."""
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, sql):
+        self.statements.append(sql)
+
+    def fetchone(self):
+        limited = "LIMIT" in self.statements[-1]
+        return ([{"Plan": {"Total Cost": 10.0 if limited else 1e9, "Plan Rows": 1000000}}],)
+
+
+def test_trailing_comment_after_terminator_is_not_nested():
+    assert limit_query("SELECT 1; -- done", 10) == (
+        "SELECT * FROM (\nSELECT 1\n) AS limited_result LIMIT 10"
+    )
+
+
+def test_rewrite_fetches_one_row_past_the_limit():
+    cursor = _ExplainCursor()
+    verdict = QueryCostGuard(max_cost=1000, max_rows=100, enabled=True).check(
+        cursor, "SELECT * FROM sales;\n-- note"
+    )
+    assert verdict.rewritten
+    assert verdict.limit == 100
+    assert verdict.sql.endswith("LIMIT 101")
+    assert ";" not in verdict.sql
+
+
+def test_exactly_limit_rows_is_not_truncated():
+    result = ColumnarResult(["n"], [list(range(3))], 3)
+    result.cap(3)
+    assert not result.truncated
+    assert result.row_count == 3
+
+    result = ColumnarResult(["n"], [list(range(4))], 4)
+    result.cap(3)
+    assert result.truncated
+    assert result.row_count == 3
+    assert result.data == [[0, 1, 2]]
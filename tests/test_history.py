@@ -0,0 +1,57 @@
+"""Follow-up detection and the conversation context it selects."""
+
+import pytest
+
+from agent.history import ConversationHistory, Turn, is_follow_up
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "and only those in Berlin?",
+        "What about last month?",
+        "how about the top 5",
+        "Sort them by revenue",
+        "only the top 5 of those",
+        "Break it down by product",
+        "same for 2022",
+        "Do that for 2022 instead",
+        "How many of these are still active?",
+        "exclude those with no orders",
+        "Group that by month",
+        "Which of those?",
+        "Show the previous results again",
+        "compare with last year",
+        "vs 2021?",
+    ],
+)
+def test_follow_ups(question):
+    assert is_follow_up(question)
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Suppliers that ship to Berlin",
+        "Sales before 2023",
+        "Products that sold more than 100 units",
+        "Show sales that were returned",
+        "Orders with a total above 1000",
+        "Previous month revenue per product",
+        "Total revenue for the last month",
+        "List products with their suppliers",
+        "Compare sales in 2023 and 2024",
+        "Only show active customers",
+        "How many customers are there?",
+        "Which customers bought products that cost over 50?",
+    ],
+)
+def test_standalone_questions(question):
+    assert not is_follow_up(question)
+
+
+def test_standalone_questions_get_no_context():
+    history = ConversationHistory()
+    history.add(Turn("How many sales per product?", "SELECT 1", ["sales"], 10))
+    assert history.context_for("Suppliers that ship to Berlin") == ""
+    assert "How many sales per product?" in history.context_for("and only those in 2023?")
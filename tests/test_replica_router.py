@@ -0,0 +1,45 @@
+"""Replica health checks: ejection and re-admission."""
+
+from agent.replica_router import Backend, ReceiverStopped, ReplicaRouter
+
+
+class _Pool:
+    max_size = 1
+
+    def discard_idle(self):
+        pass
+
+
+def _router(monkeypatch, outcomes):
+    replica = Backend("replica:5432", "replica", {}, _Pool())
+    primary = Backend("primary:5432", "primary", {}, _Pool())
+
+    def probe(backend):
+        if backend is primary:
+            return 0.0
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(Backend, "probe", probe)
+    return ReplicaRouter(primary, [replica], eject_after=2, readmit_after=1), replica
+
+
+def test_stopped_receiver_ejects_at_once(monkeypatch):
+    router, replica = _router(monkeypatch, [0.0, ReceiverStopped("WAL receiver is not streaming"), 0.0])
+    router.check()
+    assert replica.healthy
+    router.check()
+    assert not replica.healthy
+    assert replica.ejections == 1
+    router.check()
+    assert replica.healthy
+
+
+def test_connection_errors_need_consecutive_failures(monkeypatch):
+    router, replica = _router(monkeypatch, [OSError("refused"), OSError("refused")])
+    router.check()
+    assert replica.healthy
+    router.check()
+    assert not replica.healthy
@@ -0,0 +1,43 @@
+"""Result cache freshness: generations and replica staleness."""
+
+import time
+
+from agent.result_cache import ResultCache
+from agent.result_format import ColumnarResult
+
+SQL = "SELECT count(*) AS n FROM orders"
+
+
+def _result():
+    return ColumnarResult(["n"], [[1]], 1)
+
+
+def test_write_during_the_query_keeps_the_result_out():
+    cache = ResultCache(max_bytes=1 << 20, ttl=60)
+    tables = frozenset({"orders"})
+    generation = cache.generation(tables)
+    cache.invalidate_table("orders")
+    assert not cache.put(SQL, _result(), tables=tables, generation=generation)
+    assert cache.get(SQL) is None
+
+
+def test_hits_respect_the_accepted_staleness():
+    cache = ResultCache(max_bytes=1 << 20, ttl=60)
+    result = _result()
+    cache.put(SQL, result, tables=frozenset({"orders"}), lag=5.0)
+    assert cache.get(SQL) is result
+    assert cache.get(SQL, max_staleness=30) is result
+    assert cache.get(SQL, max_staleness=2) is None
+    assert cache.stats()["too_stale"] == 1
+    # A stricter caller does not evict the entry for others
+    assert cache.get(SQL, max_staleness=30) is result
+
+
+def test_entries_age(monkeypatch):
+    cache = ResultCache(max_bytes=1 << 20, ttl=600)
+    result = _result()
+    cache.put(SQL, result, tables=frozenset({"orders"}))
+    later = time.monotonic() + 120
+    monkeypatch.setattr("agent.result_cache.time.monotonic", lambda: later)
+    assert cache.get(SQL, max_staleness=60) is None
+    assert cache.get(SQL, max_staleness=300) is result
@@ -0,0 +1,81 @@
+"""Result ids are pinned to their worker; spilled results stay private and typed."""
+
+import datetime
+import decimal
+import os
+import stat
+import uuid
+
+import pytest
+
+from agent.result_format import ColumnarResult
+from agent.result_store import ResultStore
+
+
+def _store(tmp_path):
+    return ResultStore(max_bytes=1 << 20, max_disk_bytes=0, spill_dir=str(tmp_path), ttl=60)
+
+
+def test_ids_of_another_worker_are_recognised(tmp_path):
+    mine, other = _store(tmp_path), _store(tmp_path)
+    result_id = other.put(ColumnarResult(["n"], [[1, 2]], 2))
+    assert mine.get(result_id) is None
+    assert mine.held_elsewhere(result_id)
+    assert not other.held_elsewhere(result_id)
+    assert other.page(result_id, 1)["row_count"] == 2
+
+
+def test_unknown_ids_are_not_blamed_on_another_worker(tmp_path):
+    store = _store(tmp_path)
+    assert not store.held_elsewhere("not-a-result-id")
+    assert not store.held_elsewhere(store.worker + "-" + "0" * 32)
+
+
+def _spilling_store(path):
+    # Every result is larger than a quarter of the memory budget, so it spills at once
+    return ResultStore(max_bytes=64, max_disk_bytes=1 << 20, spill_dir=str(path), ttl=60)
+
+
+def test_spilled_results_keep_their_types(tmp_path):
+    values = [
+        decimal.Decimal("12.50"),
+        datetime.datetime(2024, 5, 1, 12, 30, tzinfo=datetime.timezone.utc),
+        datetime.date(2024, 5, 1),
+        datetime.time(8, 15),
+        datetime.timedelta(days=2, seconds=5),
+        b"\x00\xff",
+        uuid.UUID(int=7),
+        [1, None, "a"],
+        {"t": "list", "v": [1]},
+        None,
+    ]
+    store = _spilling_store(tmp_path / "spill")
+    result_id = store.put(ColumnarResult(["v"], [values], len(values)))
+    assert store.stats()["spilled_results"] == 1
+    path = tmp_path / "spill" / f"{result_id}.result"
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(tmp_path / "spill").st_mode) & 0o077 == 0
+    assert store.get(result_id).data == [values]
+
+
+def test_shared_spill_directory_is_refused(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    store = _spilling_store(shared)
+    assert store.max_disk_bytes == 0
+    result_id = store.put(ColumnarResult(["n"], [[1, 2]], 2))
+    assert store.get(result_id) is None
+    assert os.listdir(shared) == []
+
+
+def test_planted_symlink_is_not_followed(tmp_path):
+    store = _spilling_store(tmp_path / "spill")
+    target = tmp_path / "target"
+    target.write_text("keep")
+    result_id = f"{store.worker}-{'0' * 32}"
+    partial = tmp_path / "spill" / f"{result_id}.result.partial"
+    partial.symlink_to(target)
+    with pytest.raises(OSError):
+        store._write(str(tmp_path / "spill" / f"{result_id}.result"), ColumnarResult(["n"], [[1]], 1))
+    assert target.read_text() == "keep"
@@ -0,0 +1,59 @@
+"""Session backends: interface and atomic read-modify-write."""
+
+import threading
+
+import pytest
+
+from agent.session_store import MemorySessionStore, SessionStore, SQLiteSessionStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        backend = MemorySessionStore(max_bytes=1 << 20, ttl=60)
+    else:
+        backend = SQLiteSessionStore(str(tmp_path / "sessions.db"), ttl=60)
+    yield backend
+    backend.close()
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_update_creates_and_replaces(store):
+    assert store.update("s", lambda data: {"turns": (data or {}).get("turns", 0) + 1}) == {"turns": 1}
+    store.update("s", lambda data: {"turns": data["turns"] + 1})
+    assert store.get("s") == {"turns": 2}
+
+
+def test_concurrent_updates_keep_every_change(store):
+    barrier = threading.Barrier(8)
+
+    def append(worker):
+        barrier.wait()
+        for turn in range(10):
+            store.update(
+                "s", lambda data: {"turns": (data or {}).get("turns", []) + [f"{worker}-{turn}"]}
+            )
+
+    threads = [threading.Thread(target=append, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store.get("s")["turns"]) == 80
+
+
+def test_failed_update_keeps_the_stored_session(store):
+    store.put("s", {"turns": 1})
+
+    def fail(data):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        store.update("s", fail)
+    assert store.get("s") == {"turns": 1}
+    store.update("s", lambda data: {"turns": data["turns"] + 1})
+    assert store.get("s") == {"turns": 2}
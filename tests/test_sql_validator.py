@@ -0,0 +1,113 @@
+"""Accept/reject cases for the token-based SQL validator."""
+
+import pytest
+
+from agent.sql_validator import SQLValidator, analyze_sql, strip_statement
+
+
+@pytest.mark.parametrize(
+    "sql",
+    [
+        "SELECT * FROM customers;",
+        "select name from customers where city = 'Berlin'",
+        "WITH recent AS (SELECT * FROM orders) SELECT * FROM recent",
+        "(SELECT 1) UNION (SELECT 2)",
+        "VALUES (1), (2)",
+        "TABLE customers",
+        # Keywords inside literals, identifiers and comments are not keywords
+        "SELECT 'delete from orders; drop table customers' AS note",
+        'SELECT "update" FROM audit_log',
+        "SELECT 1 -- ; DROP TABLE customers",
+        "SELECT /* ; DELETE FROM orders */ name FROM customers",
+        "SELECT $$; DROP TABLE customers$$ AS body",
+        "SELECT $fn$ $$ ; $fn$ AS body",
+        "SELECT E'\\'; DROP TABLE customers; --' AS escaped",
+        # Names that merely contain a forbidden word
+        "SELECT updated_at, deleted FROM orders WHERE created_at > now()",
+        "SELECT * FROM orders ORDER BY id FETCH FIRST 5 ROWS ONLY",
+    ],
+)
+def test_accepts_read_only_statements(sql):
+    validation = analyze_sql(sql)
+    assert validation.valid, validation.reason
+
+
+@pytest.mark.parametrize(
+    "sql, reason",
+    [
+        ("DELETE FROM customers", "Only SELECT"),
+        ("SHOW search_path", "Only SELECT"),
+        # Data-modifying CTEs
+        ("WITH gone AS (DELETE FROM orders RETURNING *) SELECT * FROM gone", "DELETE"),
+        ("WITH moved AS (UPDATE orders SET status = 'x' RETURNING id) SELECT * FROM moved", "UPDATE"),
+        ("WITH added AS (INSERT INTO orders DEFAULT VALUES RETURNING id) SELECT 1", "INSERT"),
+        ("SELECT * INTO backup FROM customers", "INTO"),
+        # Row locks
+        ("SELECT * FROM orders FOR UPDATE", "FOR UPDATE"),
+        ("SELECT * FROM orders FOR SHARE", "FOR UPDATE"),
+        ("SELECT * FROM orders FOR NO KEY UPDATE", "FOR UPDATE"),
+        ("SELECT * FROM orders FOR KEY SHARE", "FOR UPDATE"),
+        ("SELECT * FROM orders for\nupdate", "FOR UPDATE"),
+        # Multiple statements, including ones hidden behind literal tricks
+        ("SELECT 1; SELECT 2", "Multiple statements"),
+        ("SELECT 1;DROP TABLE customers", "Multiple statements"),
+        ("SELECT '\\'; DROP TABLE customers; --'", "Multiple statements"),
+        ("SELECT $a$ $$ $a$; DROP TABLE customers", "Multiple statements"),
+        ("SELECT 1 /* */; DELETE FROM orders", "Multiple statements"),
+        # Unterminated literals and comments
+        ("SELECT 'abc", "Unterminated"),
+        ('SELECT "abc', "Unterminated"),
+        ("SELECT 1 /* ; DROP TABLE customers", "Unterminated"),
+        ("SELECT $$; DROP TABLE customers", "Unterminated"),
+        ("SELECT $tag$ body $other$", "Unterminated"),
+        # Blocked functions
+        ("SELECT pg_terminate_backend(42)", "pg_terminate_backend"),
+        ("SELECT nextval('orders_id_seq')", "nextval"),
+        # Nothing to run
+        ("", "empty"),
+        (";", "empty"),
+        ("-- just a comment", "empty"),
+    ],
+)
+def test_rejects(sql, reason):
+    validation = analyze_sql(sql)
+    assert not validation.valid
+    assert reason in validation.reason
+
+
+def test_referenced_tables_exclude_ctes_and_functions():
+    validation = analyze_sql(
+        "WITH recent AS (SELECT * FROM orders) "
+        "SELECT * FROM recent JOIN public.customers c ON c.id = recent.customer_id, "
+        "generate_series(1, 3)"
+    )
+    assert validation.tables == frozenset({"orders", "customers"})
+
+
+def test_memoized_verdicts_match_fresh_analysis():
+    validator = SQLValidator(cache_size=8)
+    first = validator.validate("SELECT * FROM orders WHERE id = 1")
+    second = validator.validate("SELECT * FROM orders WHERE id = 2")
+    assert first.valid and second.valid
+    assert first.fingerprint == second.fingerprint
+    assert validator.stats()["hits"] == 1
+
+    # A rejected statement never shares a verdict with an accepted one
+    rejected = validator.validate("SELECT * FROM orders WHERE id = 1 FOR UPDATE")
+    assert not rejected.valid
+    assert rejected.fingerprint != first.fingerprint
+
+
+@pytest.mark.parametrize(
+    "sql, statement",
+    [
+        ("SELECT 1;", "SELECT 1"),
+        ("SELECT 1; -- done", "SELECT 1"),
+        ("SELECT * FROM sales;\n-- note", "SELECT * FROM sales"),
+        ("SELECT 1 /* a */ ; ; /* b */\n", "SELECT 1"),
+        ("SELECT ';' AS semi; -- x", "SELECT ';' AS semi"),
+        ("SELECT 1 -- keep;\n, 2", "SELECT 1 -- keep;\n, 2"),
+    ],
+)
+def test_strip_statement(sql, statement):
+    assert strip_statement(sql) == statement
@@ -0,0 +1,66 @@
+"""StatementScanner must find the same terminator however the stream is chunked."""
+
+import pytest
+
+from agent.generate_sql_query import StatementScanner
+
+# (streamed text, first complete statement)
+CASES = [
+    ("SELECT 1; Explanation follows.", "SELECT 1;"),
+    ("SELECT ';' AS semi; trailing", "SELECT ';' AS semi;"),
+    ('SELECT 1 AS ";"; trailing', 'SELECT 1 AS ";";'),
+    ("SELECT 1 -- not here;\n, 2; trailing", "SELECT 1 -- not here;\n, 2;"),
+    ("SELECT /* ; */ 1; trailing", "SELECT /* ; */ 1;"),
+    ("SELECT 4/2; trailing", "SELECT 4/2;"),
+    ("SELECT 5-1; trailing", "SELECT 5-1;"),
+    ("SELECT $$;$$; trailing", "SELECT $$;$$;"),
+    ("SELECT $body$ ; $$ ; $body$; trailing", "SELECT $body$ ; $$ ; $body$;"),
+    ("SELECT $1; trailing", "SELECT $1;"),
+]
+
+
+def _scan(chunks):
+    scanner = StatementScanner()
+    for chunk in chunks:
+        if scanner.feed(chunk):
+            break
+    return scanner
+
+
+@pytest.mark.parametrize("text, statement", CASES)
+def test_every_two_way_split(text, statement):
+    for split in range(len(text) + 1):
+        scanner = _scan([text[:split], text[split:]])
+        assert scanner.complete, split
+        assert scanner.statement == statement, split
+
+
+@pytest.mark.parametrize("text, statement", CASES)
+def test_one_character_chunks(text, statement):
+    scanner = _scan(list(text))
+    assert scanner.complete
+    assert scanner.statement == statement
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "SELECT 'unterminated;",
+        "SELECT 1 -- comment;",
+        "SELECT /* open ;",
+        "SELECT $tag$ ; $ta",
+        "SELECT 1",
+    ],
+)
+def test_incomplete_statement(text):
+    for split in range(len(text) + 1):
+        scanner = _scan([text[:split], text[split:]])
+        assert not scanner.complete, split
+        assert scanner.text == text
+
+
+def test_feed_after_completion_is_ignored():
+    scanner = StatementScanner()
+    assert scanner.feed("SELECT 1;")
+    assert scanner.feed("SELECT 2;")
+    assert scanner.statement == "SELECT 1;"
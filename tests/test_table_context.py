@@ -0,0 +1,45 @@
+"""The schema block of the prompt stays constant while the whole schema fits."""
+
+import graph.workflow as workflow
+from agent.generate_sql_query import _build_prompt, build_prompt_prefix
+
+
+class _Snapshot:
+    version = "v1"
+    tables = {"products": {}, "suppliers": {}, "purchases": {}}
+    prompt_context = "TABLE products\nTABLE suppliers\nTABLE purchases"
+
+    def render(self, tables):
+        return "\n".join(f"TABLE {name}" for name in tables)
+
+
+class _Registry:
+    def get(self):
+        return _Snapshot()
+
+
+class _Retriever:
+    def retrieve(self, snapshot, question):
+        return ["suppliers"]
+
+
+def _retrieve(monkeypatch, full_schema_chars):
+    monkeypatch.setattr(workflow, "get_schema_registry", lambda: _Registry())
+    monkeypatch.setattr(workflow, "get_table_retriever", lambda: _Retriever())
+    monkeypatch.setattr(workflow, "TABLE_RETRIEVAL_FULL_SCHEMA_CHARS", full_schema_chars)
+    return workflow.retrieve_table_context({"user_input": "Supplier cities"})
+
+
+def test_small_schema_keeps_the_warmed_prefix(monkeypatch):
+    update = _retrieve(monkeypatch, 4000)
+    assert update["table_context"] == _Snapshot.prompt_context
+    assert update["table_hint"] == ["suppliers"]
+    prompt = _build_prompt(update["table_context"], "Supplier cities", table_hint=update["table_hint"])
+    assert prompt.startswith(build_prompt_prefix(_Snapshot.prompt_context))
+    assert "most relevant to this question are: suppliers" in prompt
+
+
+def test_large_schema_is_narrowed(monkeypatch):
+    update = _retrieve(monkeypatch, 10)
+    assert update["table_context"] == "TABLE suppliers"
+    assert update["table_hint"] is None
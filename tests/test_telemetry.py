@@ -0,0 +1,53 @@
+"""Request ids from clients must not reach file names unchecked; requests are timed in full."""
+
+import asyncio
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from agent.telemetry import REQUEST_SECONDS, SamplingProfiler, TraceMiddleware, request_id_from
+
+
+@pytest.mark.parametrize("header", ["abc123", "A-b_C", "x" * 64])
+def test_safe_request_ids_are_kept(header):
+    assert request_id_from(header) == header
+
+
+@pytest.mark.parametrize("header", [None, "", "../../etc/passwd", "a/b", "a b", "x" * 65, "id\n"])
+def test_unsafe_request_ids_are_replaced(header):
+    request_id = request_id_from(header)
+    assert request_id != header
+    assert request_id_from(request_id) == request_id
+
+
+def test_profile_stays_in_its_directory(tmp_path):
+    profiler = SamplingProfiler(output_dir=str(tmp_path / "profiles"))
+    profiler._samples.append((1.0, "main;handler"))
+    path = profiler.write("../../escaped", 0.0, 2.0)
+    assert os.path.dirname(path) == str(tmp_path / "profiles")
+    assert not (tmp_path / "escaped.folded").exists()
+
+
+def test_streamed_requests_are_timed_to_their_last_byte():
+    app = FastAPI()
+    app.add_middleware(TraceMiddleware)
+
+    @app.get("/slow-stream")
+    async def slow_stream():
+        async def body():
+            yield b"first"
+            await asyncio.sleep(0.3)
+            yield b"last"
+
+        return StreamingResponse(body())
+
+    with TestClient(app) as client:
+        response = client.get("/slow-stream", headers={"X-Request-ID": "stream-1"})
+    assert response.content == b"firstlast"
+    assert response.headers["X-Request-ID"] == "stream-1"
+    seconds, count = REQUEST_SECONDS._series[("/slow-stream", "200")][-2:]
+    assert count == 1
+    assert seconds >= 0.3
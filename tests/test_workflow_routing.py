@@ -0,0 +1,35 @@
+"""Routing after execution: repairs end, and a missing query is an answer, not a crash."""
+
+from graph.workflow import (
+    _MAX_EXECUTIONS,
+    execute_sql_query_node,
+    generate_final_response_node,
+    route_after_execution,
+)
+
+
+def test_missing_sql_ends_the_turn_with_an_error():
+    state = {"user_input": "How many customers?", "sql_query": None}
+    update = execute_sql_query_node(state)
+    assert update["query_error_kind"] == "generation"
+    assert update["query_result"] is None
+    state.update(update)
+    assert route_after_execution(state) == "generate_final_response"
+    final = generate_final_response_node(state)
+    assert "Failed to generate a SQL query." in final["final_response"]
+
+
+def test_execution_budget_stops_the_repair_loop():
+    state = {
+        "query_error_kind": "database",
+        "repairs": 0,
+        "attempts": [{}] * _MAX_EXECUTIONS,
+    }
+    assert route_after_execution(state) == "generate_final_response"
+    state["attempts"] = [{}]
+    assert route_after_execution(state) == "generate_sql_query"
+
+
+def test_execution_budget_fits_the_recursion_limit():
+    # retrieve + final response + generate/execute per execution
+    assert 2 + 2 * _MAX_EXECUTIONS <= 25